@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Compare the installed JSON codecs on typical sensor payloads
+
+Times encoding a dweet, decoding a dweet.io response and decoding a stream
+record (both with two plain decodes and with the codec's `loads_record`)
+for every codec in `dweepy.codec.CODECS`.
+
+    $ python benchmarks/bench_codec.py --number 20000
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# stdlib imports
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# local imports
+from dweepy import codec  # noqa
+
+
+payload = {
+    'temperature': 21.53,
+    'humidity': 48.2,
+    'pressure': 1013.25,
+    'battery': 3.71,
+    'rssi': -67,
+    'door_open': False,
+    'firmware': 'v2.4.1',
+}
+
+dweet = {
+    'thing': 'sensor-0042',
+    'created': '2014-03-19T10:45:28.934Z',
+    'content': payload,
+}
+
+response = json.dumps({'this': 'succeeded', 'by': 'dweeting', 'the': 'dweet', 'with': dweet}).encode('utf-8')
+record = json.dumps(json.dumps(dweet)).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    def best(func):
+        return min(timeit.repeat(func, number=args.number, repeat=args.repeat)) / args.number * 1e6
+
+    print('{0:>8} {1:>10} {2:>10} {3:>12} {4:>12}'.format('codec', 'encode', 'response', 'record x2', 'loads_record'))
+    for backend in codec.CODECS:
+        c = backend()
+        print('{0:>8} {1:>8.2f}us {2:>8.2f}us {3:>10.2f}us {4:>10.2f}us'.format(
+            c.name,
+            best(lambda: c.dumps(payload)),
+            best(lambda: c.loads(response)),
+            best(lambda: c.loads(c.loads(record))),
+            best(lambda: c.loads_record(record)),
+        ))
+
+
+if __name__ == '__main__':
+    main()
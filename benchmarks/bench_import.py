@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Measure how long dweepy takes to import and get ready to send
+
+Each scenario runs in a fresh interpreter `--repeat` times, and the best
+and median times are reported. `everything` imports every submodule up
+front, which is what `import dweepy` used to cost.
+
+    $ python benchmarks/bench_import.py --repeat 20
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# stdlib imports
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCENARIOS = (
+    ('import', 'import dweepy'),
+    ('query', 'import dweepy; dweepy.DweetQuery(where=[("temperature", ">", 30)])'),
+    ('requests', 'import dweepy; dweepy.DweepyClient(transport="requests").session'),
+    ('stdlib', 'import dweepy; dweepy.DweepyClient(transport="stdlib").session'),
+    ('everything', 'import dweepy; from dweepy import *'),
+)
+
+TIMER = '''
+import timeit
+started = timeit.default_timer()
+{0}
+print(timeit.default_timer() - started)
+'''
+
+
+def measure(code, repeat):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('DWEEPY_TRANSPORT', None)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', TIMER.format(code)], env=env)
+        times.append(float(output))
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    for name, code in SCENARIOS:
+        times = measure(code, args.repeat)
+        print('{0:>10}: best {1:7.1f}ms  median {2:7.1f}ms'.format(
+            name, times[0] * 1000, times[len(times) // 2] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Offline load test of dweepy against an in-process fake dweet.io
+
+Runs publish, read and stream fan-in workloads against a
+`dweepy.testing.FakeDweetServer` and reports throughput along with p50 and
+p99 latencies. For the stream workload latency is measured from just before
+a dweet is published until a subscriber hears it. The provision workload
+locks and sets alerts on a fleet of things in bulk, then reconciles the
+unchanged fleet again.
+
+    $ python benchmarks/bench_load.py --threads 8 --requests 2000 --latency 0.005
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# stdlib imports
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# local imports
+import dweepy  # noqa
+from dweepy.testing import FakeDweetServer  # noqa
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name, count, elapsed, latencies):
+    print('{0:>8}: {1:6d} ops in {2:6.2f}s = {3:8.1f} ops/s   p50 {4:7.2f}ms   p99 {5:7.2f}ms'.format(
+        name, count, elapsed, count / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+    ))
+
+
+def timed(func, *args, **kwargs):
+    started = time.time()
+    func(*args, **kwargs)
+    return time.time() - started
+
+
+def run_requests(func, args, threads):
+    """Call `func` once per item in `args` from `threads` threads
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        started = time.time()
+        latencies = list(executor.map(lambda a: timed(func, *a), args))
+        return time.time() - started, latencies
+
+
+def bench_publish(client, args):
+    calls = [('thing-{0}'.format(i % args.things), {'seq': i, 'temperature': 21.5}) for i in range(args.requests)]
+    elapsed, latencies = run_requests(client.dweet_for, calls, args.threads)
+    report('publish', len(calls), elapsed, latencies)
+
+
+def bench_read(client, args):
+    calls = [('thing-{0}'.format(i % args.things),) for i in range(args.requests)]
+    elapsed, latencies = run_requests(client.get_latest_dweet_for, calls, args.threads)
+    report('read', len(calls), elapsed, latencies)
+
+
+def bench_stream(client, args):
+    things = ['stream-{0}'.format(i) for i in range(args.subscribers)]
+    per_thing = max(1, args.requests // len(things))
+    sent = {}
+    latencies = []
+    lock = threading.Lock()
+    ready = threading.Semaphore(0)
+
+    def subscribe(thing_name):
+        heard = 0
+        ready.release()
+        for dweet in dweepy.listen_for_dweets_from(thing_name, timeout=args.stream_timeout, session=client):
+            received = time.time()
+            with lock:
+                latencies.append(received - sent[(thing_name, dweet['content']['seq'])])
+            heard += 1
+            if heard == per_thing:
+                return
+
+    subscribers = [threading.Thread(target=subscribe, args=(thing_name,)) for thing_name in things]
+    for subscriber in subscribers:
+        subscriber.start()
+    for _ in subscribers:
+        ready.acquire()
+    # give the subscriptions a moment to connect before publishing
+    time.sleep(0.5)
+
+    def publish(thing_name, seq):
+        with lock:
+            sent[(thing_name, seq)] = time.time()
+        client.dweet_for(thing_name, {'seq': seq})
+
+    calls = [(thing_name, seq) for seq in range(per_thing) for thing_name in things]
+    started = time.time()
+    run_requests(publish, calls, args.threads)
+    for subscriber in subscribers:
+        subscriber.join()
+    report('stream', len(latencies), time.time() - started, latencies)
+
+
+def bench_provision(client, args):
+    things = ['fleet-{0}'.format(i) for i in range(args.fleet)]
+    alerts = dict((thing_name, (['ops@example.com'], 'if(dweet.temperature > 30) return "hot";'))
+                  for thing_name in things)
+    for name, func in [
+        ('lock', lambda: client.lock_many(things, 'fleet-lock', 'key', max_workers=args.threads)),
+        ('alerts', lambda: client.sync_alerts(alerts, 'key', max_workers=args.threads)),
+        ('resync', lambda: client.sync_alerts(alerts, 'key', max_workers=args.threads)),
+    ]:
+        started = time.time()
+        results = func()
+        elapsed = time.time() - started
+        sent = sum(1 for result in results.values() if result.action != 'unchanged')
+        print('{0:>8}: {1:6d} things in {2:6.2f}s, {3} sent'.format(name, len(things), elapsed, sent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--things', type=int, default=50)
+    parser.add_argument('--subscribers', type=int, default=20)
+    parser.add_argument('--fleet', type=int, default=1000, help='things in the provision workload')
+    parser.add_argument('--latency', type=float, default=0, help='server latency per request (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--stream-timeout', type=float, default=30)
+    parser.add_argument('--workloads', default='publish,read,stream,provision')
+    args = parser.parse_args()
+
+    with FakeDweetServer(latency=args.latency, error_rate=args.error_rate, seed=0) as server:
+        client = server.client(pool_maxsize=max(args.threads, args.subscribers) + 4)
+        workloads = {
+            'publish': bench_publish,
+            'read': bench_read,
+            'stream': bench_stream,
+            'provision': bench_provision,
+        }
+        for name in args.workloads.split(','):
+            workloads[name](client, args)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
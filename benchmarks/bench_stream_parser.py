@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Compare the legacy stream parser against `StreamDecoder`
+
+Feeds a recording of dweet.io stream bytes through both parsers, split the
+way `iter_content` delivers them (every HTTP chunk carries one record, cut
+into pieces of at most `--chunk-size` bytes), and reports how long each
+parser takes and how many dweets it recovered. The `query` row runs the
+decoder with a `DweetQuery` selecting the one dweet in ten with an alarm.
+
+    $ python benchmarks/bench_stream_parser.py --dweets 2000 --content-size 4096
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+# stdlib imports
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# local imports
+from dweepy.compat import isstr  # noqa
+from dweepy.query import DweetQuery  # noqa
+from dweepy.streaming import StreamDecoder  # noqa
+
+
+def legacy_parse(chunks):
+    """The parser `_listen_for_dweets_from_response` used to run
+    """
+    streambuffer = ''
+    for byte in chunks:
+        if byte:
+            streambuffer += byte.decode('ascii')
+            try:
+                dweet = json.loads(streambuffer.splitlines()[1])
+            except (IndexError, ValueError):
+                continue
+            if isstr(dweet):
+                yield json.loads(dweet)
+            streambuffer = ''
+
+
+def decoder_parse(chunks):
+    decoder = StreamDecoder()
+    for byte in chunks:
+        for dweet in decoder.feed(byte):
+            yield dweet
+
+
+def query_parse(chunks):
+    decoder = StreamDecoder(query=DweetQuery(fields=['seq'], where=[('alarm', '==', True)]))
+    for byte in chunks:
+        for dweet in decoder.feed(byte):
+            yield dweet
+
+
+def record_stream(count, content_size):
+    """Build a list of `count` stream records each carrying roughly
+    `content_size` bytes of content
+    """
+    records = []
+    for i in range(count):
+        dweet = {
+            'thing': 'benchmark-thing',
+            'created': '2014-03-19T10:45:28.934Z',
+            'content': {'seq': i, 'temperature': 21.5, 'blob': 'x' * content_size},
+        }
+        if i % 10 == 0:
+            dweet['content']['alarm'] = True
+        body = json.dumps(json.dumps(dweet)).encode('ascii')
+        records.append('{0:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n')
+    return records
+
+
+def chunk(records, size):
+    return [record[i:i + size] for record in records for i in range(0, len(record), size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dweets', type=int, default=500)
+    parser.add_argument('--content-size', type=int, default=8192)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    chunks = chunk(record_stream(args.dweets, args.content_size), args.chunk_size)
+    print('{0} dweets, {1} chunks of {2} bytes'.format(args.dweets, len(chunks), args.chunk_size))
+    for name, parse in (('legacy', legacy_parse), ('decoder', decoder_parse), ('query', query_parse)):
+        decoded = len(list(parse(chunks)))
+        best = min(timeit.repeat(lambda: list(parse(chunks)), number=1, repeat=args.repeat))
+        print('{0:>8}: {1:8.4f}s  {2} dweets decoded'.format(name, best, decoded))
+
+
+if __name__ == '__main__':
+    main()
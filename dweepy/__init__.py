@@ -4,25 +4,96 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-# local imports
-from .api import DweepyError
-from .api import dweet
-from .api import dweet_for
-from .api import get_alert
-from .api import get_dweets_for
-from .api import get_latest_dweet_for
-from .api import lock
-from .api import remove_alert
-from .api import remove_lock
-from .api import set_alert
-from .api import unlock
-from .streaming import listen_for_dweets_from
+# stdlib imports
+import importlib
+import sys
+
+
+# the public objects and the submodules they live in; each submodule is only
+# imported when one of its objects is first used, so `import dweepy` stays
+# cheap for programs which only need part of it
+_exports = {
+    'AlertEngine': 'alerts',
+    'dweet': 'api',
+    'dweet_for': 'api',
+    'get_alert': 'api',
+    'get_dweets_for': 'api',
+    'get_dweets_for_many': 'api',
+    'get_latest_dweet_for': 'api',
+    'get_latest_dweets_for_many': 'api',
+    'lock': 'api',
+    'lock_many': 'api',
+    'remove_alert': 'api',
+    'remove_lock': 'api',
+    'set_alert': 'api',
+    'set_alerts': 'api',
+    'sync_alerts': 'api',
+    'unlock': 'api',
+    'DweetArchive': 'archive',
+    'DweetRecorder': 'archive',
+    'replay_dweets_from': 'archive',
+    'DweetBuffer': 'buffer',
+    'DweetCache': 'cache',
+    'DweepyClient': 'client',
+    'PayloadEncoder': 'encoding',
+    'get_default_client': 'client',
+    'set_default_client': 'client',
+    'CircuitOpenError': 'exceptions',
+    'DweepyConnectionError': 'exceptions',
+    'DweepyError': 'exceptions',
+    'DweepyHTTPError': 'exceptions',
+    'DweepyPayloadTooLargeError': 'exceptions',
+    'DweepyRateLimitError': 'exceptions',
+    'DweepyTimeoutError': 'exceptions',
+    'Metrics': 'instrumentation',
+    'Outbox': 'outbox',
+    'DweetPoller': 'poller',
+    'BatchPublisher': 'publisher',
+    'DweetQuery': 'query',
+    'RateLimiter': 'ratelimit',
+    'CircuitBreaker': 'resilience',
+    'ResiliencePolicy': 'resilience',
+    'RetryBudget': 'resilience',
+    'RetryPolicy': 'resilience',
+    'Subscription': 'streaming',
+    'listen_for_dweets_from': 'streaming',
+}
+
+# submodules which may be used as attributes of the package without being
+# imported first, as `dweepy.api` and `dweepy.streaming` always could
+_submodules = frozenset([
+    'aio', 'alerts', 'api', 'archive', 'broker', 'buffer', 'cache', 'client',
+    'codec', 'compat', 'encoding', 'exceptions', 'instrumentation', 'outbox',
+    'poller', 'publisher', 'query', 'ratelimit', 'resilience', 'streaming',
+    'testing', 'transport',
+])
 
 
 # all of the following objects will be imported if the caller does
 # `from dweepy import *` (don't)
-__all__ = [
-    'DweepyError', 'dweet', 'dweet_for', 'get_alert', 'get_dweets_for',
-    'get_latest_dweet_for', 'listen_for_dweets_from', 'lock', 'remove_alert',
-    'remove_lock', 'set_alert', 'unlock',
-]
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        # importing a submodule also sets it as an attribute of the package
+        return importlib.import_module('.' + name, __name__)
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # cache it, so this is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports) | _submodules)
+
+
+# module level __getattr__ needs python 3.7+ (PEP 562), so import everything
+# up front on anything older
+if sys.version_info < (3, 7):
+    for _name in _exports:
+        __getattr__(_name)
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""asyncio flavoured dweepy API (python 3.5+, requires `aiohttp`)
+
+    >>> import dweepy.aio
+    >>> await dweepy.aio.dweet_for('this_is_a_thing', {'some_key': 'some_value'})
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import asyncio
+import weakref
+
+try:
+    # python 3
+    from urllib.parse import quote
+except ImportError:
+    # python 2
+    from urllib import quote
+
+# third-party imports
+import aiohttp
+
+# local imports
+from .client import check_status
+from .client import default_base_url
+from .client import unwrap_response
+from .codec import default_codec
+from .exceptions import CircuitOpenError
+from .exceptions import DweepyConnectionError
+from .exceptions import DweepyHTTPError
+from .exceptions import DweepyTimeoutError
+from .resilience import ResiliencePolicy
+from .streaming import StreamDecoder
+from .streaming import _deadline
+from .streaming import _remaining
+from .streaming import _stream_timed_out
+
+
+# aiohttp only tells connect timeouts apart from read timeouts from 3.10
+CONNECT_TIMEOUT_ERRORS = getattr(aiohttp, 'ConnectionTimeoutError', ())
+
+
+class AsyncDweepyClient(object):
+    """An asyncio dweet.io client backed by a pooled `aiohttp` connector.
+
+    `limit` caps the total number of pooled connections, `limit_per_host`
+    the number per host (0 means no per-host limit) and `max_concurrency`
+    the number of requests this client will have in flight at once; any
+    further calls wait for a free slot. `keepalive_timeout` is how long idle
+    connections are kept in the pool.
+
+    The underlying `aiohttp.ClientSession` is created lazily on the running
+    loop, so a client should only be used from one event loop. Streaming
+    subscriptions hold a pooled connection each for their whole lifetime, so
+    raise `limit` when listening to many things at once. Failed requests are
+    retried, and subscriptions space out their reconnects, as directed by
+    `policy`, as for `DweepyClient`. Payloads and
+    responses are (de)serialised by `codec`, and dweets shrunk by `encoder`
+    (a `PayloadEncoder`) when one is given.
+    """
+
+    def __init__(self, session=None, base_url=None, limit=100, limit_per_host=0,
+                 max_concurrency=100, keepalive_timeout=15, policy=None, codec=None,
+                 encoder=None):
+        self.base_url = base_url or default_base_url()
+        self.codec = codec or default_codec
+        self.encoder = encoder
+        self.policy = policy if policy is not None else ResiliencePolicy()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.max_concurrency = max_concurrency
+        self.keepalive_timeout = keepalive_timeout
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def close(self):
+        """Release all pooled connections (only if the session is ours)
+        """
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method, url, **kwargs):
+        """Make HTTP request, raising an exception if it fails.
+
+        Failures are retried, and the circuit breaker consulted, as directed
+        by the client's policy, exactly as `DweepyClient` does.
+        """
+        url = self.base_url + url
+        policy = self.policy
+        idempotent = method == 'get'
+        if policy.retry.budget is not None:
+            policy.retry.budget.record_request()
+        attempt = 0
+        while True:
+            policy.before_call()
+            try:
+                result = await self._send_request(method, url, **kwargs)
+            except Exception as e:
+                policy.record(e)
+                delay = policy.retry.delay_for(e, attempt, idempotent=idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            policy.record()
+            return result
+
+    async def _send_request(self, method, url, **kwargs):
+        """Make a single attempt at a HTTP request
+
+        Connection failures are raised as `DweepyConnectionError` (or
+        `DweepyTimeoutError`), as the stdlib transport raises them.
+        """
+        try:
+            async with self.semaphore:
+                async with self.session.request(method, url, **kwargs) as response:
+                    check_status(response.status, response.headers)
+                    response_json = self.codec.loads(await response.read())
+        except aiohttp.ClientConnectorError as e:
+            raise DweepyConnectionError('could not connect: {0}'.format(e), sent=False) from e
+        except CONNECT_TIMEOUT_ERRORS as e:
+            raise DweepyTimeoutError('timed out connecting: {0}'.format(e), sent=False) from e
+        except asyncio.TimeoutError as e:
+            raise DweepyTimeoutError('timed out waiting for response') from e
+        except aiohttp.ClientConnectionError as e:
+            raise DweepyConnectionError('connection failed: {0!r}'.format(e)) from e
+        return unwrap_response(response_json)
+
+    async def _send_dweet(self, payload, url, params=None, thing_name=None):
+        """Send a dweet to dweet.io
+        """
+        if self.encoder is None:
+            data = self.codec.dumps(payload)
+            headers = {'Content-type': 'application/json'}
+        else:
+            data, headers, _ = self.encoder.encode(payload, thing_name, self.codec)
+        return await self._request('post', url, data=data, headers=headers, params=params)
+
+    async def dweet(self, payload):
+        """Send a dweet to dweet.io without naming your thing
+        """
+        return await self._send_dweet(payload, '/dweet')
+
+    async def dweet_for(self, thing_name, payload, key=None):
+        """Send a dweet to dweet.io for a thing with a known name
+        """
+        params = {'key': key} if key is not None else None
+        return await self._send_dweet(payload, '/dweet/for/{0}'.format(thing_name), params=params,
+                                      thing_name=thing_name)
+
+    async def get_latest_dweet_for(self, thing_name, key=None):
+        """Read the latest dweet for a dweeter
+        """
+        params = {'key': key} if key is not None else None
+        return await self._request('get', '/get/latest/dweet/for/{0}'.format(thing_name), params=params)
+
+    async def get_dweets_for(self, thing_name, key=None):
+        """Read all the dweets for a dweeter
+        """
+        params = {'key': key} if key is not None else None
+        return await self._request('get', '/get/dweets/for/{0}'.format(thing_name), params=params)
+
+    async def remove_lock(self, lock, key):
+        """Remove a lock (no matter what it's connected to).
+        """
+        return await self._request('get', '/remove/lock/{0}'.format(lock), params={'key': key})
+
+    async def lock(self, thing_name, lock, key):
+        """Lock a thing (prevents unauthed dweets for the locked thing)
+        """
+        return await self._request('get', '/lock/{0}'.format(thing_name), params={'key': key, 'lock': lock})
+
+    async def unlock(self, thing_name, key):
+        """Unlock a thing
+        """
+        return await self._request('get', '/unlock/{0}'.format(thing_name), params={'key': key})
+
+    async def set_alert(self, thing_name, who, condition, key):
+        """Set an alert on a thing with the given condition
+        """
+        return await self._request('get', '/alert/{0}/when/{1}/{2}'.format(
+            ','.join(who),
+            thing_name,
+            quote(condition),
+        ), params={'key': key})
+
+    async def get_alert(self, thing_name, key):
+        """Get the alert set on a thing
+        """
+        return await self._request('get', '/get/alert/for/{0}'.format(thing_name), params={'key': key})
+
+    async def remove_alert(self, thing_name, key):
+        """Remove an alert for the given thing
+        """
+        return await self._request('get', '/remove/alert/for/{0}'.format(thing_name), params={'key': key})
+
+    async def listen_for_dweets_from(self, thing_name, timeout=900, key=None, chunk_size=2000, query=None,
+                                     read_timeout=None):
+        """Create a real-time subscription to dweets, filtered by `query` (a
+        `DweetQuery`) if it's given
+
+        As with `dweepy.listen_for_dweets_from`, the subscription ends after
+        `timeout` seconds and connections which are silent for
+        `read_timeout` seconds are replaced.
+        """
+        url = self.base_url + '/listen/for/dweets/from/{0}'.format(thing_name)
+        params = {'key': key} if key is not None else None
+
+        deadline = _deadline(timeout)
+        attempt = 0
+        while True:
+            # the total covers the whole stream, so it ends at the deadline
+            client_timeout = aiohttp.ClientTimeout(
+                total=_remaining(deadline),
+                sock_connect=_remaining(deadline, read_timeout),
+                sock_read=read_timeout,
+            )
+            try:
+                self.policy.before_call()
+                async with self.session.get(url, params=params, timeout=client_timeout) as response:
+                    check_status(response.status, response.headers)
+                    self.policy.record()
+                    async for dweet in _listen_for_dweets_from_response(
+                            response, chunk_size=chunk_size, codec=self.codec, query=query):
+                        attempt = 0
+                        yield dweet
+                        if _stream_timed_out(deadline):
+                            return
+            except CircuitOpenError:
+                pass
+            except DweepyHTTPError as e:
+                self.policy.record(e)
+            except aiohttp.ClientError as e:
+                self.policy.record(DweepyConnectionError('connection failed: {0!r}'.format(e)))
+            except asyncio.TimeoutError:
+                # a quiet connection, or the end of the subscription
+                pass
+            if _stream_timed_out(deadline):
+                return
+            await asyncio.sleep(_remaining(deadline, self.policy.reconnect_delay(attempt)))
+            attempt += 1
+
+    async def listen_for_many(self, thing_names, timeout=900, key_map=None):
+        """Listen to many things at once, yielding `(thing_name, dweet)` tuples
+
+        Every thing gets its own subscription which reconnects independently
+        of the others; `key_map` maps thing names to the keys of locked
+        things. Iteration ends once every subscription has timed out.
+        """
+        key_map = key_map or {}
+        queue = asyncio.Queue()
+        done = object()
+
+        async def subscribe(thing_name):
+            try:
+                async for dweet in self.listen_for_dweets_from(thing_name, timeout=timeout, key=key_map.get(thing_name)):
+                    await queue.put((thing_name, dweet))
+            except Exception as e:
+                await queue.put(e)
+            finally:
+                await queue.put(done)
+
+        tasks = [asyncio.ensure_future(subscribe(thing_name)) for thing_name in thing_names]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _listen_for_dweets_from_response(response, chunk_size=2000, codec=None, query=None):
+    """Yields dweets as received from dweet.io's streaming API
+    """
+    decoder = StreamDecoder(codec=codec, query=query)
+    async for byte in response.content.iter_chunked(chunk_size):
+        if byte:
+            for dweet in decoder.feed(byte):
+                yield dweet
+
+
+# one shared client per event loop, as aiohttp sessions are bound to a loop
+_default_clients = weakref.WeakKeyDictionary()
+
+
+def get_default_client():
+    """Return the shared client for the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        client = _default_clients[loop] = AsyncDweepyClient()
+    return client
+
+
+async def close_default_client():
+    """Close the shared client for the running event loop (if any)
+    """
+    client = _default_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def client_for(session=None):
+    """Return the client that should service a call made with `session`
+    """
+    if session is None:
+        return get_default_client()
+    if isinstance(session, AsyncDweepyClient):
+        return session
+    return AsyncDweepyClient(session=session)
+
+
+async def dweet(payload, session=None):
+    """Send a dweet to dweet.io without naming your thing
+    """
+    return await client_for(session).dweet(payload)
+
+
+async def dweet_for(thing_name, payload, key=None, session=None):
+    """Send a dweet to dweet.io for a thing with a known name
+    """
+    return await client_for(session).dweet_for(thing_name, payload, key=key)
+
+
+async def get_latest_dweet_for(thing_name, key=None, session=None):
+    """Read the latest dweet for a dweeter
+    """
+    return await client_for(session).get_latest_dweet_for(thing_name, key=key)
+
+
+async def get_dweets_for(thing_name, key=None, session=None):
+    """Read all the dweets for a dweeter
+    """
+    return await client_for(session).get_dweets_for(thing_name, key=key)
+
+
+async def remove_lock(lock, key, session=None):
+    """Remove a lock (no matter what it's connected to).
+    """
+    return await client_for(session).remove_lock(lock, key)
+
+
+async def lock(thing_name, lock, key, session=None):
+    """Lock a thing (prevents unauthed dweets for the locked thing)
+    """
+    return await client_for(session).lock(thing_name, lock, key)
+
+
+async def unlock(thing_name, key, session=None):
+    """Unlock a thing
+    """
+    return await client_for(session).unlock(thing_name, key)
+
+
+async def set_alert(thing_name, who, condition, key, session=None):
+    """Set an alert on a thing with the given condition
+    """
+    return await client_for(session).set_alert(thing_name, who, condition, key)
+
+
+async def get_alert(thing_name, key, session=None):
+    """Get the alert set on a thing
+    """
+    return await client_for(session).get_alert(thing_name, key)
+
+
+async def remove_alert(thing_name, key, session=None):
+    """Remove an alert for the given thing
+    """
+    return await client_for(session).remove_alert(thing_name, key)
+
+
+def listen_for_dweets_from(thing_name, timeout=900, key=None, session=None, chunk_size=2000, query=None,
+                           read_timeout=None):
+    """Create a real-time subscription to dweets
+    """
+    return client_for(session).listen_for_dweets_from(
+        thing_name, timeout=timeout, key=key, chunk_size=chunk_size, query=query, read_timeout=read_timeout,
+    )
+
+
+def listen_for_many(thing_names, timeout=900, key_map=None, session=None):
+    """Listen to many things at once, yielding `(thing_name, dweet)` tuples
+    """
+    return client_for(session).listen_for_many(thing_names, timeout=timeout, key_map=key_map)
@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+"""Evaluates `set_alert` style conditions locally, as dweets arrive.
+
+dweet.io alert conditions are snippets of JavaScript such as
+
+    if(dweet.alertValue > 10) return 'TEST: Greater than 10';
+
+`compile_condition` turns the safe subset of these used for alerts into a
+Python callable: `if`/`else` statements and blocks, `return`, literals,
+`dweet.field` (and `dweet['field']`) lookups, arithmetic, comparisons and
+`&&`, `||` and `!`. Nothing else (function calls, assignments, other
+names) is accepted. Equality is strict, and comparing values of different
+types (or missing fields) is false.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import math
+import numbers
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+from .client import get_default_client
+from .compat import isstr
+from .streaming import Subscription
+
+
+TOKEN = re.compile(r'''\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<name>[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<op>===|!==|==|!=|<=|>=|&&|\|\||[<>!+\-*/%().;{}\[\]])
+)''', re.VERBOSE)
+
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+
+LITERALS = {'true': True, 'false': False, 'null': None}
+
+
+class _Undefined(object):
+
+    def __repr__(self):
+        return 'undefined'
+
+
+# a missing field, as distinct from null
+undefined = _Undefined()
+
+# returned by statements which fall through without returning
+_no_return = object()
+
+
+def _number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _truthy(value):
+    return value is not undefined and value is not None and bool(value) and value == value
+
+
+def _to_string(value):
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if value is None:
+        return 'null'
+    if value is undefined:
+        return 'undefined'
+    if isinstance(value, float) and value.is_integer():
+        return '{0:d}'.format(int(value))
+    return '{0}'.format(value)
+
+
+def _strict_equal(a, b):
+    if _number(a) and _number(b):
+        return a == b
+    return type(a) is type(b) and a == b
+
+
+def _loose_equal(a, b):
+    a_nullish = a is None or a is undefined
+    b_nullish = b is None or b is undefined
+    if a_nullish or b_nullish:
+        return a_nullish and b_nullish
+    return _strict_equal(a, b)
+
+
+def _relation(compare):
+    def relation(a, b):
+        if (_number(a) and _number(b)) or (isstr(a) and isstr(b)):
+            return compare(a, b)
+        return False
+    return relation
+
+
+def _add(a, b):
+    if isstr(a) or isstr(b):
+        return _to_string(a) + _to_string(b)
+    if _number(a) and _number(b):
+        return a + b
+    return float('nan')
+
+
+def _arithmetic(compute):
+    def arithmetic(a, b):
+        if not (_number(a) and _number(b)):
+            return float('nan')
+        try:
+            return compute(a, b)
+        except ZeroDivisionError:
+            if a == 0 or a != a:
+                return float('nan')
+            return float('inf') if (a > 0) == (b >= 0) else float('-inf')
+    return arithmetic
+
+
+BINARY = {
+    '===': _strict_equal,
+    '!==': lambda a, b: not _strict_equal(a, b),
+    '==': _loose_equal,
+    '!=': lambda a, b: not _loose_equal(a, b),
+    '<': _relation(lambda a, b: a < b),
+    '<=': _relation(lambda a, b: a <= b),
+    '>': _relation(lambda a, b: a > b),
+    '>=': _relation(lambda a, b: a >= b),
+    '+': _add,
+    '-': _arithmetic(lambda a, b: a - b),
+    '*': _arithmetic(lambda a, b: a * b),
+    '/': _arithmetic(lambda a, b: a / b),
+    # the sign follows the dividend, as in javascript
+    '%': _arithmetic(lambda a, b: math.fmod(a, b)),
+}
+
+
+def _tokenize(source):
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if match is None:
+            raise ValueError('unsupported alert condition: unexpected {0!r} at position {1}'.format(
+                source[position:position + 10].strip(), position))
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'number':
+            value = float(text) if any(c in text for c in '.eE') else int(text)
+        elif kind == 'string':
+            value = re.sub(r'\\(.)', lambda m: ESCAPES.get(m.group(1), m.group(1)), text[1:-1])
+        else:
+            value = text
+        tokens.append((kind, value, match.start(kind)))
+        position = match.end()
+    tokens.append(('end', None, len(source)))
+    return tokens
+
+
+class _Parser(object):
+    """Compiles tokens into nested closures by recursive descent
+    """
+
+    def __init__(self, source):
+        self.tokens = _tokenize(source)
+        self.index = 0
+
+    def peek(self, value=None):
+        kind, text, _ = self.tokens[self.index]
+        if value is None:
+            return kind != 'end'
+        return kind in ('op', 'name') and text == value
+
+    def take(self, value=None):
+        kind, text, position = self.tokens[self.index]
+        if value is not None and not (kind in ('op', 'name') and text == value):
+            found = 'the end' if kind == 'end' else repr(text)
+            raise ValueError('unsupported alert condition: expected {0!r} but found {1} at position {2}'.format(
+                value, found, position))
+        self.index += 1
+        return kind, text, position
+
+    def program(self):
+        statements = []
+        while self.peek():
+            statements.append(self.statement())
+        return _sequence(statements)
+
+    def statement(self):
+        if self.peek(';'):
+            self.take(';')
+            return lambda dweet: _no_return
+        if self.peek('{'):
+            self.take('{')
+            statements = []
+            while not self.peek('}'):
+                statements.append(self.statement())
+            self.take('}')
+            return _sequence(statements)
+        if self.peek('if'):
+            self.take('if')
+            self.take('(')
+            test = self.expression()
+            self.take(')')
+            then = self.statement()
+            otherwise = None
+            if self.peek('else'):
+                self.take('else')
+                otherwise = self.statement()
+            return _if(test, then, otherwise)
+        if self.peek('return'):
+            self.take('return')
+            if self.peek(';') or self.peek('}') or not self.peek():
+                value = lambda dweet: undefined  # noqa
+            else:
+                value = self.expression()
+            if self.peek(';'):
+                self.take(';')
+            return value
+        kind, text, position = self.tokens[self.index]
+        raise ValueError('unsupported alert condition: unexpected {0!r} at position {1}'.format(text, position))
+
+    def expression(self):
+        return self.logical_or()
+
+    def logical_or(self):
+        left = self.logical_and()
+        while self.peek('||'):
+            self.take('||')
+            left = _or(left, self.logical_and())
+        return left
+
+    def logical_and(self):
+        left = self.comparison()
+        while self.peek('&&'):
+            self.take('&&')
+            left = _and(left, self.comparison())
+        return left
+
+    def comparison(self):
+        left = self.additive()
+        for op in ('===', '!==', '==', '!=', '<=', '>=', '<', '>'):
+            if self.peek(op):
+                self.take(op)
+                return _binary(BINARY[op], left, self.additive())
+        return left
+
+    def additive(self):
+        left = self.term()
+        while self.peek('+') or self.peek('-'):
+            _, op, _ = self.take()
+            left = _binary(BINARY[op], left, self.term())
+        return left
+
+    def term(self):
+        left = self.unary()
+        while self.peek('*') or self.peek('/') or self.peek('%'):
+            _, op, _ = self.take()
+            left = _binary(BINARY[op], left, self.unary())
+        return left
+
+    def unary(self):
+        if self.peek('!'):
+            self.take('!')
+            operand = self.unary()
+            return lambda dweet: not _truthy(operand(dweet))
+        if self.peek('-'):
+            self.take('-')
+            return _binary(BINARY['-'], lambda dweet: 0, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, text, position = self.take()
+        if kind in ('number', 'string'):
+            return lambda dweet: text
+        if kind == 'op' and text == '(':
+            inner = self.expression()
+            self.take(')')
+            return inner
+        if kind == 'name' and text in LITERALS:
+            value = LITERALS[text]
+            return lambda dweet: value
+        if kind == 'name' and text == 'undefined':
+            return lambda dweet: undefined
+        if kind == 'name' and text == 'dweet':
+            path = []
+            while self.peek('.') or self.peek('['):
+                if self.peek('.'):
+                    self.take('.')
+                    kind, key, position = self.take()
+                    if kind != 'name':
+                        raise ValueError('unsupported alert condition: expected a field name at position {0}'.format(
+                            position))
+                else:
+                    self.take('[')
+                    kind, key, position = self.take()
+                    if kind != 'string':
+                        raise ValueError('unsupported alert condition: expected a quoted field name at position {0}'.format(
+                            position))
+                    self.take(']')
+                path.append(key)
+            return _lookup(path)
+        found = 'the end' if kind == 'end' else repr(text)
+        raise ValueError('unsupported alert condition: unexpected {0} at position {1}'.format(found, position))
+
+
+def _sequence(statements):
+    def run(dweet):
+        for statement in statements:
+            result = statement(dweet)
+            if result is not _no_return:
+                return result
+        return _no_return
+    return run
+
+
+def _if(test, then, otherwise):
+    def run(dweet):
+        if _truthy(test(dweet)):
+            return then(dweet)
+        if otherwise is not None:
+            return otherwise(dweet)
+        return _no_return
+    return run
+
+
+def _or(left, right):
+    def run(dweet):
+        value = left(dweet)
+        return value if _truthy(value) else right(dweet)
+    return run
+
+
+def _and(left, right):
+    def run(dweet):
+        value = left(dweet)
+        return right(dweet) if _truthy(value) else value
+    return run
+
+
+def _binary(op, left, right):
+    return lambda dweet: op(left(dweet), right(dweet))
+
+
+def _lookup(path):
+    def run(dweet):
+        value = dweet
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return undefined
+            value = value[key]
+        return value
+    return run
+
+
+def compile_condition(source):
+    """Compile an alert condition into a function which takes a dweet's
+    content and returns the condition's message, or `None` if it returns
+    nothing
+
+    Raises `ValueError` for conditions outside the supported subset.
+    """
+    run = _Parser(source).program()
+
+    def condition(content):
+        result = run(content)
+        if result is _no_return or result is undefined:
+            return None
+        return result
+    condition.source = source
+    return condition
+
+
+class AlertRule(object):
+    """A compiled condition on a thing, and the callback it triggers
+    """
+
+    def __init__(self, thing_name, condition, callback):
+        self.thing_name = thing_name
+        self.condition = condition
+        self.callback = callback
+        self.evaluate = compile_condition(condition)
+
+
+class AlertEngine(object):
+    """Evaluates alert conditions locally against dweets for many things.
+
+    Rules are indexed by thing, so each dweet is only checked against its
+    own thing's rules. When a condition returns a message, the rule's
+    callback is called with the thing's name, the message and the dweet on
+    one of `max_workers` threads.
+
+        >>> engine = AlertEngine()
+        >>> engine.add('this_is_a_thing', "if(dweet.alertValue > 10) return 'too high';", on_alert)
+        >>> engine.start()
+    """
+
+    def __init__(self, client=None, max_workers=4):
+        self.client = client or get_default_client()
+        self._rules = collections.defaultdict(tuple)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._subscriptions = {}
+        self._threads = {}
+        self._stopping = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, thing_name, condition, callback):
+        """Add a rule, compiling its condition, and return it
+        """
+        rule = AlertRule(thing_name, condition, callback)
+        with self._lock:
+            self._rules[thing_name] += (rule,)
+        return rule
+
+    def add_from_service(self, thing_name, key, callback):
+        """Add a rule mirroring the alert set on a thing with `set_alert`
+        """
+        alert = self.client.get_alert(thing_name, key)
+        return self.add(thing_name, alert['condition'], callback)
+
+    def remove(self, rule):
+        with self._lock:
+            self._rules[rule.thing_name] = tuple(r for r in self._rules[rule.thing_name] if r is not rule)
+
+    def rules(self, thing_name):
+        return list(self._rules.get(thing_name, ()))
+
+    def evaluate(self, dweet):
+        """Check a dweet against its thing's rules, dispatching the callbacks
+        of those that fire, and return the futures of those callbacks
+        """
+        rules = self._rules.get(dweet.get('thing'), ())
+        if not rules:
+            return []
+        content = dweet.get('content')
+        futures = []
+        for rule in rules:
+            message = rule.evaluate(content)
+            if message is not None:
+                futures.append(self._executor.submit(rule.callback, rule.thing_name, message, dweet))
+        return futures
+
+    def feed(self, dweets):
+        """Evaluate every dweet from an iterable, such as a subscription
+        """
+        for dweet in dweets:
+            self.evaluate(dweet)
+
+    def start(self, key_map=None, timeout=None):
+        """Subscribe to every thing with rules, in the background
+        """
+        key_map = key_map or {}
+        with self._lock:
+            thing_names = [thing_name for thing_name, rules in self._rules.items() if rules]
+        for thing_name in thing_names:
+            if thing_name in self._threads:
+                continue
+            subscription = Subscription(thing_name, timeout=timeout, key=key_map.get(thing_name), session=self.client)
+            thread = threading.Thread(target=self._listen, args=(subscription,), name='dweepy-alerts-' + thing_name)
+            thread.daemon = True
+            thread.start()
+            self._subscriptions[thing_name] = subscription
+            self._threads[thing_name] = thread
+
+    def _listen(self, subscription):
+        for dweet in subscription:
+            if self._stopping.is_set():
+                return
+            self.evaluate(dweet)
+
+    def close(self):
+        """Stop evaluating dweets and wait for running callbacks
+        """
+        self._stopping.set()
+        subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            subscription.close(wait=False)
+        for subscription in subscriptions:
+            subscription.join()
+        # nothing can evaluate a dweet once the threads are done, so the
+        # executor won't be handed callbacks after it's shut down
+        for thread in list(self._threads.values()):
+            thread.join()
+        self._executor.shutdown(wait=True)
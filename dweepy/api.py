@@ -4,126 +4,128 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-# stdlib imports
-import json
-
-try:
-    # python 3
-    from urllib.parse import quote
-except ImportError:
-    # python 2
-    from urllib import quote
-
-# third-party imports
-import requests
-
-
-# base url for all requests
-BASE_URL = 'https://dweet.io'
-
-
-class DweepyError(Exception):
-    pass
+# local imports
+from .client import BASE_URL  # noqa
+from .client import client_for
+from .exceptions import DweepyError  # noqa
 
 
 def _request(method, url, session=None, **kwargs):
     """Make HTTP request, raising an exception if it fails.
     """
-    url = BASE_URL + url
-
-    if session:
-        request_func = getattr(session, method)
-    else:
-        request_func = getattr(requests, method)
-    response = request_func(url, **kwargs)
-    # raise an exception if request is not successful
-    if not response.status_code == requests.codes.ok:
-        raise DweepyError('HTTP {0} response'.format(response.status_code))
-    response_json = response.json()
-    if response_json['this'] == 'failed':
-        raise DweepyError(response_json['because'])
-    return response_json['with']
+    return client_for(session)._request(method, url, **kwargs)
 
 
 def _send_dweet(payload, url, params=None, session=None):
     """Send a dweet to dweet.io
     """
-    data = json.dumps(payload)
-    headers = {'Content-type': 'application/json'}
-    return _request('post', url, data=data, headers=headers, params=params, session=session)
+    return client_for(session)._send_dweet(payload, url, params=params)
 
 
 def dweet(payload, session=None):
     """Send a dweet to dweet.io without naming your thing
     """
-    return _send_dweet(payload, '/dweet', session=session)
+    return client_for(session).dweet(payload)
 
 
 def dweet_for(thing_name, payload, key=None, session=None):
     """Send a dweet to dweet.io for a thing with a known name
     """
-    if key is not None:
-        params = {'key': key}
-    else:
-        params = None
-    return _send_dweet(payload, '/dweet/for/{0}'.format(thing_name), params=params, session=session)
+    return client_for(session).dweet_for(thing_name, payload, key=key)
 
 
 def get_latest_dweet_for(thing_name, key=None, session=None):
     """Read the latest dweet for a dweeter
     """
-    if key is not None:
-        params = {'key': key}
-    else:
-        params = None
-    return _request('get', '/get/latest/dweet/for/{0}'.format(thing_name), params=params, session=session)
+    return client_for(session).get_latest_dweet_for(thing_name, key=key)
 
 
 def get_dweets_for(thing_name, key=None, session=None):
     """Read all the dweets for a dweeter
     """
-    if key is not None:
-        params = {'key': key}
-    else:
-        params = None
-    return _request('get', '/get/dweets/for/{0}'.format(thing_name), params=params, session=None)
+    return client_for(session).get_dweets_for(thing_name, key=key)
+
+
+def get_latest_dweets_for_many(thing_names, key_map=None, max_workers=10, stream=False, session=None):
+    """Read the latest dweet for many dweeters in parallel
+
+    Returns a dict mapping each thing name to its dweets, or to the
+    `DweepyError` raised while reading them. With `stream=True` a generator
+    of `(thing_name, result)` tuples is returned instead, yielding each
+    result as soon as it arrives.
+    """
+    return client_for(session).get_latest_dweets_for_many(
+        thing_names, key_map=key_map, max_workers=max_workers, stream=stream)
+
+
+def get_dweets_for_many(thing_names, key_map=None, max_workers=10, stream=False, session=None):
+    """Read all the dweets for many dweeters in parallel
+
+    Results are returned as for `get_latest_dweets_for_many`.
+    """
+    return client_for(session).get_dweets_for_many(
+        thing_names, key_map=key_map, max_workers=max_workers, stream=stream)
 
 
 def remove_lock(lock, key, session=None):
     """Remove a lock (no matter what it's connected to).
     """
-    return _request('get', '/remove/lock/{0}'.format(lock), params={'key': key}, session=session)
+    return client_for(session).remove_lock(lock, key)
 
 
 def lock(thing_name, lock, key, session=None):
     """Lock a thing (prevents unauthed dweets for the locked thing)
     """
-    return _request('get', '/lock/{0}'.format(thing_name), params={'key': key, 'lock': lock}, session=session)
+    return client_for(session).lock(thing_name, lock, key)
 
 
 def unlock(thing_name, key, session=None):
     """Unlock a thing
     """
-    return _request('get', '/unlock/{0}'.format(thing_name), params={'key': key}, session=session)
+    return client_for(session).unlock(thing_name, key)
+
+
+def lock_many(thing_names, lock, key, max_workers=10, session=None):
+    """Lock many things in parallel
+
+    Things the client has already seen locked with `lock` are skipped.
+    Returns a dict mapping each thing name to a `BulkResult` of the action
+    taken and its result, or the `DweepyError` raised.
+    """
+    return client_for(session).lock_many(thing_names, lock, key, max_workers=max_workers)
 
 
 def set_alert(thing_name, who, condition, key, session=None):
     """Set an alert on a thing with the given condition
     """
-    return _request('get', '/alert/{0}/when/{1}/{2}'.format(
-        ','.join(who),
-        thing_name,
-        quote(condition),
-    ), params={'key': key}, session=session)
+    return client_for(session).set_alert(thing_name, who, condition, key)
 
 
 def get_alert(thing_name, key, session=None):
-    """Set an alert on a thing with the given condition
+    """Get the alert set on a thing
     """
-    return _request('get', '/get/alert/for/{0}'.format(thing_name), params={'key': key}, session=session)
+    return client_for(session).get_alert(thing_name, key)
 
 
 def remove_alert(thing_name, key, session=None):
     """Remove an alert for the given thing
     """
-    return _request('get', '/remove/alert/for/{0}'.format(thing_name), params={'key': key}, session=session)
+    return client_for(session).remove_alert(thing_name, key)
+
+
+def set_alerts(alerts, key, key_map=None, max_workers=10, session=None):
+    """Set alerts on many things in parallel
+
+    `alerts` maps thing names to `(who, condition)` tuples; alerts the
+    client has already seen set are skipped. Results are returned as for
+    `lock_many`.
+    """
+    return client_for(session).set_alerts(alerts, key, key_map=key_map, max_workers=max_workers)
+
+
+def sync_alerts(desired_state, key, key_map=None, max_workers=10, remove_others=True, session=None):
+    """Make the alerts on many things match `desired_state` in parallel,
+    sending only the changes (see `DweepyClient.sync_alerts`)
+    """
+    return client_for(session).sync_alerts(
+        desired_state, key, key_map=key_map, max_workers=max_workers, remove_others=remove_others)
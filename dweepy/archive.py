@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""Records subscriptions to disk and replays them without a network.
+
+    >>> archive = DweetArchive('/var/lib/dweets')
+    >>> with DweetRecorder(archive, ['thing-a', 'thing-b']):
+    ...     ...
+
+and later, or in another process:
+
+    >>> for dweet in replay_dweets_from('thing-a', '/var/lib/dweets', speed=1.0):
+    ...     print(dweet)
+
+An archive is a directory of three append-only files: `dweets` holds each
+dweet's encoded record (its length and CRC-32 followed by the body),
+`index` a fixed-size entry per record of its thing, `created` timestamp and
+offset, and `things` the name of each thing in the index, one per line.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+# local imports
+from .buffer import INT64
+from .buffer import EpochParser
+from .client import get_default_client
+from .codec import default_codec
+from .compat import isstr
+from .compat import monotonic
+from .exceptions import DweepyError
+from .streaming import Subscription
+
+
+DATA_FILE = 'dweets'
+INDEX_FILE = 'index'
+THINGS_FILE = 'things'
+
+# each record is its body's length and CRC-32 followed by the body
+HEADER = struct.Struct('>II')
+# each index entry is a record's thing, `created` (in ms since the epoch)
+# and offset into the data file
+ENTRY = struct.Struct('>Iqq')
+
+
+def _bounds(start, end):
+    """Parse the dweet.io timestamps bounding a read into milliseconds
+    """
+    parse = EpochParser()
+    return (
+        parse(start) if isstr(start) else start,
+        parse(end) if isstr(end) else end,
+    )
+
+
+class _TimeIndex(object):
+    """The `created` timestamps and offsets of a run of records
+    """
+
+    def __init__(self):
+        self.times = array(INT64)
+        self.offsets = array(INT64)
+        self.ordered = True
+
+    def add(self, created, offset):
+        if self.times and created < self.times[-1]:
+            self.ordered = False
+        self.times.append(created)
+        self.offsets.append(offset)
+
+    def sort(self):
+        if self.ordered:
+            return
+        pairs = sorted(zip(self.times, self.offsets))
+        self.times = array(INT64, [created for created, _ in pairs])
+        self.offsets = array(INT64, [offset for _, offset in pairs])
+        self.ordered = True
+
+
+class DweetArchive(object):
+    """An append-only, indexed archive of dweets in a directory at `path`,
+    memory-mapped for reading.
+
+    Dweets are stored as `codec` encodes them and indexed by thing and
+    `created` timestamp, so reading one thing's dweets over a window of
+    time doesn't touch anyone else's. An archive opened with `readonly`
+    picks up dweets appended since (by another process) on each read;
+    otherwise any record left partly written by a crash is cut off when it
+    is opened.
+    """
+
+    def __init__(self, path, readonly=False, codec=None):
+        self.path = path
+        self.readonly = readonly
+        self.codec = codec or default_codec
+        self._lock = threading.RLock()
+        self._epoch_ms = EpochParser()
+        self._things = []
+        self._thing_ids = {}
+        self._index = []
+        # every record, in the order they were appended
+        self._arrivals = _TimeIndex()
+        self._indexed = 0
+        self._map = None
+        self._mapped = 0
+        self._closed = False
+        if readonly:
+            if not os.path.isdir(path):
+                raise DweepyError('no archive at {0}'.format(path))
+            self._data_size = os.path.getsize(self._file(DATA_FILE))
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self._recover()
+            self._data = open(self._file(DATA_FILE), 'ab')
+            self._index_file = open(self._file(INDEX_FILE), 'ab')
+            self._things_file = open(self._file(THINGS_FILE), 'ab')
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._arrivals.times)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _recover(self):
+        """Cut off anything a crash left partly written, so every indexed
+        record is whole and nothing follows the last of them
+        """
+        for name in (DATA_FILE, INDEX_FILE, THINGS_FILE):
+            open(self._file(name), 'ab').close()
+        with open(self._file(THINGS_FILE), 'r+b') as f:
+            things = f.read()
+            f.truncate(things.rfind(b'\n') + 1)
+        thing_count = things.count(b'\n')
+        index_size = os.path.getsize(self._file(INDEX_FILE))
+        index_size -= index_size % ENTRY.size
+        data_end = 0
+        with open(self._file(DATA_FILE), 'rb') as data:
+            with open(self._file(INDEX_FILE), 'r+b') as index:
+                while index_size:
+                    index.seek(index_size - ENTRY.size)
+                    thing_id, _, offset = ENTRY.unpack(index.read(ENTRY.size))
+                    data.seek(offset)
+                    header = data.read(HEADER.size)
+                    if thing_id < thing_count and len(header) == HEADER.size:
+                        length, crc = HEADER.unpack(header)
+                        body = data.read(length)
+                        if len(body) == length and zlib.crc32(body) & 0xffffffff == crc:
+                            data_end = offset + HEADER.size + length
+                            break
+                    index_size -= ENTRY.size
+                index.truncate(index_size)
+        with open(self._file(DATA_FILE), 'r+b') as data:
+            data.truncate(data_end)
+        self._data_size = data_end
+
+    def _load(self):
+        """Read index entries and thing names added since the last load
+        """
+        with open(self._file(THINGS_FILE), 'rb') as f:
+            names = f.read().split(b'\n')[:-1]
+        for name in names[len(self._things):]:
+            self._add_thing(json.loads(name.decode('utf-8')))
+        with open(self._file(INDEX_FILE), 'rb') as f:
+            f.seek(self._indexed)
+            entries = f.read()
+        entries = entries[:len(entries) - len(entries) % ENTRY.size]
+        for position in range(0, len(entries), ENTRY.size):
+            thing_id, created, offset = ENTRY.unpack_from(entries, position)
+            if thing_id >= len(self._things):
+                # its thing's name hasn't been written yet, pick it up next time
+                entries = entries[:position]
+                break
+            self._index[thing_id].add(created, offset)
+            self._arrivals.add(created, offset)
+        self._indexed += len(entries)
+        if self.readonly:
+            self._data_size = os.path.getsize(self._file(DATA_FILE))
+
+    def _add_thing(self, thing_name):
+        self._thing_ids[thing_name] = len(self._things)
+        self._things.append(thing_name)
+        self._index.append(_TimeIndex())
+
+    def _mapping(self):
+        """Return a map of the data file covering every indexed record
+        """
+        if self._mapped < self._data_size:
+            if not self.readonly:
+                self._data.flush()
+            with open(self._file(DATA_FILE), 'rb') as f:
+                # the old map is left for any reads in progress to finish with
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = len(self._map)
+        return self._map
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if not self.readonly:
+                for f in (self._data, self._index_file, self._things_file):
+                    f.close()
+
+    def sync(self):
+        """Flush everything appended so far to disk
+        """
+        if self.readonly:
+            return
+        with self._lock:
+            for f in (self._things_file, self._data, self._index_file):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, dweet):
+        """Add a dweet to the archive
+
+        Raises `ValueError` if the dweet has no valid `created` timestamp.
+        """
+        if self.readonly:
+            raise DweepyError('archive is read-only')
+        thing_name = dweet.get('thing')
+        created = dweet.get('created')
+        if not isstr(created):
+            raise ValueError('dweet has no created timestamp')
+        body = self.codec.dumps(dweet)
+        with self._lock:
+            if self._closed:
+                raise DweepyError('archive is closed')
+            # parsed under the lock, as the parser caches the last second
+            created = self._epoch_ms(created)
+            thing_id = self._thing_ids.get(thing_name)
+            if thing_id is None:
+                self._things_file.write(json.dumps(thing_name).encode('utf-8') + b'\n')
+                self._things_file.flush()
+                self._add_thing(thing_name)
+                thing_id = self._thing_ids[thing_name]
+            offset = self._data_size
+            self._data.write(HEADER.pack(len(body), zlib.crc32(body) & 0xffffffff) + body)
+            # the record must be written before anything points to it
+            self._data.flush()
+            self._index_file.write(ENTRY.pack(thing_id, created, offset))
+            self._index_file.flush()
+            self._data_size += HEADER.size + len(body)
+            self._indexed += ENTRY.size
+            self._index[thing_id].add(created, offset)
+            self._arrivals.add(created, offset)
+
+    def record(self, dweets):
+        """Append every dweet from an iterable (such as a subscription) as it
+        arrives, passing it through
+
+            >>> for dweet in archive.record(dweepy.listen_for_dweets_from('this_is_a_thing')):
+            ...     print(dweet)
+        """
+        for dweet in dweets:
+            self.append(dweet)
+            yield dweet
+
+    def things(self):
+        return list(self._things)
+
+    def count(self, thing_name):
+        thing_id = self._thing_ids.get(thing_name)
+        return 0 if thing_id is None else len(self._index[thing_id].times)
+
+    def _records(self, thing_name=None, start=None, end=None):
+        """Yield `(created, body)` for the records of `thing_name` (or all
+        things, in the order they were appended) created from `start` up to
+        (not including) `end`, as milliseconds since the epoch
+        """
+        with self._lock:
+            if self._closed:
+                raise DweepyError('archive is closed')
+            if self.readonly:
+                self._load()
+            if thing_name is None:
+                # not in `created` order, so scan them all
+                records = [
+                    (created, offset) for created, offset in zip(self._arrivals.times, self._arrivals.offsets)
+                    if (start is None or created >= start) and (end is None or created < end)
+                ]
+            else:
+                thing_id = self._thing_ids.get(thing_name)
+                if thing_id is None:
+                    return
+                index = self._index[thing_id]
+                index.sort()
+                first = 0 if start is None else bisect.bisect_left(index.times, start)
+                last = len(index.times) if end is None else bisect.bisect_left(index.times, end)
+                records = list(zip(index.times[first:last], index.offsets[first:last]))
+            data = self._mapping()
+        for created, offset in records:
+            length, _ = HEADER.unpack_from(data, offset)
+            begin = offset + HEADER.size
+            yield created, data[begin:begin + length]
+
+    def read(self, thing_name=None, start=None, end=None):
+        """Yield the dweets of `thing_name` (or every thing, in the order
+        they were appended) created from `start` up to `end`, given as
+        dweet.io timestamps such as `2014-03-19T10:45:28.934Z`
+
+        A thing's dweets come out in `created` order.
+        """
+        start, end = _bounds(start, end)
+        loads = self.codec.loads
+        for _, body in self._records(thing_name, start, end):
+            yield loads(body)
+
+
+class DweetRecorder(object):
+    """Records every dweet heard from `thing_names` into `archive` (a
+    `DweetArchive`) in the background, until closed
+
+    Subscriptions are made through `client` and passed `resume`. Dweets
+    without a valid timestamp are left out (counted in `skipped`).
+    """
+
+    def __init__(self, archive, thing_names, client=None, resume=False):
+        self.archive = archive
+        self.thing_names = list(thing_names)
+        self.client = client or get_default_client()
+        self.resume = resume
+        self.skipped = 0
+        self._skipped_lock = threading.Lock()
+        self._subscriptions = []
+        self._threads = []
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        for thing_name in self.thing_names:
+            subscription = Subscription(thing_name, timeout=None, session=self.client, resume=self.resume)
+            self._subscriptions.append(subscription)
+            thread = threading.Thread(target=self._record, args=(subscription,), name='dweepy-recorder-' + thing_name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _record(self, subscription):
+        for dweet in subscription:
+            if self._closed.is_set():
+                return
+            try:
+                self.archive.append(dweet)
+            except ValueError:
+                with self._skipped_lock:
+                    self.skipped += 1
+
+    def close(self):
+        """Stop recording, waiting for the subscriptions to end (the archive
+        is left open)
+        """
+        self._closed.set()
+        for subscription in self._subscriptions:
+            subscription.close(wait=False)
+        for subscription in self._subscriptions:
+            subscription.join()
+        for thread in self._threads:
+            thread.join()
+
+
+def replay_dweets_from(thing_name, archive, timeout=None, speed=None, start=None, end=None, query=None,
+                       sleep=time.sleep):
+    """Replay recorded dweets as if from `listen_for_dweets_from`
+
+    `archive` is a `DweetArchive` or the path of one. Dweets come out as
+    fast as they can be read, or when `speed` is given, spaced out by the
+    time between them divided by `speed` (so `1.0` is real time). Pass
+    `None` as `thing_name` to replay every thing's dweets in the order they
+    were recorded. `start`, `end` and `query` narrow down the dweets as for
+    `DweetArchive.read` and `listen_for_dweets_from`, and replaying stops
+    after `timeout` seconds if it's given.
+    """
+    if isstr(archive):
+        archive = DweetArchive(archive, readonly=True)
+    start, end = _bounds(start, end)
+    loads = archive.codec.loads
+    started = monotonic()
+    deadline = None if timeout is None else started + timeout
+    first = None
+    for created, body in archive._records(thing_name, start, end):
+        if speed:
+            if first is None:
+                first = created
+            due = started + (created - first) / 1000.0 / speed
+            if deadline is not None and due > deadline:
+                return
+            delay = due - monotonic()
+            if delay > 0:
+                sleep(delay)
+        elif deadline is not None and monotonic() > deadline:
+            return
+        if query is not None:
+            if not query.might_match(body):
+                continue
+            dweet = query.apply(loads(body))
+            if dweet is None:
+                continue
+        else:
+            dweet = loads(body)
+        yield dweet
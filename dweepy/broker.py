@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""Fans dweets from one set of subscriptions out to many local processes.
+
+    >>> with DweetBroker('/tmp/dweepy.sock', ['thing-a', 'thing-b']):
+    ...     ...
+
+and then, in any number of other processes:
+
+    >>> for dweet in subscribe('/tmp/dweepy.sock', ['thing-*']):
+    ...     print(dweet)
+
+Subscribers connect over a Unix socket, so this isn't available on Windows.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import fnmatch
+import json
+import os
+import socket
+import threading
+
+# local imports
+from .client import get_default_client
+from .compat import monotonic
+from .exceptions import DweepyError
+from .streaming import StreamDecoder
+from .streaming import Subscription
+
+
+# drop a slow subscriber's oldest pending dweets to make room for new ones
+POLICY_DROP = 'drop'
+# wait for a slow subscriber to catch up, disconnecting it after a while
+POLICY_BLOCK = 'block'
+
+POLICIES = (POLICY_DROP, POLICY_BLOCK)
+
+
+def _is_glob(pattern):
+    return any(c in pattern for c in '*?[')
+
+
+class _Subscriber(object):
+    """A connected subscriber, with the dweets waiting to be sent to it
+    """
+
+    def __init__(self, sock, patterns, policy, max_pending):
+        self.sock = sock
+        self.patterns = patterns
+        self.policy = policy
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self._matches = {}
+
+    def matches(self, thing_name):
+        match = self._matches.get(thing_name)
+        if match is None:
+            match = self._matches[thing_name] = any(
+                fnmatch.fnmatchcase(thing_name, pattern) for pattern in self.patterns
+            )
+        return match
+
+    def put(self, line, block_timeout):
+        """Queue a line, returning False if the subscriber should be cut off
+        """
+        with self.cond:
+            if len(self.pending) >= self.max_pending:
+                if self.policy == POLICY_DROP:
+                    self.pending.popleft()
+                    self.dropped += 1
+                else:
+                    deadline = monotonic() + block_timeout
+                    while len(self.pending) >= self.max_pending and not self.closed:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            return False
+                        self.cond.wait(remaining)
+            if self.closed:
+                return False
+            self.pending.append(line)
+            self.cond.notify_all()
+        return True
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self.sock.close()
+
+    def run(self):
+        """Send queued lines until the subscriber goes away
+        """
+        try:
+            while True:
+                with self.cond:
+                    while not self.pending and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    lines = list(self.pending)
+                    self.pending.clear()
+                    # wake up anything blocked waiting for room
+                    self.cond.notify_all()
+                self.sock.sendall(b''.join(lines))
+        except (IOError, OSError):
+            pass
+        finally:
+            self.close()
+
+
+class DweetBroker(object):
+    """Holds one subscription per thing and relays dweets to local subscribers
+    over a Unix socket at `path`.
+
+    Subscribers pick things by name or glob (see `subscribe`); globs match
+    `thing_names` and anything already subscribed to, while exact names
+    start a subscription if there isn't one. Subscriptions are made through
+    `client` and passed `resume`.
+
+    Each subscriber gets up to `max_pending` dweets queued for it. Beyond
+    that `policy` (which subscribers may override) decides what happens:
+    `POLICY_DROP` discards its oldest queued dweets, while `POLICY_BLOCK`
+    holds up delivery of the thing's dweets to everyone for up to
+    `block_timeout` seconds and then disconnects it.
+    """
+
+    def __init__(self, path, thing_names=(), client=None, policy=POLICY_DROP, max_pending=1000,
+                 block_timeout=5.0, resume=False):
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of {0}'.format(', '.join(POLICIES)))
+        self.path = path
+        self.client = client or get_default_client()
+        self.policy = policy
+        self.max_pending = max_pending
+        self.block_timeout = block_timeout
+        self.resume = resume
+        self.delivered = 0
+        self.disconnected = 0
+        self._thing_names = list(thing_names)
+        self._upstream = {}
+        self._subscribers = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        if os.path.exists(self.path):
+            # left behind by a broker which didn't shut down cleanly
+            os.remove(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(128)
+        self._spawn(self._accept, 'dweepy-broker')
+        for thing_name in self._thing_names:
+            self._ensure_upstream(thing_name)
+        return self
+
+    def close(self):
+        """Disconnect every subscriber and upstream subscription, stop
+        accepting new subscribers and wait for the broker's threads to exit
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            subscribers = list(self._subscribers)
+            upstream = list(self._upstream.values())
+            threads = list(self._threads)
+        for subscription in upstream:
+            subscription.close(wait=False)
+        try:
+            # closing alone doesn't wake a thread blocked in accept
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError):
+            pass
+        self._sock.close()
+        for subscriber in subscribers:
+            subscriber.close()
+        for subscription in upstream:
+            subscription.join()
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'things': sorted(self._upstream),
+                'subscribers': len(self._subscribers),
+                'delivered': self.delivered,
+                'dropped': sum(subscriber.dropped for subscriber in self._subscribers),
+                'disconnected': self.disconnected,
+            }
+
+    def _spawn(self, target, name, *args):
+        thread = threading.Thread(target=target, name=name, args=args)
+        thread.daemon = True
+        with self._lock:
+            # finished threads needn't be kept for close to join
+            self._threads = [t for t in self._threads if t.is_alive()]
+            self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def _ensure_upstream(self, thing_name):
+        with self._lock:
+            if self._closed or thing_name in self._upstream:
+                return
+            subscription = self._upstream[thing_name] = Subscription(
+                thing_name, timeout=None, session=self.client, resume=self.resume
+            )
+        self._spawn(self._relay, 'dweepy-broker-' + thing_name, thing_name, subscription)
+
+    def _relay(self, thing_name, subscription):
+        """Relay a thing's dweets to its subscribers until the broker closes
+        """
+        for dweet in subscription:
+            if self._closed:
+                return
+            self._dispatch(thing_name, dweet)
+
+    def _dispatch(self, thing_name, dweet):
+        # encoded once however many subscribers there are
+        line = self.client.codec.dumps(dweet) + b'\n'
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.matches(thing_name)]
+        for subscriber in subscribers:
+            if subscriber.put(line, self.block_timeout):
+                with self._lock:
+                    self.delivered += 1
+            else:
+                self._remove(subscriber)
+
+    def _remove(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.remove(subscriber)
+            self.disconnected += 1
+        subscriber.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._sock.accept()
+            except (IOError, OSError):
+                # closed
+                return
+            self._spawn(self._handshake, 'dweepy-broker-subscriber', sock)
+
+    def _handshake(self, sock):
+        """Read a subscriber's request, a JSON line such as
+        `{"things": ["thing-a", "sensor-*"], "policy": "drop"}`
+        """
+        try:
+            sock.settimeout(self.block_timeout)
+            request = b''
+            while not request.endswith(b'\n'):
+                data = sock.recv(4096)
+                if not data:
+                    raise ValueError('subscriber hung up')
+                request += data
+            sock.settimeout(None)
+            request = json.loads(request.decode('utf-8'))
+            patterns = list(request['things'])
+            policy = request.get('policy') or self.policy
+            if policy not in POLICIES:
+                raise ValueError('unknown policy')
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            sock.close()
+            return
+        subscriber = _Subscriber(sock, patterns, policy, self.max_pending)
+        with self._lock:
+            if self._closed:
+                sock.close()
+                return
+            self._subscribers.append(subscriber)
+        for pattern in patterns:
+            if not _is_glob(pattern):
+                self._ensure_upstream(pattern)
+        subscriber.run()
+        self._remove(subscriber)
+
+
+def subscribe(path, thing_names, policy=None, timeout=None, codec=None, query=None):
+    """Subscribe to dweets relayed by the `DweetBroker` at `path`
+
+    `thing_names` may include glob patterns such as `sensor-*`. Yields
+    dweets until `timeout` seconds pass (if given) or the broker goes away,
+    asking it to treat this subscriber with `policy` if it falls behind.
+    Dweets are filtered by `query` (a `DweetQuery`) if it's given.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError) as e:
+        sock.close()
+        raise DweepyError('could not connect to broker at {0}: {1}'.format(path, e))
+    deadline = None if timeout is None else monotonic() + timeout
+    decoder = StreamDecoder(codec=codec, query=query)
+    try:
+        sock.sendall(json.dumps({'things': list(thing_names), 'policy': policy}).encode('utf-8') + b'\n')
+        while True:
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return
+                sock.settimeout(remaining)
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                return
+            if not data:
+                return
+            for dweet in decoder.feed(data):
+                yield dweet
+    finally:
+        sock.close()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import calendar
+import collections
+import numbers
+from array import array
+
+# third-party imports (all optional)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+NAN = float('nan')
+
+try:
+    array(str('q'))
+    INT64 = str('q')
+except ValueError:
+    # python 2's arrays have no long long
+    INT64 = str('l')
+
+# names of the columns which don't come from the content
+RESERVED = ('created', 'thing')
+
+# summary of one thing's values for a field over one window of time
+Window = collections.namedtuple('Window', ['thing', 'start', 'count', 'min', 'max', 'mean'])
+
+
+def _numeric_fields(content, prefix=''):
+    """Yield `(path, value)` for every number in `content`, with the keys of
+    nested objects joined by dots
+    """
+    for name, value in content.items():
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, numbers.Real):
+            yield prefix + name, value
+        elif isinstance(value, dict):
+            for field in _numeric_fields(value, prefix + name + '.'):
+                yield field
+
+
+class EpochParser(object):
+    """Parses dweet.io timestamps such as `2014-03-19T10:45:28.934Z` into
+    milliseconds since the epoch
+    """
+
+    def __init__(self):
+        # consecutive dweets mostly share the same second, so remember the last
+        self._second = None
+        self._second_ms = 0
+
+    def __call__(self, created):
+        second = created[:19]
+        if second != self._second:
+            self._second_ms = calendar.timegm((
+                int(second[0:4]), int(second[5:7]), int(second[8:10]),
+                int(second[11:13]), int(second[14:16]), int(second[17:19]),
+            )) * 1000
+            self._second = second
+        fraction = created[20:23].rstrip('Z') if created[19:20] == '.' else ''
+        return self._second_ms + (int(fraction.ljust(3, '0')) if fraction else 0)
+
+
+class DweetBuffer(object):
+    """Accumulates dweets compactly in typed, array-backed columns.
+
+    Each dweet's `created` timestamp is parsed once into milliseconds since
+    the epoch (`timestamps`), its thing is interned and stored as an index
+    into `things` (`thing_ids`) and every number in its content goes into a
+    float column named by its path (nested keys joined by dots), with NaN
+    marking dweets which lacked it. Other content is dropped, as are dweets
+    without a parseable timestamp (counted in `skipped`).
+
+        >>> buf = DweetBuffer()
+        >>> buf.extend(dweepy.listen_for_dweets_from('this_is_a_thing', timeout=60))
+        >>> buf.aggregate('temperature', interval=10)
+    """
+
+    def __init__(self, dweets=()):
+        self.timestamps = array(INT64)
+        self.thing_ids = array(str('i'))
+        self.things = []
+        self.skipped = 0
+        self._thing_ids = {}
+        self._columns = collections.OrderedDict()
+        self._epoch_ms = EpochParser()
+        self.extend(dweets)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, dweet):
+        """Add a dweet to the buffer
+        """
+        try:
+            timestamp = self._epoch_ms(dweet['created'])
+        except (KeyError, TypeError, ValueError):
+            self.skipped += 1
+            return
+        thing_name = dweet.get('thing')
+        thing_id = self._thing_ids.get(thing_name)
+        if thing_id is None:
+            thing_id = self._thing_ids[thing_name] = len(self.things)
+            self.things.append(thing_name)
+        row = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        self.thing_ids.append(thing_id)
+        content = dweet.get('content')
+        if not isinstance(content, dict):
+            return
+        for name, value in _numeric_fields(content):
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = array(str('d'))
+            if len(column) < row:
+                # columns are only padded out when they next get a value
+                column.extend(array(str('d'), [NAN]) * (row - len(column)))
+            column.append(value)
+
+    def extend(self, dweets):
+        """Add every dweet in an iterable (such as a subscription) to the buffer
+        """
+        for dweet in dweets:
+            self.append(dweet)
+
+    @property
+    def fields(self):
+        """Names of the content columns, in the order they were first seen
+        """
+        return list(self._columns)
+
+    def column(self, field):
+        """Return the values of a content field, one per dweet
+        """
+        column = self._columns[field]
+        if len(column) < len(self):
+            column.extend(array(str('d'), [NAN]) * (len(self) - len(column)))
+        return column
+
+    def nbytes(self):
+        """Bytes held by the columns (not counting the interned thing names)
+        """
+        columns = [self.timestamps, self.thing_ids] + list(self._columns.values())
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def aggregate(self, field, interval, thing_name=None):
+        """Summarise a field per thing over windows of `interval` seconds
+
+        Returns a `Window` for each thing and window with values (for just
+        `thing_name` if it's given), ordered by thing then time. Window
+        starts are in milliseconds since the epoch.
+        """
+        width = int(interval * 1000)
+        only = self._thing_ids.get(thing_name, -1) if thing_name is not None else None
+        windows = {}
+        for timestamp, thing_id, value in zip(self.timestamps, self.thing_ids, self.column(field)):
+            if value != value or (only is not None and thing_id != only):
+                # NaN, i.e. missing
+                continue
+            key = (thing_id, timestamp - timestamp % width)
+            stats = windows.get(key)
+            if stats is None:
+                windows[key] = [1, value, value, value]
+            else:
+                stats[0] += 1
+                if value < stats[1]:
+                    stats[1] = value
+                if value > stats[2]:
+                    stats[2] = value
+                stats[3] += value
+        return sorted(
+            (Window(self.things[thing_id], start, count, low, high, total / count)
+             for (thing_id, start), (count, low, high, total) in windows.items()),
+            key=lambda window: (window.thing, window.start),
+        )
+
+    def _export_names(self):
+        """Pair each content field with its name in exports, which is prefixed
+        with `content.` if it clashes with a reserved column
+        """
+        return [(field, 'content.' + field if field in RESERVED else field) for field in self._columns]
+
+    def to_numpy(self):
+        """Return the columns as NumPy arrays sharing the buffer's memory
+
+        `created` is a `datetime64[ms]` array, `thing` holds indexes into
+        `things` and the content fields are float arrays. The buffer can't
+        grow while any of these arrays are alive.
+        """
+        if numpy is None:
+            raise ImportError('DweetBuffer.to_numpy requires numpy')
+        arrays = collections.OrderedDict()
+        arrays['created'] = numpy.frombuffer(self.timestamps, dtype=numpy.int64).view('datetime64[ms]')
+        arrays['thing'] = numpy.frombuffer(self.thing_ids, dtype=numpy.int32)
+        for field, name in self._export_names():
+            arrays[name] = numpy.frombuffer(self.column(field), dtype=numpy.float64)
+        return arrays
+
+    def to_arrow(self):
+        """Return the buffer as a `pyarrow.Table` sharing its memory
+
+        `thing` is dictionary encoded. The buffer can't grow while the table
+        is alive.
+        """
+        if pyarrow is None:
+            raise ImportError('DweetBuffer.to_arrow requires pyarrow')
+        rows = len(self)
+
+        def wrap(data_type, column):
+            return pyarrow.Array.from_buffers(data_type, rows, [None, pyarrow.py_buffer(column)])
+
+        arrays = [
+            wrap(pyarrow.timestamp('ms', tz='UTC'), self.timestamps),
+            pyarrow.DictionaryArray.from_arrays(wrap(pyarrow.int32(), self.thing_ids), pyarrow.array(self.things)),
+        ]
+        names = list(RESERVED)
+        for field, name in self._export_names():
+            arrays.append(wrap(pyarrow.float64(), self.column(field)))
+            names.append(name)
+        return pyarrow.Table.from_arrays(arrays, names=names)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import threading
+
+# local imports
+from .compat import monotonic
+
+
+# dweet.io only holds on to the last 500 dweets for a thing
+MAX_HISTORY = 500
+
+
+def latest_key(thing_name, key=None):
+    """Cache key for `get_latest_dweet_for`
+    """
+    return ('latest', thing_name, key)
+
+
+def dweets_key(thing_name, key=None):
+    """Cache key for `get_dweets_for`
+    """
+    return ('dweets', thing_name, key)
+
+
+class _Flight(object):
+    """A load in progress which concurrent misses for the same key wait on
+    """
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DweetCache(object):
+    """A bounded LRU cache of read responses, each valid for `ttl` seconds.
+
+    Install one on a client (`DweepyClient(cache=DweetCache())`) to serve
+    `get_latest_dweet_for` and `get_dweets_for` from memory. Concurrent
+    misses for the same thing are coalesced into a single request.
+
+    Values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize=1024, ttl=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._entries = collections.OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start empty
+        return self.__class__, (self.maxsize, self.ttl)
+
+    def _after_fork(self):
+        # the requests in flight belong to threads the child doesn't have
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Return the cache's counters and current size
+
+        `coalesced` counts the misses which waited on another caller's
+        request rather than sending their own.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'size': len(self._entries),
+            }
+
+    def get(self, cache_key, loader):
+        """Return the cached value for `cache_key`, calling `loader` on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > monotonic():
+                    # re-insert to mark as most recently used
+                    del self._entries[cache_key]
+                    self._entries[cache_key] = entry
+                    self.hits += 1
+                    return value
+                del self._entries[cache_key]
+            self.misses += 1
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            self.put(cache_key, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[cache_key]
+            flight.event.set()
+
+    def put(self, cache_key, value, pinned=False):
+        """Store `value`, evicting the least recently used entry if full
+
+        Pinned entries don't expire until they're unpinned.
+        """
+        expires = None if pinned else monotonic() + self.ttl
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = (value, expires)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, cache_key=None):
+        """Drop one entry, or every entry if no key is given
+        """
+        with self._lock:
+            if cache_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(cache_key, None)
+
+    def warm_from(self, thing_name, dweets, key=None):
+        """Keep a thing's entries up to date from a stream of its dweets
+
+        `dweets` is typically a `listen_for_dweets_from` subscription and is
+        consumed on a background thread. While it's running the thing's
+        entries are pinned, so reads are served locally; once it ends they
+        expire normally. Returns the thread.
+        """
+        thread = threading.Thread(
+            target=self._warm,
+            args=(thing_name, dweets, key),
+            name='dweepy-cache-{0}'.format(thing_name),
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _warm(self, thing_name, dweets, key):
+        try:
+            for dweet in dweets:
+                self.put(latest_key(thing_name, key), [dweet], pinned=True)
+                with self._lock:
+                    entry = self._entries.get(dweets_key(thing_name, key))
+                if entry is not None:
+                    history = [dweet] + entry[0][:MAX_HISTORY - 1]
+                    self.put(dweets_key(thing_name, key), history, pinned=True)
+        finally:
+            with self._lock:
+                expires = monotonic() + self.ttl
+                for cache_key in (latest_key(thing_name, key), dweets_key(thing_name, key)):
+                    entry = self._entries.get(cache_key)
+                    if entry is not None and entry[1] is None:
+                        self._entries[cache_key] = (entry[0], expires)
@@ -0,0 +1,673 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import os
+import re
+import sys
+import threading
+import weakref
+
+try:
+    # python 3
+    from urllib.parse import quote
+except ImportError:
+    # python 2
+    from urllib import quote
+
+# local imports
+from .cache import dweets_key
+from .cache import latest_key
+from .codec import default_codec
+from .compat import monotonic
+from .compat import requests_errors
+from .exceptions import DweepyConnectionError
+from .exceptions import DweepyError
+from .exceptions import DweepyHTTPError
+from .exceptions import DweepyRateLimitError
+from .instrumentation import emit
+from .instrumentation import endpoint_for
+from .resilience import ResiliencePolicy
+from .resilience import parse_retry_after
+
+
+# base url for all requests, set DWEEPY_BASE_URL to point dweepy elsewhere
+# (e.g. at a `dweepy.testing.FakeDweetServer`)
+BASE_URL = os.environ.get('DWEEPY_BASE_URL', 'https://dweet.io').rstrip('/')
+_DEFAULT_BASE_URL = BASE_URL
+
+
+def default_base_url():
+    """Return the base url for clients which weren't given one
+
+    As well as here, `BASE_URL` may be overridden in `dweepy.api` or
+    `dweepy.streaming`, as it could be before clients existed.
+    """
+    if BASE_URL != _DEFAULT_BASE_URL:
+        return BASE_URL.rstrip('/')
+    package = __name__.rpartition('.')[0]
+    for module_name in ('api', 'streaming'):
+        module = sys.modules.get(package + '.' + module_name)
+        base_url = getattr(module, 'BASE_URL', _DEFAULT_BASE_URL)
+        if base_url != _DEFAULT_BASE_URL:
+            return base_url.rstrip('/')
+    return _DEFAULT_BASE_URL
+
+
+# the HTTP stack to send requests with: `requests`, or `stdlib` for the
+# lighter `dweepy.transport.StdlibSession`; set DWEEPY_TRANSPORT to change it
+TRANSPORTS = ('requests', 'stdlib')
+TRANSPORT = os.environ.get('DWEEPY_TRANSPORT', 'requests')
+
+# dweet.io's reason for rejecting throttled requests reads something like
+# "Rate limit exceeded, try again in 1 second(s)."
+RATE_LIMIT_PATTERN = re.compile(r'rate limit', re.IGNORECASE)
+RETRY_IN_PATTERN = re.compile(r'try again in (\d+) second', re.IGNORECASE)
+
+# what a bulk call did for a thing: `action` is `lock`, `set`, `remove` or
+# `unchanged`, `result` the response (`None` if unchanged) or the
+# `DweepyError` raised
+BulkResult = collections.namedtuple('BulkResult', ['action', 'result'])
+
+# every live client, so their sessions can be reset in a forked child
+_clients = weakref.WeakSet()
+
+# without `os.register_at_fork` (python < 3.7) clients check the process id
+# before using their session instead
+_CHECK_PID = not hasattr(os, 'register_at_fork')
+
+
+def check_status(status_code, headers):
+    """Raise `DweepyHTTPError` if a response's status isn't successful
+    """
+    if not status_code == 200:
+        raise DweepyHTTPError(
+            'HTTP {0} response'.format(status_code),
+            status_code=status_code,
+            retry_after=parse_retry_after(headers.get('Retry-After')),
+        )
+
+
+def unwrap_response(response_json):
+    """Return what a decoded dweet.io response holds, raising `DweepyError`
+    (or `DweepyRateLimitError` if throttled) if the request failed
+    """
+    if response_json['this'] == 'failed':
+        because = response_json['because']
+        if RATE_LIMIT_PATTERN.search(because):
+            match = RETRY_IN_PATTERN.search(because)
+            retry_after = float(match.group(1)) if match else None
+            raise DweepyRateLimitError(because, retry_after=retry_after)
+        raise DweepyError(because)
+    return response_json['with']
+
+
+class DweepyClient(object):
+    """A dweet.io client which reuses pooled connections across calls.
+
+    `pool_connections` is the number of per-host pools to cache,
+    `pool_maxsize` the number of connections kept alive per host,
+    `pool_block` whether to block (rather than open a throwaway connection)
+    when a host's pool is exhausted and `max_retries` is passed straight
+    through to the underlying `HTTPAdapter`. Setting `keep_alive` to False
+    closes connections after every request.
+
+    If an existing `session` is given it is used as-is and none of the pool
+    options are applied to it. Otherwise one is created, and the HTTP stack
+    imported, on first use. `transport` picks the HTTP stack: `requests`,
+    or `stdlib` for `http.client`, which only takes `pool_maxsize` and
+    `keep_alive` (see `dweepy.transport`).
+
+    Reads are served through `cache` (a `DweetCache`) when one is given.
+    Failed requests are retried, and subscriptions reconnect, as directed by
+    `policy` (a `ResiliencePolicy`). Note that `max_retries` only covers
+    failures to connect, whereas the policy covers whole requests.
+
+    Dweets are shaped by `rate_limiter` (a `RateLimiter`) when one is given;
+    any it won't allow raise `DweepyRateLimitError` without being sent.
+
+    Payloads and responses are (de)serialised by `codec`, which defaults to
+    the fastest JSON library installed (see `dweepy.codec`).
+
+    Dweets are shrunk and checked against a size budget by `encoder` (a
+    `PayloadEncoder`) when one is given; any over budget raise
+    `DweepyPayloadTooLargeError` without being sent.
+
+    Every request, dweet and subscription event is passed to each of `hooks`
+    (see `dweepy.instrumentation`), such as a `Metrics` collector.
+
+    The locks and alerts the client has set, removed or read are remembered,
+    so that `lock_many`, `set_alerts` and `sync_alerts` only send changes.
+
+    Clients are safe to share between threads: both transports lock their
+    connection pools. In a forked child (e.g. a gunicorn worker) a client
+    drops the connections it inherited and opens its own on first use.
+    Clients pickle as their configuration, so they can be sent to process
+    pool workers, where the copy starts with an empty pool, cache and
+    metrics; one given an existing `session` can't be pickled.
+    """
+
+    def __init__(self, session=None, base_url=None, pool_connections=10,
+                 pool_maxsize=10, pool_block=False, max_retries=0,
+                 keep_alive=True, cache=None, policy=None, rate_limiter=None,
+                 codec=None, hooks=None, transport=None, encoder=None):
+        self._base_url = base_url
+        self.cache = cache
+        self.policy = policy if policy is not None else ResiliencePolicy()
+        self.rate_limiter = rate_limiter
+        self.codec = codec or default_codec
+        self.encoder = encoder
+        self.hooks = list(hooks or ())
+        self.transport = transport or TRANSPORT
+        if self.transport not in TRANSPORTS:
+            raise ValueError('transport must be one of {0}'.format(', '.join(TRANSPORTS)))
+        self._session = session
+        self._owns_session = session is None
+        self._session_lock = threading.Lock()
+        self._pool_options = {
+            'pool_connections': pool_connections,
+            'pool_maxsize': pool_maxsize,
+            'pool_block': pool_block,
+            'max_retries': max_retries,
+            'keep_alive': keep_alive,
+        }
+        # thing name -> lock, and thing name -> (who, condition), as last
+        # seen by this client
+        self._locks = {}
+        self._alerts = {}
+        self._state_lock = threading.Lock()
+        self._pid = os.getpid()
+        _clients.add(self)
+
+    def __getstate__(self):
+        if not self._owns_session:
+            raise TypeError('a DweepyClient given an existing session cannot be pickled')
+        state = dict(self._pool_options)
+        state.update(
+            base_url=self._base_url,
+            cache=self.cache,
+            policy=self.policy,
+            rate_limiter=self.rate_limiter,
+            codec=self.codec,
+            hooks=self.hooks,
+            transport=self.transport,
+            encoder=self.encoder,
+        )
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _after_fork(self):
+        """Forget the parent process's connections and locks
+        """
+        self._pid = os.getpid()
+        self._session_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        if self._owns_session:
+            # dropped rather than closed, the sockets are shared with the
+            # parent which may still be using them
+            self._session = None
+        for helper in [self.cache, self.rate_limiter, self.encoder, self.policy.breaker,
+                       self.policy.retry.budget] + self.hooks:
+            reset = getattr(helper, '_after_fork', None)
+            if reset is not None:
+                reset()
+
+    @property
+    def base_url(self):
+        """The url requests are sent to, following any override of
+        `BASE_URL` unless the client was given its own
+        """
+        return self._base_url or default_base_url()
+
+    @base_url.setter
+    def base_url(self, base_url):
+        self._base_url = base_url
+
+    @property
+    def session(self):
+        """The session requests are sent through, created on first use
+        """
+        if _CHECK_PID and self._pid != os.getpid():
+            self._after_fork()
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._new_session(**self._pool_options)
+        return self._session
+
+    def _new_session(self, pool_connections, pool_maxsize, pool_block, max_retries, keep_alive):
+        if self.transport == 'stdlib':
+            from .transport import StdlibSession
+            return StdlibSession(pool_maxsize=pool_maxsize, keep_alive=keep_alive)
+        # imported here so that clients which never send a request (or use
+        # the stdlib transport) don't pay for importing requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=max_retries,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release all pooled connections (only if the session is ours)
+        """
+        if self._owns_session and self._session is not None:
+            self._session.close()
+
+    def _request(self, method, url, **kwargs):
+        """Make HTTP request, raising an exception if it fails.
+        """
+        path, url = url, self.base_url + url
+        if not self.hooks:
+            return self.policy.call(
+                lambda: self._send_request(method, url, **kwargs),
+                idempotent=method == 'get',
+            )
+        endpoint = endpoint_for(path)
+
+        def on_retry(attempt, delay, error):
+            emit(self.hooks, 'retry', method=method, endpoint=endpoint, url=url,
+                 attempt=attempt, delay=delay, error=error)
+
+        return self.policy.call(
+            lambda: self._send_instrumented(method, url, endpoint, **kwargs),
+            idempotent=method == 'get',
+            on_retry=on_retry,
+        )
+
+    def _send_instrumented(self, method, url, endpoint, **kwargs):
+        """Make a single attempt at a HTTP request, reporting it to the hooks
+        """
+        stats = {'status': None, 'ttfb': None, 'bytes_in': 0, 'decode_time': None}
+        data = kwargs.get('data')
+        emit(self.hooks, 'request_start', method=method, endpoint=endpoint, url=url)
+        started = monotonic()
+        error = None
+        try:
+            return self._send_request(method, url, stats=stats, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            emit(self.hooks, 'request_end', method=method, endpoint=endpoint, url=url,
+                 error=error, elapsed=monotonic() - started,
+                 bytes_out=len(data) if data else 0, **stats)
+
+    def _send_request(self, method, url, stats=None, should_decode=None, **kwargs):
+        """Make a single attempt at a HTTP request
+
+        Timings and sizes are filled into `stats` if it's given. If
+        `should_decode` is given it's called with the body of a successful
+        response, and if it returns False `None` is returned without decoding
+        it.
+        """
+        request_func = getattr(self.session, method)
+        response = request_func(url, **kwargs)
+        if stats is not None:
+            stats['status'] = response.status_code
+            stats['ttfb'] = response.elapsed.total_seconds()
+            stats['bytes_in'] = len(response.content)
+        check_status(response.status_code, response.headers)
+        if should_decode is not None and not should_decode(response.content):
+            return None
+        if stats is None:
+            response_json = self.codec.loads(response.content)
+        else:
+            started = monotonic()
+            response_json = self.codec.loads(response.content)
+            stats['decode_time'] = monotonic() - started
+        return unwrap_response(response_json)
+
+    def _read(self, cache_key, url, params=None):
+        """Make a GET request, through the cache if there is one
+        """
+        if self.cache is None:
+            return self._request('get', url, params=params)
+        return self.cache.get(cache_key, lambda: self._request('get', url, params=params))
+
+    def _send_dweet(self, payload, url, params=None, thing_name=None):
+        """Send a dweet to dweet.io
+        """
+        if self.encoder is None:
+            data = self.codec.dumps(payload)
+            headers = {'Content-type': 'application/json'}
+        else:
+            # encoded first so that dweets over budget don't use up tokens
+            data, headers, raw_bytes = self.encoder.encode(payload, thing_name, self.codec)
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(thing_name):
+            if self.hooks:
+                emit(self.hooks, 'dweet_dropped', thing=thing_name)
+            raise DweepyRateLimitError('dweet dropped by the local rate limiter')
+        if self.encoder is not None and self.hooks:
+            emit(self.hooks, 'dweet_encoded', thing=thing_name, raw_bytes=raw_bytes, bytes=len(data))
+        return self._request('post', url, data=data, headers=headers, params=params)
+
+    def dweet(self, payload):
+        """Send a dweet to dweet.io without naming your thing
+        """
+        return self._send_dweet(payload, '/dweet')
+
+    def dweet_for(self, thing_name, payload, key=None):
+        """Send a dweet to dweet.io for a thing with a known name
+        """
+        if key is not None:
+            params = {'key': key}
+        else:
+            params = None
+        return self._send_dweet(payload, '/dweet/for/{0}'.format(thing_name), params=params, thing_name=thing_name)
+
+    def get_latest_dweet_for(self, thing_name, key=None):
+        """Read the latest dweet for a dweeter
+        """
+        if key is not None:
+            params = {'key': key}
+        else:
+            params = None
+        return self._read(latest_key(thing_name, key), '/get/latest/dweet/for/{0}'.format(thing_name), params=params)
+
+    def get_dweets_for(self, thing_name, key=None):
+        """Read all the dweets for a dweeter
+        """
+        if key is not None:
+            params = {'key': key}
+        else:
+            params = None
+        return self._read(dweets_key(thing_name, key), '/get/dweets/for/{0}'.format(thing_name), params=params)
+
+    def get_latest_dweets_for_many(self, thing_names, key_map=None, max_workers=10, stream=False):
+        """Read the latest dweet for many dweeters in parallel
+        """
+        results = self._map(self.get_latest_dweet_for, thing_names, key_map, max_workers)
+        return results if stream else dict(results)
+
+    def get_dweets_for_many(self, thing_names, key_map=None, max_workers=10, stream=False):
+        """Read all the dweets for many dweeters in parallel
+        """
+        results = self._map(self.get_dweets_for, thing_names, key_map, max_workers)
+        return results if stream else dict(results)
+
+    def _map(self, read_func, thing_names, key_map, max_workers):
+        """Call `read_func` for every thing on `max_workers` threads, yielding
+        `(thing_name, result)` tuples as they complete
+
+        A `DweepyError` raised for one thing is yielded as its result rather
+        than aborting the others, with `requests` errors wrapped in a
+        `DweepyConnectionError` as the stdlib transport raises. Keep
+        `max_workers` at or below the pool's `pool_maxsize`, or surplus
+        connections are thrown away after use.
+        """
+        key_map = key_map or {}
+        calls = ((thing_name, read_func, (thing_name,), {'key': key_map.get(thing_name)})
+                 for thing_name in thing_names)
+        return self._run_many(calls, max_workers)
+
+    def _run_many(self, calls, max_workers):
+        """Make `(name, func, args, kwargs)` calls on `max_workers` threads,
+        yielding `(name, result)` tuples as they complete, as for `_map`
+        """
+        # imported here as most clients never make many calls at once
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import as_completed
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        try:
+            for name, func, args, kwargs in calls:
+                futures[executor.submit(func, *args, **kwargs)] = name
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except DweepyError as e:
+                    result = e
+                except requests_errors('RequestException') as e:
+                    result = DweepyConnectionError('request failed: {0!r}'.format(e))
+                    result.__cause__ = e
+                yield futures[future], result
+        finally:
+            # stop any outstanding calls if the caller gives up early
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _bulk(self, changes, unchanged, max_workers):
+        """Make the calls in `changes` (as for `_run_many`, but named by
+        `(thing_name, action)`) and return a dict of `BulkResult`s, including
+        the `unchanged` things
+        """
+        results = dict((thing_name, BulkResult('unchanged', None)) for thing_name in unchanged)
+        for (thing_name, action), result in self._run_many(changes, max_workers):
+            results[thing_name] = BulkResult(action, result)
+        return results
+
+    def forget(self, thing_names=None):
+        """Forget the locks and alerts seen for some things (or every thing),
+        so the next bulk call sends them whatever their state
+        """
+        with self._state_lock:
+            if thing_names is None:
+                self._locks.clear()
+                self._alerts.clear()
+            for thing_name in thing_names or ():
+                self._locks.pop(thing_name, None)
+                self._alerts.pop(thing_name, None)
+
+    def _remember(self, state, thing_name, value):
+        """Record a thing's lock or alert (`None` for none) after a call
+        """
+        with self._state_lock:
+            state[thing_name] = value
+
+    def _forget(self, state, thing_name):
+        """Forget a thing's lock or alert, as a failed call leaves it unknown
+        """
+        with self._state_lock:
+            state.pop(thing_name, None)
+
+    def remove_lock(self, lock, key):
+        """Remove a lock (no matter what it's connected to).
+        """
+        try:
+            result = self._request('get', '/remove/lock/{0}'.format(lock), params={'key': key})
+        finally:
+            # whether or not it worked, the things it locked are now unknown
+            with self._state_lock:
+                for thing_name, thing_lock in list(self._locks.items()):
+                    if thing_lock == lock:
+                        del self._locks[thing_name]
+        return result
+
+    def lock(self, thing_name, lock, key):
+        """Lock a thing (prevents unauthed dweets for the locked thing)
+        """
+        try:
+            result = self._request('get', '/lock/{0}'.format(thing_name), params={'key': key, 'lock': lock})
+        except DweepyError:
+            self._forget(self._locks, thing_name)
+            raise
+        self._remember(self._locks, thing_name, lock)
+        return result
+
+    def unlock(self, thing_name, key):
+        """Unlock a thing
+        """
+        try:
+            result = self._request('get', '/unlock/{0}'.format(thing_name), params={'key': key})
+        except DweepyError:
+            self._forget(self._locks, thing_name)
+            raise
+        self._remember(self._locks, thing_name, None)
+        return result
+
+    def lock_many(self, thing_names, lock, key, max_workers=10):
+        """Lock many things in parallel, skipping those already seen locked
+        with `lock`
+
+        Returns a dict mapping each thing name to a `BulkResult`.
+        """
+        # read once (it may be a generator) and without duplicates
+        thing_names = list(collections.OrderedDict.fromkeys(thing_names))
+        with self._state_lock:
+            unchanged = set(t for t in thing_names if self._locks.get(t) == lock)
+        changes = (((t, 'lock'), self.lock, (t, lock, key), {})
+                   for t in thing_names if t not in unchanged)
+        return self._bulk(changes, unchanged, max_workers)
+
+    def set_alert(self, thing_name, who, condition, key):
+        """Set an alert on a thing with the given condition
+        """
+        return self._set_alert(thing_name, who, condition, quote(condition), key)
+
+    def _set_alert(self, thing_name, who, condition, quoted_condition, key):
+        who = tuple(who)
+        try:
+            result = self._request('get', '/alert/{0}/when/{1}/{2}'.format(
+                ','.join(who),
+                thing_name,
+                quoted_condition,
+            ), params={'key': key})
+        except DweepyError:
+            self._forget(self._alerts, thing_name)
+            raise
+        self._remember(self._alerts, thing_name, (who, condition))
+        return result
+
+    def get_alert(self, thing_name, key):
+        """Get the alert set on a thing
+        """
+        result = self._request('get', '/get/alert/for/{0}'.format(thing_name), params={'key': key})
+        try:
+            who = tuple(recipient['address'] for recipient in result['recipients'])
+            self._remember(self._alerts, thing_name, (who, result['condition']))
+        except (KeyError, TypeError):
+            # not a response we understand, so don't remember anything
+            pass
+        return result
+
+    def remove_alert(self, thing_name, key):
+        """Remove an alert for the given thing
+        """
+        try:
+            result = self._request('get', '/remove/alert/for/{0}'.format(thing_name), params={'key': key})
+        except DweepyError:
+            self._forget(self._alerts, thing_name)
+            raise
+        self._remember(self._alerts, thing_name, None)
+        return result
+
+    def set_alerts(self, alerts, key, key_map=None, max_workers=10):
+        """Set alerts on many things in parallel, skipping those already seen
+        set the same way
+
+        `alerts` maps thing names to `(who, condition)` tuples. Returns a dict
+        mapping each thing name to a `BulkResult`.
+        """
+        return self.sync_alerts(alerts, key, key_map=key_map, max_workers=max_workers, remove_others=False)
+
+    def sync_alerts(self, desired_state, key, key_map=None, max_workers=10, remove_others=True):
+        """Make the alerts on many things match `desired_state`, in parallel
+
+        `desired_state` maps thing names to `(who, condition)` tuples, or to
+        `None` to remove the thing's alert. Only things whose alert differs
+        from what the client last saw (or that it hasn't seen) are sent, so
+        call `forget` (or `get_alert`) first for things changed elsewhere.
+        With `remove_others` the alerts of any other things the client has
+        seen set are removed too.
+
+        Returns a dict mapping each thing name to a `BulkResult`.
+        """
+        key_map = key_map or {}
+        desired = dict(
+            (thing_name, None if alert is None else (tuple(alert[0]), alert[1]))
+            for thing_name, alert in desired_state.items()
+        )
+        with self._state_lock:
+            current = dict(self._alerts)
+        if remove_others:
+            for thing_name, alert in current.items():
+                if alert is not None:
+                    desired.setdefault(thing_name, None)
+        # things share conditions, so quote each one once
+        quoted = dict((alert[1], quote(alert[1])) for alert in desired.values() if alert is not None)
+        unchanged = []
+        changes = []
+        for thing_name, alert in desired.items():
+            thing_key = key_map.get(thing_name, key)
+            if thing_name in current and current[thing_name] == alert:
+                unchanged.append(thing_name)
+            elif alert is None:
+                changes.append(((thing_name, 'remove'), self.remove_alert, (thing_name, thing_key), {}))
+            else:
+                who, condition = alert
+                changes.append(((thing_name, 'set'), self._set_alert,
+                                (thing_name, who, condition, quoted[condition], thing_key), {}))
+        return self._bulk(changes, unchanged, max_workers)
+
+
+# shared client used by the module-level functions in `dweepy.api`
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def _after_fork():
+    """Reset the shared state a forked child inherits, in case another
+    thread of the parent held a lock or a connection when it forked
+    """
+    global _default_client_lock
+    _default_client_lock = threading.Lock()
+    for client in list(_clients):
+        client._after_fork()
+
+
+if not _CHECK_PID:
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_default_client():
+    """Return the shared client, creating it on first use
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = DweepyClient()
+    return _default_client
+
+
+def set_default_client(client):
+    """Replace the shared client used by the module-level functions
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+def client_for(session=None):
+    """Return the client that should service a call made with `session`
+
+    `None` selects the shared default client, a `DweepyClient` is used as-is
+    and anything else is treated as a `requests.Session` to send through.
+    """
+    if session is None:
+        return get_default_client()
+    if isinstance(session, DweepyClient):
+        return session
+    return DweepyClient(session=session)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import json
+
+# third-party imports (all optional)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# local imports
+from .compat import isstr
+
+
+class JSONCodec(object):
+    """Encodes payloads and decodes responses using the stdlib `json` module.
+
+    Codecs always encode to UTF-8 bytes and accept either bytes or text to
+    decode. Subclasses swap in faster backends.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj):
+        # without separators json adds a space after every comma and colon
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def loads_record(self, line):
+        """Decode a line of dweet.io's stream, returning the dweet it holds
+
+        The stream carries each dweet as a JSON encoded string of JSON, which
+        would normally take two decodes. When the outer string's only escapes
+        are the quotes of the dweet within, unescaping those is enough to get
+        at the dweet and it's decoded in one pass, falling back to two passes
+        otherwise. Raises `ValueError` for lines which aren't valid JSON.
+        """
+        if line[:1] == b'"' and line[-1:] == b'"' and b'\\\\' not in line:
+            try:
+                return self.loads(line[1:-1].replace(b'\\"', b'"'))
+            except ValueError:
+                pass
+        record = self.loads(line)
+        if isstr(record):
+            record = self.loads(record)
+        return record
+
+
+class OrjsonCodec(JSONCodec):
+
+    name = 'orjson'
+
+    def dumps(self, obj):
+        try:
+            # stdlib json turns int and float keys into strings too
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers over 64 bits, which only the stdlib can encode
+            return JSONCodec.dumps(self, obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def loads_record(self, line):
+        # orjson unescapes strings faster than the one-pass fast path can
+        # check for and strip escapes, so just decode twice
+        record = orjson.loads(line)
+        if isstr(record):
+            record = orjson.loads(record)
+        return record
+
+
+class UjsonCodec(JSONCodec):
+
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+# available codecs, fastest first
+CODECS = [
+    codec for codec, module in ((OrjsonCodec, orjson), (UjsonCodec, ujson), (JSONCodec, json))
+    if module is not None
+]
+
+
+def get_codec(name=None):
+    """Return the named codec, or the fastest one installed if no name is given
+    """
+    if name is None:
+        return CODECS[0]()
+    for codec in CODECS:
+        if codec.name == name:
+            return codec()
+    raise ValueError('JSON codec {0!r} is not available'.format(name))
+
+
+# codec used by clients and subscriptions which aren't given one
+default_codec = get_codec()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import sys
+import time
+
+
+# python 2/3 compatibility shim for checking if value is a text type
+try:
+    basestring  # attempt to evaluate basestring
+
+    def isstr(s):
+        return isinstance(s, basestring)
+except NameError:
+    def isstr(s):
+        return isinstance(s, str)
+
+
+# python 2 has no monotonic clock, so fall back to wall clock time there
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+def requests_errors(*names):
+    """Return the named exception classes from `requests.exceptions`
+
+    `requests` is only imported when a client needs it, and until then
+    none of its exceptions can have been raised, so this returns an empty
+    tuple rather than importing it.
+    """
+    module = sys.modules.get('requests.exceptions')
+    if module is None:
+        return ()
+    return tuple(getattr(module, name) for name in names)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Shrinking dweets before they're sent.
+
+A `PayloadEncoder` installed on a client (`DweepyClient(encoder=...)`) runs
+every dweet through a pipeline of optional steps: floats are rounded to
+`precision` decimal places, keys are swapped for the abbreviations in
+`abbreviations` and the body is gzipped (`compress`). The encoded dweet is
+then checked against `budget` before it's sent.
+
+`precision` and `budget` may be a single value for every thing or a dict of
+per-thing values, and `abbreviations` is a dict mapping thing names to
+`{key: abbreviation}` dicts; in either dict the entry under `None` applies
+to things without one of their own.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import threading
+import zlib
+
+# local imports
+from .codec import default_codec
+from .exceptions import DweepyPayloadTooLargeError
+
+
+def _for_thing(setting, thing_name):
+    """Return a thing's own value of a setting, or the default
+    """
+    if isinstance(setting, dict):
+        return setting.get(thing_name, setting.get(None))
+    return setting
+
+
+def round_floats(value, precision):
+    """Return `value` with every float within it rounded to `precision`
+    decimal places
+    """
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, dict):
+        return dict((k, round_floats(v, precision)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [round_floats(v, precision) for v in value]
+    return value
+
+
+def rename_keys(value, names):
+    """Return `value` with the keys of every dict within it renamed as given
+    by `names` (keys not in `names` are kept)
+    """
+    if isinstance(value, dict):
+        return dict((names.get(k, k), rename_keys(v, names)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [rename_keys(v, names) for v in value]
+    return value
+
+
+def gzip_compress(data, level=6):
+    """Compress `data` into the gzip format
+    """
+    # wbits of 16 + 15 writes a gzip header and trailer, gzip.compress
+    # doesn't exist on python 2
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class PayloadEncoder(object):
+    """Encodes dweets through the pipeline described in `dweepy.encoding`.
+
+    Bodies are only gzipped when they're at least `compress_min_size` bytes
+    and compressing actually makes them smaller; dweet.io itself may not
+    accept gzipped bodies, so only turn `compress` on for servers which do.
+    The budget applies to the body as sent, so after compression.
+
+    `stats()` reports how many bytes the rounding, abbreviation and
+    compression have saved.
+    """
+
+    def __init__(self, precision=None, abbreviations=None, compress=False,
+                 compress_min_size=256, compress_level=6, budget=None):
+        self.precision = precision
+        self.abbreviations = abbreviations or {}
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
+        self.budget = budget
+        self.dweets = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start with empty counters
+        return self.__class__, (self.precision, self.abbreviations, self.compress,
+                                self.compress_min_size, self.compress_level, self.budget)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Return the number of dweets encoded, their total size before and
+        after encoding and the bytes saved
+        """
+        with self._lock:
+            return {
+                'dweets': self.dweets,
+                'raw_bytes': self.raw_bytes,
+                'sent_bytes': self.sent_bytes,
+                'saved_bytes': self.raw_bytes - self.sent_bytes,
+            }
+
+    def expand(self, content, thing_name=None):
+        """Undo a thing's key abbreviations in the content of a dweet read
+        back from dweet.io
+        """
+        names = _for_thing(self.abbreviations, thing_name)
+        if not names:
+            return content
+        return rename_keys(content, dict((v, k) for k, v in names.items()))
+
+    def encode(self, payload, thing_name=None, codec=default_codec):
+        """Encode a dweet, returning its body, the headers to send it with
+        and its size before encoding
+
+        Raises `DweepyPayloadTooLargeError` if the body is over the thing's
+        budget.
+        """
+        headers = {'Content-type': 'application/json'}
+        content = payload
+        precision = _for_thing(self.precision, thing_name)
+        if precision is not None:
+            content = round_floats(content, precision)
+        names = _for_thing(self.abbreviations, thing_name)
+        if names:
+            content = rename_keys(content, names)
+        data = codec.dumps(content)
+        # only pay for encoding the untouched payload when it was changed
+        raw_bytes = len(codec.dumps(payload)) if content is not payload else len(data)
+        if self.compress and len(data) >= self.compress_min_size:
+            compressed = gzip_compress(data, self.compress_level)
+            if len(compressed) < len(data):
+                data = compressed
+                headers['Content-Encoding'] = 'gzip'
+        budget = _for_thing(self.budget, thing_name)
+        if budget is not None and len(data) > budget:
+            raise DweepyPayloadTooLargeError(
+                'dweet of {0} bytes is over its budget of {1}'.format(len(data), budget),
+                size=len(data),
+                budget=budget,
+            )
+        with self._lock:
+            self.dweets += 1
+            self.raw_bytes += raw_bytes
+            self.sent_bytes += len(data)
+        return data, headers, raw_bytes
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+
+class DweepyError(Exception):
+    pass
+
+
+class DweepyHTTPError(DweepyError):
+    """dweet.io responded with an unsuccessful HTTP status
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super(DweepyHTTPError, self).__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class DweepyRateLimitError(DweepyHTTPError):
+    """dweet.io is throttling requests, `retry_after` says for how long
+    """
+
+    def __init__(self, message, retry_after=None):
+        super(DweepyRateLimitError, self).__init__(message, status_code=429, retry_after=retry_after)
+
+
+class CircuitOpenError(DweepyError):
+    """A call wasn't attempted as dweet.io looks to be unavailable
+    """
+
+    def __init__(self, message, retry_after=None):
+        super(CircuitOpenError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class DweepyConnectionError(DweepyError):
+    """The connection to dweet.io failed or dropped (raised by the stdlib
+    transport, `requests` raises its own errors), `sent` is False if the
+    request never reached it
+    """
+
+    def __init__(self, *args, **kwargs):
+        # sent is keyword-only, which python 2 can't spell
+        self.sent = kwargs.pop('sent', True)
+        super(DweepyConnectionError, self).__init__(*args, **kwargs)
+
+
+class DweepyTimeoutError(DweepyConnectionError):
+    """dweet.io took too long to respond
+    """
+
+
+class DweepyPayloadTooLargeError(DweepyError):
+    """A dweet wasn't sent as it's `size` bytes, over its `budget`
+    """
+
+    def __init__(self, message, size=None, budget=None):
+        super(DweepyPayloadTooLargeError, self).__init__(message)
+        self.size = size
+        self.budget = budget
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Hooks into what dweepy is doing, plus a built-in metrics collector.
+
+A hook is any callable taking `(event, fields)`, given to a client with
+`DweepyClient(hooks=[...])`. Clients without hooks skip building events
+entirely. The events are:
+
+`request_start`
+    `method`, `endpoint`, `url`
+`request_end`
+    `method`, `endpoint`, `url`, `status` (`None` if no response arrived),
+    `error` (the exception raised, if any), `elapsed` (seconds in total),
+    `ttfb` (seconds until the response headers were parsed), `bytes_out`,
+    `bytes_in` and `decode_time` (seconds spent decoding the JSON)
+`retry`
+    `method`, `endpoint`, `url`, `attempt`, `delay`, `error`
+`dweet_dropped`
+    `thing` (`None` for anonymous dweets), for dweets the client's rate
+    limiter wouldn't send
+`dweet_encoded`
+    `thing`, `raw_bytes` (the plain JSON size), `bytes` (the size sent), for
+    dweets shrunk by the client's encoder
+`stream_connect`
+    `thing`, `attempt`
+`stream_reconnect`
+    `thing`, `attempt`, `delay`, `error` (`None` if the stream just ended)
+`stream_backfill`
+    `thing`, `count` (dweets in the history since the last one heard,
+    before deduplication), for subscriptions resuming after a reconnect
+`stream_timeout`
+    `thing`, `elapsed`
+`stream_idle`
+    `thing`, `elapsed` (since anything was last heard), for subscriptions
+    replacing a connection silent for their `read_timeout`
+`dweet_yielded`
+    `thing`
+
+The stack underneath `requests` doesn't expose DNS, connect or TLS
+timings, so requests only report `ttfb` and `elapsed`.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import bisect
+import threading
+
+
+# endpoint names for request paths, so that metrics aren't labelled by thing
+ENDPOINTS = [
+    ('/get/latest/dweet/for/', 'get_latest_dweet_for'),
+    ('/get/dweets/for/', 'get_dweets_for'),
+    ('/get/alert/for/', 'get_alert'),
+    ('/remove/alert/for/', 'remove_alert'),
+    ('/remove/lock/', 'remove_lock'),
+    ('/dweet/for/', 'dweet_for'),
+    ('/dweet', 'dweet'),
+    ('/unlock/', 'unlock'),
+    ('/alert/', 'set_alert'),
+    ('/lock/', 'lock'),
+]
+
+
+def endpoint_for(path):
+    """Return the name of the API call for a request path
+    """
+    for prefix, name in ENDPOINTS:
+        if path.startswith(prefix):
+            return name
+    return 'other'
+
+
+def emit(hooks, event, **fields):
+    """Call every hook with the event
+    """
+    for hook in hooks:
+        hook(event, fields)
+
+
+class Histogram(object):
+    """Counts observations into cumulative buckets, Prometheus style
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Return `(upper bound, count)` pairs, ending with `+Inf`
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics(object):
+    """A hook which keeps counters and latency histograms of dweepy events.
+
+        >>> metrics = Metrics()
+        >>> client = DweepyClient(hooks=[metrics])
+        >>> print(metrics.to_prometheus())
+    """
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    DECODE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+
+    HELP = {
+        'dweepy_requests_total': ('counter', 'Requests made, by endpoint and outcome'),
+        'dweepy_request_duration_seconds': ('histogram', 'Request latency, by endpoint'),
+        'dweepy_json_decode_seconds': ('histogram', 'Time spent decoding responses, by endpoint'),
+        'dweepy_bytes_sent_total': ('counter', 'Request body bytes sent'),
+        'dweepy_bytes_received_total': ('counter', 'Response body bytes received'),
+        'dweepy_retries_total': ('counter', 'Requests retried, by endpoint'),
+        'dweepy_dweets_dropped_total': ('counter', 'Dweets dropped by the local rate limiter'),
+        'dweepy_bytes_saved_total': ('counter', 'Dweet body bytes saved by the encoder'),
+        'dweepy_stream_connects_total': ('counter', 'Subscription connection attempts'),
+        'dweepy_stream_reconnects_total': ('counter', 'Subscription reconnects'),
+        'dweepy_stream_backfilled_total': ('counter', 'Dweets backfilled into resumed subscriptions'),
+        'dweepy_stream_timeouts_total': ('counter', 'Subscriptions ended by their timeout'),
+        'dweepy_stream_idle_total': ('counter', 'Subscription connections replaced after going silent'),
+        'dweepy_stream_dweets_total': ('counter', 'Dweets yielded by subscriptions'),
+    }
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start from zero
+        return self.__class__, ()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def __call__(self, event, fields):
+        with self._lock:
+            if event == 'request_end':
+                endpoint = (('endpoint', fields['endpoint']),)
+                outcome = 'error' if fields['error'] is not None else 'ok'
+                self._inc('dweepy_requests_total', endpoint + (('outcome', outcome),))
+                self._observe('dweepy_request_duration_seconds', endpoint, fields['elapsed'], self.LATENCY_BUCKETS)
+                self._inc('dweepy_bytes_sent_total', value=fields['bytes_out'])
+                self._inc('dweepy_bytes_received_total', value=fields['bytes_in'])
+                if fields['decode_time'] is not None:
+                    self._observe('dweepy_json_decode_seconds', endpoint, fields['decode_time'], self.DECODE_BUCKETS)
+            elif event == 'retry':
+                self._inc('dweepy_retries_total', (('endpoint', fields['endpoint']),))
+            elif event == 'dweet_dropped':
+                self._inc('dweepy_dweets_dropped_total')
+            elif event == 'dweet_encoded':
+                self._inc('dweepy_bytes_saved_total', value=fields['raw_bytes'] - fields['bytes'])
+            elif event == 'stream_connect':
+                self._inc('dweepy_stream_connects_total')
+            elif event == 'stream_reconnect':
+                self._inc('dweepy_stream_reconnects_total')
+            elif event == 'stream_backfill':
+                self._inc('dweepy_stream_backfilled_total', value=fields['count'])
+            elif event == 'stream_timeout':
+                self._inc('dweepy_stream_timeouts_total')
+            elif event == 'stream_idle':
+                self._inc('dweepy_stream_idle_total')
+            elif event == 'dweet_yielded':
+                self._inc('dweepy_stream_dweets_total')
+
+    def snapshot(self):
+        """Return the current counters and histograms as plain dicts
+
+        Counters map `(name, labels)` to their value, histograms map it to a
+        dict of `buckets`, `sum` and `count`.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': dict(
+                    (key, {'buckets': h.cumulative(), 'sum': h.sum, 'count': h.count})
+                    for key, h in self.histograms.items()
+                ),
+            }
+
+    def export(self, callback):
+        """Pass a snapshot of the metrics to `callback`
+        """
+        callback(self.snapshot())
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        series = {}
+        for (name, labels), value in snapshot['counters'].items():
+            series.setdefault(name, []).append('{0}{1} {2}'.format(name, _labels(labels), value))
+        for (name, labels), histogram in snapshot['histograms'].items():
+            lines = series.setdefault(name, [])
+            for bound, count in histogram['buckets']:
+                lines.append('{0}_bucket{1} {2}'.format(name, _labels(labels + (('le', bound),)), count))
+            lines.append('{0}_sum{1} {2}'.format(name, _labels(labels), histogram['sum']))
+            lines.append('{0}_count{1} {2}'.format(name, _labels(labels), histogram['count']))
+        output = []
+        for name in sorted(series):
+            kind, description = self.HELP[name]
+            output.append('# HELP {0} {1}'.format(name, description))
+            output.append('# TYPE {0} {1}'.format(name, kind))
+            output.extend(sorted(series[name]))
+        return '\n'.join(output) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, v) for k, v in labels) + '}'
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import json
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+from .client import get_default_client
+from .compat import monotonic
+from .exceptions import CircuitOpenError
+from .exceptions import DweepyError
+
+
+# fsync after every dweet
+FSYNC_ALWAYS = 'always'
+# fsync at most once every `fsync_interval` seconds
+FSYNC_INTERVAL = 'interval'
+# leave writing back to the OS
+FSYNC_NEVER = 'never'
+
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+# each record is its body's length and CRC-32 followed by the body
+HEADER = struct.Struct('>II')
+
+SEGMENT_SUFFIX = '.seg'
+OFFSET_FILE = 'offset'
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _segment_name(segment):
+    return '{0:010d}{1}'.format(segment, SEGMENT_SUFFIX)
+
+
+def _read_record(f):
+    """Read the record at the file's position, returning `None` at the end of
+    the file or at a torn (partly written) record
+    """
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    length, crc = HEADER.unpack(header)
+    body = f.read(length)
+    if len(body) < length or zlib.crc32(body) & 0xffffffff != crc:
+        return None
+    return body
+
+
+class Outbox(object):
+    """Persists dweets on disk and publishes them once dweet.io is reachable.
+
+    Dweets are appended to a log in `directory`, split into segments of about
+    `segment_size` bytes, and a background drainer sends them with
+    `client.dweet_for` in batches of up to `batch_size`. Different things'
+    dweets are sent in parallel on up to `max_workers` threads, while each
+    thing's are sent one at a time, in order. Dweets which fail
+    transiently (connection errors, timeouts, `5xx` responses, rate limiting
+    or an open circuit) are retried every `retry_interval` seconds, in
+    order; those dweet.io rejects outright (e.g. for a bad key) are counted
+    as `failed` and skipped. A retried batch only resends the dweets which
+    didn't make it the first time.
+
+    How far the log has been sent is saved to disk after every batch, so a
+    restarted outbox carries on where it left off, resending at most one
+    batch (delivery is at-least-once). Sent segments are deleted, and if the
+    log grows past `max_size` bytes the oldest segments are evicted, sent or
+    not. `fsync` is one of `FSYNC_POLICIES`.
+    """
+
+    def __init__(self, directory, client=None, segment_size=4 * 1024 * 1024,
+                 max_size=256 * 1024 * 1024, fsync=FSYNC_INTERVAL, fsync_interval=1.0,
+                 max_workers=4, batch_size=100, retry_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('fsync must be one of {0}'.format(', '.join(FSYNC_POLICIES)))
+        self.directory = directory
+        self.client = client or get_default_client()
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.sent = 0
+        self.failed = 0
+        self.evicted_bytes = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._last_sync = monotonic()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        ) or [0]
+        self._sizes = {}
+        for segment in self._segments[:-1]:
+            self._sizes[segment] = os.path.getsize(self._path(segment))
+        self._open_active(self._recover(self._segments[-1]))
+        self._position = self._load_position()
+        # positions just past records which have been dealt with but can't
+        # be committed yet, as an earlier record (of another thing) hasn't
+        self._delivered = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = threading.Thread(target=self._run, name='dweepy-outbox')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, _segment_name(segment))
+
+    def _recover(self, segment):
+        """Return the length of a segment's valid records, cutting off any
+        record torn by a crash
+        """
+        path = self._path(segment)
+        if not os.path.exists(path):
+            return 0
+        end = 0
+        with open(path, 'rb') as f:
+            while _read_record(f) is not None:
+                end = f.tell()
+        if end < os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        return end
+
+    def _open_active(self, size):
+        self._active = open(self._path(self._segments[-1]), 'ab')
+        self._sizes[self._segments[-1]] = size
+
+    def _load_position(self):
+        """Return the saved `(segment, offset)` of the first unsent record
+        """
+        try:
+            with open(os.path.join(self.directory, OFFSET_FILE), 'rb') as f:
+                saved = json.loads(f.read().decode('utf-8'))
+            position = (saved['segment'], saved['offset'])
+        except (IOError, OSError, ValueError, KeyError):
+            position = (self._segments[0], 0)
+        if position[0] not in self._sizes:
+            # the segment it points into has since been sent or evicted
+            position = (self._segments[0], 0)
+        # data lost in a crash may leave the position past the segment's end
+        return position[0], min(position[1], self._sizes[position[0]])
+
+    def _save_position(self, position):
+        tmp = os.path.join(self.directory, OFFSET_FILE + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(json.dumps({'segment': position[0], 'offset': position[1]}).encode('utf-8'))
+            if self.fsync != FSYNC_NEVER:
+                f.flush()
+                os.fsync(f.fileno())
+        _replace(tmp, os.path.join(self.directory, OFFSET_FILE))
+
+    def _sync(self, force=False):
+        self._active.flush()
+        if self.fsync == FSYNC_NEVER:
+            return
+        now = monotonic()
+        if force or self.fsync == FSYNC_ALWAYS or now - self._last_sync >= self.fsync_interval:
+            os.fsync(self._active.fileno())
+            self._last_sync = now
+
+    def dweet_for(self, thing_name, payload, key=None):
+        """Append a dweet for a thing to the outbox, to be sent when possible
+        """
+        body = json.dumps({'thing': thing_name, 'content': payload, 'key': key}).encode('utf-8')
+        record = HEADER.pack(len(body), zlib.crc32(body) & 0xffffffff) + body
+        with self._cond:
+            if self._closed:
+                raise DweepyError('outbox is closed')
+            active = self._segments[-1]
+            if self._sizes[active] and self._sizes[active] + len(record) > self.segment_size:
+                self._rotate()
+                active = self._segments[-1]
+            self._active.write(record)
+            self._sizes[active] += len(record)
+            self._sync()
+            self._evict()
+            self._cond.notify_all()
+
+    def _rotate(self):
+        self._sync(force=True)
+        self._active.close()
+        self._segments.append(self._segments[-1] + 1)
+        self._open_active(0)
+
+    def _evict(self):
+        """Delete the oldest segments while the log is over its size cap
+        """
+        while len(self._segments) > 1 and sum(self._sizes.values()) > self.max_size:
+            segment = self._segments.pop(0)
+            size = self._sizes.pop(segment)
+            os.remove(self._path(segment))
+            # sent segments are deleted as they're committed, so the position
+            # must be in this one
+            self.evicted_bytes += size - self._position[1]
+            self._position = (self._segments[0], 0)
+            self._delivered = set(p for p in self._delivered if p > self._position)
+
+    def pending(self):
+        """Number of bytes in the log still to be sent
+        """
+        with self._cond:
+            return self._pending()
+
+    def _pending(self):
+        segment, offset = self._position
+        return sum(size for s, size in self._sizes.items() if s >= segment) - offset
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending_bytes': self._pending(),
+                'segments': len(self._segments),
+                'sent': self.sent,
+                'failed': self.failed,
+                'evicted_bytes': self.evicted_bytes,
+            }
+
+    def flush(self, timeout=None):
+        """Wait until everything in the outbox has been sent
+
+        Returns False if `timeout` expired first.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while self._pending():
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Stop the drainer and close the log; unsent dweets stay on disk
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        with self._cond:
+            self._sync(force=True)
+            self._active.close()
+
+    def _read_batch(self):
+        """Return up to `batch_size` unsent records, each with the position
+        just past it
+        """
+        batch = []
+        segment, offset = self._position
+        self._active.flush()
+        while len(batch) < self.batch_size and segment in self._sizes:
+            if offset >= self._sizes[segment]:
+                if segment == self._segments[-1]:
+                    break
+                segment, offset = self._segments[self._segments.index(segment) + 1], 0
+                continue
+            with open(self._path(segment), 'rb') as f:
+                f.seek(offset)
+                while len(batch) < self.batch_size and offset < self._sizes[segment]:
+                    body = _read_record(f)
+                    if body is None:
+                        # shouldn't happen, but don't spin on a corrupt segment
+                        offset = self._sizes[segment]
+                        break
+                    offset = f.tell()
+                    batch.append((json.loads(body.decode('utf-8')), (segment, offset)))
+        return batch
+
+    def _commit(self, position):
+        """Mark everything before `position` as sent, deleting sent segments
+        """
+        if position <= self._position:
+            # evicted while it was being sent
+            return
+        self._position = position
+        self._delivered = set(p for p in self._delivered if p > position)
+        while self._segments[0] < position[0]:
+            segment = self._segments.pop(0)
+            del self._sizes[segment]
+            os.remove(self._path(segment))
+        self._save_position(position)
+        self._cond.notify_all()
+
+    def _send(self, records):
+        """Send a thing's records in order, stopping at the first which fails
+        transiently, and mark those dealt with as delivered
+        """
+        for record, position in records:
+            try:
+                self.client.dweet_for(record['thing'], record['content'], key=record['key'])
+            except Exception as e:
+                if isinstance(e, CircuitOpenError) or self.client.policy.retry.is_retryable(e):
+                    return
+                with self._cond:
+                    self.failed += 1
+                    self._delivered.add(position)
+            else:
+                with self._cond:
+                    self.sent += 1
+                    self._delivered.add(position)
+
+    def _run(self):
+        """Send the log in batches, in order, until closed
+        """
+        while True:
+            with self._cond:
+                batch = self._read_batch()
+                while not batch and not self._closed:
+                    self._cond.wait()
+                    batch = self._read_batch()
+                if self._closed:
+                    return
+                # records of a retried batch which made it last time
+                delivered = set(self._delivered)
+            things = collections.OrderedDict()
+            for record, position in batch:
+                if position not in delivered:
+                    things.setdefault(record['thing'], []).append((record, position))
+            list(self._executor.map(self._send, things.values()))
+            with self._cond:
+                # commit up to the first record which wasn't sent
+                done = None
+                for _, position in batch:
+                    if position not in self._delivered:
+                        break
+                    done = position
+                if done is not None:
+                    self._commit(done)
+                if done != batch[-1][1]:
+                    # the service is unreachable, back off before retrying
+                    deadline = monotonic() + self.retry_interval
+                    while not self._closed and monotonic() < deadline:
+                        self._cond.wait(deadline - monotonic())
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+from .client import get_default_client
+from .compat import monotonic
+from .compat import requests_errors
+from .exceptions import DweepyError
+
+
+class _Thing(object):
+    """Polling state for a single thing
+    """
+
+    __slots__ = ('name', 'key', 'interval', 'due', 'high_water', 'at_high_water', 'digest')
+
+    def __init__(self, name, key, interval):
+        self.name = name
+        self.key = key
+        self.interval = interval
+        self.due = 0
+        # newest `created` seen, and the dweets created at that very moment
+        self.high_water = None
+        self.at_high_water = set()
+        # digest of the last response body decoded
+        self.digest = None
+
+    def unseen(self, history):
+        """Return the dweets in `history` (newest first) not seen before,
+        oldest first, and raise the high-water mark past them
+        """
+        new = []
+        for dweet in history:
+            created = dweet.get('created', '')
+            if self.high_water is not None and created < self.high_water:
+                break
+            if created == self.high_water and _identity(dweet) in self.at_high_water:
+                continue
+            new.append(dweet)
+        new.reverse()
+        for dweet in new:
+            created = dweet.get('created', '')
+            if self.high_water is None or created > self.high_water:
+                self.high_water = created
+                self.at_high_water = set()
+            if created == self.high_water:
+                self.at_high_water.add(_identity(dweet))
+        return new
+
+
+def _identity(dweet):
+    return json.dumps(dweet.get('content'), sort_keys=True)
+
+
+class DweetPoller(object):
+    """Polls `get_dweets_for` for many things, returning only unseen dweets.
+
+    Each thing is polled every `min_interval` seconds while it's active; each
+    poll that turns up nothing new (or fails) multiplies its interval by
+    `backoff`, up to `max_interval`. Due things are polled in parallel on
+    `max_workers` threads. A response identical to the last one decoded
+    for a thing isn't decoded again.
+
+    Dweets are told apart by their `created` timestamp, so the first poll
+    returns a thing's existing history unless `history` is False. Errors
+    other than a thing not having dweeted yet are passed to `on_error` (with
+    the thing's name) if it's given.
+
+        >>> with DweetPoller(['thing-1', 'thing-2']) as poller:
+        ...     for thing_name, dweet in poller.listen():
+        ...         print(thing_name, dweet)
+    """
+
+    def __init__(self, thing_names, client=None, key_map=None, min_interval=1.0, max_interval=30.0,
+                 backoff=2.0, max_workers=10, history=True, on_error=None):
+        self.client = client or get_default_client()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.history = history
+        self.on_error = on_error
+        key_map = key_map or {}
+        self._things = [_Thing(name, key_map.get(name), min_interval) for name in thing_names]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._first = True
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def interval(self, thing_name):
+        """Seconds currently between polls of a thing
+        """
+        for thing in self._things:
+            if thing.name == thing_name:
+                return thing.interval
+        raise KeyError(thing_name)
+
+    def poll(self):
+        """Poll every thing that's due, returning `(thing_name, dweet)`
+        tuples for the unseen dweets, oldest first per thing
+        """
+        with self._lock:
+            now = monotonic()
+            due = [thing for thing in self._things if thing.due <= now]
+            results = list(self._executor.map(self._poll_thing, due))
+            first, self._first = self._first, False
+        if first and not self.history:
+            return []
+        return [(thing.name, dweet) for thing, dweets in zip(due, results) for dweet in dweets]
+
+    def _poll_thing(self, thing):
+        try:
+            new = self._fetch(thing)
+        except (DweepyError,) + requests_errors('RequestException') as e:
+            if e.args and e.args[0] != 'we couldn\'t find this' and self.on_error is not None:
+                self.on_error(thing.name, e)
+            new = []
+        if new:
+            thing.interval = self.min_interval
+        else:
+            thing.interval = min(self.max_interval, thing.interval * self.backoff)
+        thing.due = monotonic() + thing.interval
+        return new
+
+    def _fetch(self, thing):
+        """Return a thing's unseen dweets
+        """
+        digest = []
+
+        def changed(body):
+            digest.append(hashlib.sha1(body).digest())
+            return digest[-1] != thing.digest
+
+        params = {'key': thing.key} if thing.key is not None else None
+        # straight to the API, a cached history would defeat the point
+        history = self.client._request(
+            'get', '/get/dweets/for/{0}'.format(thing.name), params=params, should_decode=changed,
+        )
+        if history is None:
+            return []
+        thing.digest = digest[-1]
+        return thing.unseen(history)
+
+    def listen(self, timeout=None):
+        """Poll until `timeout` seconds have passed (forever if `None`),
+        yielding `(thing_name, dweet)` tuples as they're found
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            for result in self.poll():
+                yield result
+            now = monotonic()
+            wake = min(thing.due for thing in self._things) if self._things else now + self.max_interval
+            if deadline is not None:
+                if now >= deadline:
+                    return
+                wake = min(wake, deadline)
+            if wake > now:
+                time.sleep(wake - now)
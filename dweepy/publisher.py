@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports
+from .client import get_default_client
+from .compat import monotonic
+from .exceptions import DweepyError
+
+
+# send every reading as its own dweet
+POLICY_ALL = 'all'
+# shallow-merge a thing's pending readings into a single dweet
+POLICY_MERGE = 'merge'
+# only send a thing's newest pending reading, cancelling the rest
+POLICY_LATEST = 'latest'
+
+POLICIES = (POLICY_ALL, POLICY_MERGE, POLICY_LATEST)
+
+
+class _Reading(object):
+
+    __slots__ = ('payload', 'key', 'future', 'queued')
+
+    def __init__(self, payload, key):
+        self.payload = payload
+        self.key = key
+        self.future = Future()
+        self.queued = monotonic()
+
+
+class BatchPublisher(object):
+    """Queues dweets per thing and publishes them from a pool of workers.
+
+    A thing's pending readings are flushed once `max_batch_size` of them
+    have queued up or the oldest has waited `linger` seconds, and `policy`
+    decides what is actually sent (see `POLICIES`). Each thing is flushed by
+    at most one worker at a time, so its dweets are sent in order.
+
+    At most `max_queue_size` readings may be pending or in flight at once;
+    beyond that `submit` blocks (or raises `DweepyError` when called with
+    `block=False`) until the workers catch up.
+    """
+
+    def __init__(self, client=None, max_batch_size=100, linger=0.05, max_workers=8,
+                 max_queue_size=10000, policy=POLICY_ALL):
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of {0}'.format(', '.join(POLICIES)))
+        self.client = client or get_default_client()
+        self.max_batch_size = max_batch_size
+        self.linger = linger
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self._pending = collections.OrderedDict()
+        self._busy = set()
+        self._size = 0
+        self._flushing = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = threading.Thread(target=self._run, name='dweepy-publisher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, thing_name, payload, key=None, block=True, timeout=None):
+        """Queue a dweet for a thing, returning a `Future` for its response
+        """
+        reading = _Reading(payload, key)
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise DweepyError('publisher is closed')
+                if self._size < self.max_queue_size:
+                    break
+                remaining = None if deadline is None else deadline - monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    raise DweepyError('publish queue is full')
+                self._cond.wait(remaining)
+            self._pending.setdefault(thing_name, []).append(reading)
+            self._size += 1
+            self._cond.notify_all()
+        return reading.future
+
+    def flush(self, timeout=None):
+        """Send everything queued so far, returning once it has all completed
+
+        Returns False if `timeout` expired first.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._size:
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self):
+        """Stop accepting dweets, send everything queued and release workers
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        """Dispatch each thing's readings to the workers once they're due
+        """
+        with self._cond:
+            while True:
+                now = monotonic()
+                wait = None
+                for thing_name, readings in list(self._pending.items()):
+                    if thing_name in self._busy:
+                        continue
+                    due = readings[0].queued + self.linger
+                    if self._closed or self._flushing or len(readings) >= self.max_batch_size or due <= now:
+                        del self._pending[thing_name]
+                        self._busy.add(thing_name)
+                        self._executor.submit(self._send, thing_name, readings)
+                    elif wait is None or due - now < wait:
+                        wait = due - now
+                if self._closed and not self._size:
+                    return
+                self._cond.wait(wait)
+
+    def _batches(self, readings):
+        """Apply the policy, returning `(payload, key, futures)` to send
+        """
+        if self.policy == POLICY_MERGE:
+            batches = []
+            for reading in readings:
+                if batches and batches[-1][1] == reading.key:
+                    batches[-1][0].update(reading.payload)
+                    batches[-1][2].append(reading.future)
+                else:
+                    batches.append((dict(reading.payload), reading.key, [reading.future]))
+            return batches
+        return [(reading.payload, reading.key, [reading.future]) for reading in readings]
+
+    def _send(self, thing_name, readings):
+        count = len(readings)
+        try:
+            if self.policy == POLICY_LATEST:
+                for reading in readings[:-1]:
+                    reading.future.cancel()
+                readings = readings[-1:]
+            # leave out readings the caller has cancelled, and stop the rest
+            # being cancelled once they're on their way
+            readings = [r for r in readings if r.future.set_running_or_notify_cancel()]
+            for payload, key, futures in self._batches(readings):
+                try:
+                    result = self.client.dweet_for(thing_name, payload, key=key)
+                except Exception as e:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            with self._cond:
+                self._busy.discard(thing_name)
+                self._size -= count
+                self._cond.notify_all()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import operator
+import re
+
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+}
+
+# keys which appear verbatim in a raw stream line however it's escaped
+PLAIN_KEY = re.compile(r'^[A-Za-z0-9_-]+$')
+
+_missing = object()
+
+
+def _getter(path):
+    """Compile a dotted path into a function fetching it from content
+    """
+    keys = path.split('.')
+
+    def get(content):
+        for key in keys:
+            if not isinstance(content, dict):
+                return _missing
+            content = content.get(key, _missing)
+            if content is _missing:
+                break
+        return content
+    return get
+
+
+def _test(path, op, expected):
+    try:
+        compare = OPERATORS[op]
+    except KeyError:
+        raise ValueError('unknown operator {0!r} (use one of {1})'.format(op, ', '.join(sorted(OPERATORS))))
+    get = _getter(path)
+
+    def test(content):
+        value = get(content)
+        if value is _missing:
+            return False
+        try:
+            return compare(value, expected)
+        except TypeError:
+            # e.g. comparing a string to a number on python 3
+            return False
+    return test
+
+
+class DweetQuery(object):
+    """Filters and projects dweets as they're decoded from a stream.
+
+    `where` is a list of `(path, operator, value)` predicates on the
+    content, all of which a dweet must satisfy, and `fields` the content
+    paths to keep (all of it if `None`). Paths are keys, with the keys of
+    nested objects joined by dots; operators are those in `OPERATORS`.
+    Matching dweets keep their `thing` and `created`.
+
+        >>> query = DweetQuery(fields=['temperature'], where=[('temperature', '>', 30)])
+        >>> for dweet in dweepy.listen_for_dweets_from('this_is_a_thing', query=query):
+        ...     print(dweet['content']['temperature'])
+
+    Lines of a stream which can't possibly match, because they don't even
+    contain a predicate's key, are dropped before they're decoded.
+    """
+
+    def __init__(self, fields=None, where=()):
+        self.fields = list(fields) if fields is not None else None
+        self.where = [tuple(predicate) for predicate in where]
+        self._tests = [_test(path, op, value) for path, op, value in self.where]
+        self._getters = [(path.split('.'), _getter(path)) for path in self.fields or ()]
+        # the last key of each predicate's path must appear in a matching line
+        self._required = sorted(set(
+            path.split('.')[-1].encode('ascii') for path, _, _ in self.where
+            if PLAIN_KEY.match(path.split('.')[-1])
+        ))
+
+    def might_match(self, line):
+        """Cheaply check a raw line of a stream, returning False if it
+        certainly doesn't hold a matching dweet
+        """
+        for key in self._required:
+            if key not in line:
+                return False
+        return True
+
+    def matches(self, dweet):
+        content = dweet.get('content')
+        for test in self._tests:
+            if not test(content):
+                return False
+        return True
+
+    def project(self, dweet):
+        """Return a copy of `dweet` with only the selected content fields
+        """
+        if self.fields is None:
+            return dweet
+        content = dweet.get('content')
+        projected = {}
+        for keys, get in self._getters:
+            value = get(content)
+            if value is _missing:
+                continue
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+        result = dict((k, v) for k, v in dweet.items() if k != 'content')
+        result['content'] = projected
+        return result
+
+    def apply(self, dweet):
+        """Return the projected dweet if it matches, otherwise `None`
+        """
+        if not self.matches(dweet):
+            return None
+        return self.project(dweet)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import collections
+import threading
+import time
+
+# local imports
+from .compat import monotonic
+
+
+class TokenBucket(object):
+    """Allows `rate` operations per second on average, in bursts of up to
+    `capacity` (which defaults to `rate`, and at least one).
+
+    Not thread-safe on its own; `RateLimiter` serialises access.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter(object):
+    """Shapes dweets locally to fit dweet.io's publishing limits.
+
+    Each thing gets its own bucket allowing `per_thing_rate` dweets per
+    second (in bursts of `per_thing_burst`), and all dweets share a bucket
+    allowing `global_rate` per second (unlimited if `None`). A dweet needs a
+    token from both.
+
+    By default `acquire` blocks until the dweet may be sent (for at most
+    `timeout` seconds); with `block=False` it returns False straight away
+    instead so the dweet can be dropped. Buckets are kept for the
+    `max_things` most recently used things.
+    """
+
+    def __init__(self, per_thing_rate=1.0, per_thing_burst=None, global_rate=None,
+                 global_burst=None, block=True, timeout=None, max_things=10000,
+                 sleep=time.sleep):
+        self.per_thing_rate = per_thing_rate
+        self.per_thing_burst = per_thing_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.block = block
+        self.timeout = timeout
+        self.max_things = max_things
+        self.sleep = sleep
+        self._global = TokenBucket(global_rate, global_burst) if global_rate else None
+        self._things = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start with full buckets
+        return self.__class__, (self.per_thing_rate, self.per_thing_burst, self.global_rate,
+                                self.global_burst, self.block, self.timeout, self.max_things,
+                                self.sleep)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _bucket_for(self, thing_name):
+        bucket = self._things.pop(thing_name, None)
+        if bucket is None:
+            bucket = TokenBucket(self.per_thing_rate, self.per_thing_burst)
+            while len(self._things) >= self.max_things:
+                self._things.popitem(last=False)
+        # re-insert to mark as most recently used
+        self._things[thing_name] = bucket
+        return bucket
+
+    def try_acquire(self, thing_name=None):
+        """Take a token for `thing_name` if one is available right now
+
+        Anonymous dweets (`thing_name=None`) only need a global token.
+        """
+        return self._try_acquire(thing_name) == 0
+
+    def _try_acquire(self, thing_name):
+        """Take a token if possible, otherwise return the seconds until one
+        will be available
+        """
+        with self._lock:
+            now = monotonic()
+            buckets = [] if thing_name is None else [self._bucket_for(thing_name)]
+            if self._global is not None:
+                buckets.append(self._global)
+            wait = max([bucket.wait_time(now) for bucket in buckets] or [0.0])
+            if wait == 0:
+                for bucket in buckets:
+                    bucket.take()
+            return wait
+
+    def acquire(self, thing_name=None, block=None, timeout=None):
+        """Take a token for `thing_name`, returning False if none could be had
+        """
+        block = self.block if block is None else block
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            wait = self._try_acquire(thing_name)
+            if wait == 0:
+                return True
+            if not block or (deadline is not None and monotonic() + wait > deadline):
+                return False
+            self.sleep(wait)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import random
+import sys
+import threading
+import time
+
+# local imports
+from .compat import monotonic
+from .compat import requests_errors
+from .exceptions import CircuitOpenError
+from .exceptions import DweepyConnectionError
+from .exceptions import DweepyHTTPError
+from .exceptions import DweepyRateLimitError
+from .exceptions import DweepyTimeoutError
+
+
+# statuses which mean the server turned a request away without acting on
+# it, so even a dweet is safe to resend
+UNPROCESSED_STATUSES = frozenset([429, 503])
+
+
+def was_sent(error):
+    """Whether a request which failed with a connection error may have
+    reached the server
+    """
+    if isinstance(error, DweepyConnectionError):
+        return error.sent
+    if isinstance(error, requests_errors('ConnectTimeout')):
+        return False
+    # requests raises a plain ConnectionError when the connection is refused,
+    # with urllib3's reason for the failure inside
+    urllib3_exceptions = sys.modules.get('urllib3.exceptions')
+    reason = getattr(error.args[0] if error.args else None, 'reason', None)
+    if urllib3_exceptions is not None and isinstance(reason, urllib3_exceptions.ConnectTimeoutError):
+        return False
+    return True
+
+
+def parse_retry_after(value):
+    """Parse a `Retry-After` header (seconds or an HTTP date) into seconds
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # only imported for the rare server which sends a date
+    import email.utils
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class RetryBudget(object):
+    """Caps retries at `ratio` of the requests made in the last `window`
+    seconds, plus `min_retries` so that quiet clients can still retry.
+
+    Stops a struggling service from being hit with a retry for every
+    request, which would multiply its load just when it can least take it.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10, window=10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = int(window)
+        # per-second buckets of (second, requests, retries)
+        self._buckets = [(None, 0, 0)] * self.window
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start with an empty window
+        return self.__class__, (self.ratio, self.min_retries, self.window)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _add(self, requests_made, retries):
+        second = int(monotonic())
+        index = second % self.window
+        stamp, made, retried = self._buckets[index]
+        if stamp != second:
+            made = retried = 0
+        self._buckets[index] = (second, made + requests_made, retried + retries)
+
+    def _totals(self):
+        oldest = int(monotonic()) - self.window
+        made = retried = 0
+        for stamp, bucket_made, bucket_retried in self._buckets:
+            if stamp is not None and stamp > oldest:
+                made += bucket_made
+                retried += bucket_retried
+        return made, retried
+
+    def record_request(self):
+        with self._lock:
+            self._add(1, 0)
+
+    def try_retry(self):
+        """Spend a retry from the budget, returning False if it's exhausted
+        """
+        with self._lock:
+            made, retried = self._totals()
+            if retried >= self.min_retries + self.ratio * made:
+                return False
+            self._add(0, 1)
+            return True
+
+
+class RetryPolicy(object):
+    """Decides whether and when a failed request is retried.
+
+    Idempotent requests (reads) are retried up to `max_retries` times after
+    rate limiting, any HTTP status in `retry_statuses`, a connection failure
+    or a read timeout. Other requests (dweets) may already have been acted on
+    when they fail, so are only retried when the server turned them away
+    (rate limiting, or a 429 or 503 in `retry_statuses`) or when they failed
+    before being sent; pass `retry_non_idempotent` to retry them as reads.
+    Retries wait for an exponential backoff of `backoff_base * 2 ** attempt`
+    seconds (capped at `backoff_max`), randomised across that whole range
+    when `jitter` is set so that clients don't retry in lockstep, or for as
+    long as the server asked via `Retry-After` if that's longer. A server
+    asking for a longer wait than `backoff_max` isn't retried at all.
+    """
+
+    def __init__(self, max_retries=2, backoff_base=0.5, backoff_max=30.0, jitter=True,
+                 retry_statuses=(429, 500, 502, 503, 504), budget=None, retry_non_idempotent=False):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget = budget
+        self.retry_non_idempotent = retry_non_idempotent
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number `attempt` (counting from 0)
+        """
+        # cap the exponent, the delay has long since hit the max by then
+        delay = min(self.backoff_max, self.backoff_base * (2 ** min(attempt, 32)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def is_retryable(self, error, idempotent=True):
+        idempotent = idempotent or self.retry_non_idempotent
+        if isinstance(error, DweepyRateLimitError):
+            return True
+        if isinstance(error, DweepyHTTPError):
+            if not idempotent and error.status_code not in UNPROCESSED_STATUSES:
+                return False
+            return error.status_code in self.retry_statuses
+        if isinstance(error, DweepyTimeoutError):
+            return idempotent or not was_sent(error)
+        if isinstance(error, (DweepyConnectionError,) + requests_errors('ConnectionError')):
+            return idempotent or not was_sent(error)
+        return idempotent and isinstance(error, requests_errors('Timeout'))
+
+    def delay_for(self, error, attempt, idempotent=True):
+        """Seconds to wait before retrying after `error`, or `None` to give up
+        """
+        if attempt >= self.max_retries or not self.is_retryable(error, idempotent):
+            return None
+        delay = self.backoff(attempt)
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            if retry_after > self.backoff_max:
+                return None
+            delay = max(delay, retry_after)
+        if self.budget is not None and not self.budget.try_retry():
+            return None
+        return delay
+
+
+class CircuitBreaker(object):
+    """Fails fast while the service looks to be down.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call raises `CircuitOpenError` without touching the network. Once
+    `reset_timeout` seconds have passed a single trial call is let through:
+    if it succeeds the circuit closes again, otherwise it re-opens.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # copies (e.g. sent to another process) start closed
+        return self.__class__, (self.failure_threshold, self.reset_timeout)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise `CircuitOpenError` if the call shouldn't be attempted
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - monotonic()
+                if remaining <= 0:
+                    # let this call through as the trial
+                    self.state = self.HALF_OPEN
+                    return
+            else:
+                # a trial call is already in flight
+                remaining = self.reset_timeout
+            raise CircuitOpenError('circuit open, dweet.io looks to be unavailable', retry_after=remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = monotonic()
+
+
+class ResiliencePolicy(object):
+    """Retry and circuit breaking behaviour shared by a client's API calls
+    and subscriptions.
+
+    `retry` is a `RetryPolicy` (the default retries twice) and `breaker` an
+    optional `CircuitBreaker`. Subscriptions use the retry backoff to space
+    out reconnects.
+    """
+
+    def __init__(self, retry=None, breaker=None, sleep=time.sleep):
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker
+        self.sleep = sleep
+
+    def before_call(self):
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+    def record(self, error=None):
+        """Record the outcome of a call with the breaker
+
+        Only transient failures count against the service; the likes of bad
+        keys or rate limiting show that it's up.
+        """
+        if self.breaker is None:
+            return
+        if error is not None and self.retry.is_retryable(error) and not isinstance(error, DweepyRateLimitError):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def reconnect_delay(self, attempt):
+        """Seconds to wait before a subscription's reconnect `attempt`
+        """
+        return self.retry.backoff(attempt)
+
+    def call(self, func, idempotent=True, on_retry=None):
+        """Call `func`, retrying transient failures as the policy allows
+
+        `on_retry` is called with the attempt, delay and error before each
+        retry.
+        """
+        if self.retry.budget is not None:
+            self.retry.budget.record_request()
+        attempt = 0
+        while True:
+            self.before_call()
+            try:
+                result = func()
+            except Exception as e:
+                self.record(e)
+                delay = self.retry.delay_for(e, attempt, idempotent=idempotent)
+                if delay is None:
+                    raise
+                if on_retry is not None:
+                    on_retry(attempt, delay, e)
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self.record()
+            return result
@@ -6,72 +6,438 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 # stdlib imports
+import collections
 import datetime
 import json
+import socket
+import threading
 
-# third-party imports
-import requests
-from requests.exceptions import ChunkedEncodingError
+# local imports
+from .client import BASE_URL  # noqa
+from .client import client_for
+from .codec import default_codec
+from .compat import monotonic
+from .compat import requests_errors
+from .exceptions import CircuitOpenError
+from .exceptions import DweepyConnectionError
+from .exceptions import DweepyError
+from .exceptions import DweepyHTTPError
+from .instrumentation import emit
 
 
-# python 2/3 compatibility shim for checking if value is a text type
-try:
-    basestring  # attempt to evaluate basestring
+def _deadline(timeout):
+    """Return the monotonic clock time a subscription lasting `timeout`
+    seconds ends at, or `None` if it doesn't
+    """
+    if not timeout:
+        return None
+    return monotonic() + timeout
+
+
+def _stream_timed_out(deadline):
+    """Check if the deadline has been reached.
+
+    Returns a bool rather than raising `StopIteration`, which generators
+    can't propagate as a clean stop on python 3.7+ (PEP 479).
+    """
+    return deadline is not None and monotonic() >= deadline
+
+
+def _remaining(deadline, delay=None):
+    """Cap `delay` so that it doesn't run past the deadline (a `delay` of
+    `None` is the time left, or `None` if there's no deadline)
+    """
+    if deadline is None:
+        return delay
+    left = max(0, deadline - monotonic())
+    return left if delay is None else min(delay, left)
+
+
+def _dropped_errors():
+    """Exceptions meaning a subscription's connection failed or dropped
+    """
+    return (DweepyHTTPError, DweepyConnectionError) + requests_errors(
+        'ChunkedEncodingError', 'ConnectionError', 'ReadTimeout')
+
+
+def _response_socket(response):
+    """Dig the socket out of a streaming response, or return `None`
+    """
+    # dweepy.transport.StdlibSession
+    conn = getattr(response, '_conn', None)
+    if conn is not None:
+        return conn.sock
+    # requests, through urllib3 and http.client down to the socket's file
+    fp = getattr(getattr(getattr(response, 'raw', None), '_fp', None), 'fp', None)
+    return getattr(getattr(fp, 'raw', None), '_sock', None)
+
 
-    def isstr(s):
-        return isinstance(s, basestring)
-except NameError:
-    def isstr(s):
-        return isinstance(s, str)
+def _set_read_timeout(response, timeout):
+    sock = _response_socket(response)
+    if sock is not None:
+        try:
+            sock.settimeout(timeout)
+        except (IOError, OSError):
+            pass
 
 
-# base url for all requests
-BASE_URL = 'https://dweet.io'
+def _created(when):
+    """Format a datetime the way dweet.io formats `created` timestamps
+    """
+    return when.strftime('%Y-%m-%dT%H:%M:%S.') + '{0:03d}Z'.format(when.microsecond // 1000)
 
 
-def _check_stream_timeout(started, timeout):
-    """Check if the timeout has been reached and raise a `StopIteration` if so.
+class _RecentDweets(object):
+    """Remembers the last `size` dweets heard, by `created` plus a hash of
+    their content, and the newest `created` seen (starting at `watermark`).
     """
-    if timeout:
-        elapsed = datetime.datetime.utcnow() - started
-        if elapsed.seconds > timeout:
-            raise StopIteration
 
+    def __init__(self, size, watermark):
+        self.size = size
+        self.watermark = watermark
+        self._keys = collections.OrderedDict()
+
+    def seen(self, dweet):
+        """Return True if `dweet` has been heard already, otherwise record it
+        """
+        created = dweet.get('created', '')
+        key = (created, hash(json.dumps(dweet.get('content'), sort_keys=True)))
+        if key in self._keys:
+            return True
+        self._keys[key] = None
+        if len(self._keys) > self.size:
+            self._keys.popitem(last=False)
+        if created > self.watermark:
+            self.watermark = created
+        return False
 
-def _listen_for_dweets_from_response(response):
-    """Yields dweets as received from dweet.io's streaming API
+
+def _missed_dweets(client, thing_name, params, recent, query=None):
+    """Return the dweets for a thing created since the last one heard, oldest
+    first, from its history
     """
-    streambuffer = ''
-    for byte in response.iter_content(chunk_size=2000):
-        if byte:
-            streambuffer += byte.decode('ascii')
-            try:
-                dweet = json.loads(streambuffer.splitlines()[1])
-            except (IndexError, ValueError):
-                continue
-            if isstr(dweet):
-                yield json.loads(dweet)
-            streambuffer = ''
-
-
-def listen_for_dweets_from(thing_name, timeout=900, key=None, session=None):
+    try:
+        # straight to the API, a cached history would defeat the point
+        history = client._request('get', '/get/dweets/for/{0}'.format(thing_name), params=params)
+    except DweepyError:
+        return []
+    missed = [dweet for dweet in reversed(history) if dweet.get('created', '') >= recent.watermark]
+    if query is not None:
+        missed = [dweet for dweet in (query.apply(dweet) for dweet in missed) if dweet is not None]
+    return missed
+
+
+def _emit_timeout(hooks, thing_name, started):
+    emit(hooks, 'stream_timeout', thing=thing_name, elapsed=monotonic() - started)
+
+
+class StreamDecoder(object):
+    """Incrementally frames dweet.io's streaming API into dweets.
+
+    The stream is a series of `<hex length>` lines each followed by a line
+    holding the dweet as a JSON encoded string. Bytes are fed in as they
+    arrive and every complete line is decoded (as UTF-8, by `codec`) exactly
+    once, so the cost is linear in the size of the stream however it is
+    chunked.
+
+    Given a `query` (a `DweetQuery`), only matching dweets are returned,
+    projected, and lines which can't match aren't decoded at all.
+    """
+
+    def __init__(self, codec=None, query=None):
+        self.codec = codec or default_codec
+        self.query = query
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """Buffer `chunk` and return a list of the dweets it completed
+        """
+        buf = self._buffer
+        # only the new bytes can contain the end of the pending line
+        scan = len(buf)
+        buf += chunk
+        dweets = []
+        start = 0
+        while True:
+            end = buf.find(b'\n', scan)
+            if end < 0:
+                break
+            dweet = self._decode_line(buf[start:end])
+            if dweet is not None:
+                dweets.append(dweet)
+            start = scan = end + 1
+        if start:
+            del buf[:start]
+        return dweets
+
+    def _decode_line(self, line):
+        """Decode one line of the stream, returning `None` if it isn't a dweet
+        """
+        line = bytes(line).strip()
+        # skip the blank and length lines which frame each record
+        if not line[:1] in (b'"', b'{'):
+            return None
+        query = self.query
+        if query is not None and not query.might_match(line):
+            return None
+        try:
+            dweet = self.codec.loads_record(line)
+        except ValueError:
+            return None
+        if not isinstance(dweet, dict):
+            return None
+        if query is not None:
+            return query.apply(dweet)
+        return dweet
+
+
+def listen_for_dweets_from(thing_name, timeout=900, key=None, session=None, chunk_size=2000,
+                           resume=False, resume_window=1000, query=None, read_timeout=None):
     """Create a real-time subscription to dweets
+
+    The subscription ends `timeout` seconds after it's made (or never, if
+    `timeout` is `None`), however quiet the thing is. If nothing at all,
+    not even a heartbeat, is heard for `read_timeout` seconds the
+    connection is presumed dead and replaced straight away.
+
+    Dropped connections are re-established after the backoff given by the
+    client's `ResiliencePolicy`, so an outage isn't met with a tight loop of
+    reconnects.
+
+    With `resume` set, dweets published while reconnecting are backfilled
+    from the thing's history (which dweet.io caps at 500 dweets) once the
+    new connection is up. Dweets are deduplicated against the last
+    `resume_window` heard, by `created` timestamp and content.
+
+    Pass a `DweetQuery` as `query` to only hear about matching dweets, and
+    only the fields of them it selects.
     """
-    url = BASE_URL + '/listen/for/dweets/from/{0}'.format(thing_name)
-    session = session or requests.Session()
+    return _listen(thing_name, timeout, key, session, chunk_size, resume, resume_window, query, read_timeout)
+
+
+def _listen(thing_name, timeout, key, session, chunk_size, resume, resume_window, query, read_timeout,
+            subscription=None):
+    """The generator behind `listen_for_dweets_from`, which also stops once
+    `subscription` (a `Subscription` it's running for) is closed
+    """
+    client = client_for(session)
+    url = client.base_url + '/listen/for/dweets/from/{0}'.format(thing_name)
+    policy = client.policy
+    hooks = client.hooks
     if key is not None:
         params = {'key': key}
     else:
         params = None
+    if subscription is not None:
+        closed = subscription._closed.is_set
+        sleep = subscription._closed.wait
+    else:
+        closed = lambda: False  # noqa
+        sleep = policy.sleep
 
-    start = datetime.datetime.utcnow()
-    while True:
-        request = requests.Request("GET", url, params=params).prepare()
-        resp = session.send(request, stream=True, timeout=timeout)
+    started = monotonic()
+    deadline = _deadline(timeout)
+    recent = _RecentDweets(resume_window, _created(datetime.datetime.utcnow())) if resume else None
+    connected = False
+    attempt = 0
+    while not closed():
+        if _stream_timed_out(deadline):
+            if hooks:
+                _emit_timeout(hooks, thing_name, started)
+            return
+        resp = None
+        error = None
+        idle = False
+        heard = monotonic()
         try:
-            for x in _listen_for_dweets_from_response(resp):
-                yield x
-                _check_stream_timeout(start, timeout)
-        except (ChunkedEncodingError, requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout):
-            pass
-        _check_stream_timeout(start, timeout)
+            policy.before_call()
+            if hooks:
+                emit(hooks, 'stream_connect', thing=thing_name, attempt=attempt)
+            resp = client.session.get(url, params=params, stream=True, timeout=_remaining(deadline, read_timeout))
+            if subscription is not None:
+                subscription._response = resp
+            if not resp.status_code == 200:
+                raise DweepyHTTPError('HTTP {0} response'.format(resp.status_code), status_code=resp.status_code)
+            policy.record()
+            dweets = ()
+            if recent is not None and connected:
+                dweets = _missed_dweets(client, thing_name, params, recent, query)
+                if hooks:
+                    emit(hooks, 'stream_backfill', thing=thing_name, count=len(dweets))
+            connected = True
+            decoder = StreamDecoder(codec=client.codec, query=query)
+            chunks = resp.iter_content(chunk_size=chunk_size)
+            while True:
+                for x in dweets:
+                    if recent is not None and recent.seen(x):
+                        continue
+                    attempt = 0
+                    if hooks:
+                        emit(hooks, 'dweet_yielded', thing=thing_name)
+                    yield x
+                    if _stream_timed_out(deadline):
+                        break
+                if _stream_timed_out(deadline):
+                    if hooks:
+                        _emit_timeout(hooks, thing_name, started)
+                    return
+                if closed():
+                    return
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                # any bytes at all, dweets or heartbeats, show the connection
+                # is alive, and the next read mustn't run past the deadline
+                heard = monotonic()
+                _set_read_timeout(resp, _remaining(deadline, read_timeout))
+                dweets = decoder.feed(chunk) if chunk else ()
+        except CircuitOpenError as e:
+            error = e
+        except _dropped_errors() as e:
+            error = e
+            idle = read_timeout is not None and monotonic() - heard >= read_timeout
+            if not idle:
+                policy.record(e)
+        finally:
+            if subscription is not None:
+                subscription._response = None
+            if resp is not None:
+                resp.close()
+        if closed():
+            return
+        if _stream_timed_out(deadline):
+            if hooks:
+                _emit_timeout(hooks, thing_name, started)
+            return
+        if idle:
+            # a quiet connection isn't a failing server, so don't back off
+            if hooks:
+                emit(hooks, 'stream_idle', thing=thing_name, elapsed=monotonic() - heard)
+            delay = 0
+        else:
+            delay = _remaining(deadline, policy.reconnect_delay(attempt))
+        if hooks:
+            emit(hooks, 'stream_reconnect', thing=thing_name, attempt=attempt, delay=delay, error=error)
+        sleep(delay)
+        if not idle:
+            attempt += 1
+
+
+class Subscription(object):
+    """A subscription read on a background thread, which can be polled for
+    dweets and closed from any thread.
+
+        >>> subscription = Subscription('this_is_a_thing', timeout=None, read_timeout=60)
+        >>> dweet = subscription.poll(timeout=1.0)
+        >>> subscription.close()
+
+    Takes the same arguments as `listen_for_dweets_from`. Up to
+    `max_pending` dweets are queued for `poll`, beyond which reading stops
+    until they're consumed. Closing a subscription shuts its connection
+    down, so its thread exits promptly, even mid-read.
+    """
+
+    def __init__(self, thing_name, timeout=900, key=None, session=None, chunk_size=2000, resume=False,
+                 resume_window=1000, query=None, read_timeout=None, max_pending=1000):
+        self.thing_name = thing_name
+        self.max_pending = max_pending
+        self.error = None
+        self._pending = collections.deque()
+        self._finished = False
+        self._closed = threading.Event()
+        self._cond = threading.Condition()
+        self._response = None
+        self._dweets = _listen(thing_name, timeout, key, session, chunk_size, resume, resume_window, query,
+                               read_timeout, subscription=self)
+        self._thread = threading.Thread(target=self._run, name='dweepy-subscription-{0}'.format(thing_name))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            dweet = self.poll(timeout=None)
+            if dweet is None:
+                return
+            yield dweet
+
+    def _run(self):
+        try:
+            for dweet in self._dweets:
+                with self._cond:
+                    while len(self._pending) >= self.max_pending and not self._closed.is_set():
+                        self._cond.wait()
+                    if self._closed.is_set():
+                        break
+                    self._pending.append(dweet)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._dweets.close()
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    @property
+    def done(self):
+        """Whether the subscription has ended and every dweet been polled
+        """
+        return self._finished and not self._pending
+
+    def poll(self, timeout=0):
+        """Return the next dweet, waiting up to `timeout` seconds (forever if
+        `None`) for one, or `None` if there isn't one
+
+        Once the subscription has ended (see `done`) this returns `None`
+        straight away, or raises whatever exception ended it.
+        """
+        deadline = _deadline(timeout)
+        with self._cond:
+            while not self._pending and not self._finished:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    left = _remaining(deadline)
+                    if not left:
+                        return None
+                    self._cond.wait(left)
+            if self._pending:
+                dweet = self._pending.popleft()
+                self._cond.notify_all()
+                return dweet
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return None
+
+    def close(self, wait=True):
+        """End the subscription, releasing its connection and waiting for its
+        thread to exit if `wait` is set
+
+        To close many at once, close them all with `wait=False` then `join`.
+        """
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        response = self._response
+        if response is not None:
+            sock = _response_socket(response)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except (IOError, OSError):
+                    pass
+        if wait:
+            self.join()
+
+    def join(self, timeout=None):
+        """Wait for the subscription's thread to exit, returning whether it did
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
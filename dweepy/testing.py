@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""An in-process stand-in for dweet.io, for offline tests and benchmarks.
+
+    >>> with FakeDweetServer(latency=0.01) as server:
+    ...     client = server.client()
+    ...     client.dweet_for('this_is_a_thing', {'some_key': 'some_value'})
+
+Point code which uses the module-level functions at it with
+`dweepy.set_default_client(server.client())`, or by starting it on a fixed
+port and setting `DWEEPY_BASE_URL` before importing dweepy.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import datetime
+import errno
+import json
+import random
+import select
+import socket
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    # python 3
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from queue import Empty
+    from queue import Queue
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import unquote
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from Queue import Empty
+    from Queue import Queue
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs
+    from urlparse import urlparse
+
+# local imports
+from .client import DweepyClient
+from .compat import monotonic
+from .encoding import gzip_compress
+
+
+# dweet.io only holds on to the last 500 dweets for a thing
+MAX_HISTORY = 500
+
+
+class _Failed(Exception):
+    """Raised by handlers to send a `failed` response with the message
+    """
+
+
+class _State(object):
+    """Things, locks and alerts held by a `FakeDweetServer`
+    """
+
+    def __init__(self, rate_limit):
+        self.rate_limit = rate_limit
+        self.dweets = {}
+        self.locks = {}
+        self.alerts = {}
+        self.listeners = {}
+        self.last_dweet = {}
+        self.lock = threading.Lock()
+
+    def check_key(self, thing_name, key):
+        with self.lock:
+            locked = self.locks.get(thing_name)
+        if locked is None:
+            return
+        if key is None:
+            raise _Failed('this thing is locked and requires a key')
+        if key != locked[1]:
+            raise _Failed('the key you provided doesn\'t work with this thing')
+
+    def dweet_for(self, thing_name, content):
+        now = datetime.datetime.utcnow()
+        dweet = {
+            'thing': thing_name,
+            'created': now.strftime('%Y-%m-%dT%H:%M:%S.') + '{0:03d}Z'.format(now.microsecond // 1000),
+            'content': content,
+        }
+        with self.lock:
+            if self.rate_limit:
+                last = self.last_dweet.get(thing_name)
+                if last is not None and monotonic() - last < 1.0 / self.rate_limit:
+                    raise _Failed('Rate limit exceeded, try again in 1 second(s).')
+                self.last_dweet[thing_name] = monotonic()
+            history = self.dweets.setdefault(thing_name, [])
+            history.insert(0, dweet)
+            del history[MAX_HISTORY:]
+            listeners = list(self.listeners.get(thing_name, ()))
+        for queue in listeners:
+            queue.put(dweet)
+        return dweet
+
+    def listen(self, thing_name):
+        queue = Queue()
+        with self.lock:
+            self.listeners.setdefault(thing_name, []).append(queue)
+        return queue
+
+    def drop_listeners(self):
+        with self.lock:
+            queues = [queue for queues in self.listeners.values() for queue in queues]
+        for queue in queues:
+            queue.put(None)
+
+    def unlisten(self, thing_name, queue):
+        with self.lock:
+            self.listeners[thing_name].remove(queue)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, which Nagle's algorithm
+    # would otherwise hold back waiting for a delayed ACK
+    disable_nagle_algorithm = True
+
+    # routes are matched on leading path segments (longest first) followed
+    # by the given number of arguments
+    GET_ROUTES = [
+        (('get', 'latest', 'dweet', 'for'), 'get_latest_dweet_for', 1),
+        (('get', 'dweets', 'for'), 'get_dweets_for', 1),
+        (('listen', 'for', 'dweets', 'from'), 'listen_for_dweets_from', 1),
+        (('get', 'alert', 'for'), 'get_alert', 1),
+        (('remove', 'alert', 'for'), 'remove_alert', 1),
+        (('remove', 'lock'), 'remove_lock', 1),
+        (('dweet', 'for'), 'dweet_for', 1),
+        (('unlock',), 'unlock', 1),
+        (('alert',), 'set_alert', 4),
+        (('lock',), 'lock', 1),
+        (('dweet',), 'dweet', 0),
+    ]
+    POST_ROUTES = [
+        (('dweet', 'for'), 'dweet_for', 1),
+        (('dweet',), 'dweet', 0),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch(self.GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(self.POST_ROUTES)
+
+    def _dispatch(self, routes):
+        server = self.server
+        url = urlparse(self.path)
+        parts = tuple(unquote(part) for part in url.path.strip('/').split('/'))
+        self.query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        if self.body and self.headers.get('Content-Encoding') == 'gzip':
+            self.body = zlib.decompress(self.body, 16 + zlib.MAX_WBITS)
+        if server.latency:
+            time.sleep(server.latency)
+        with server.stats_lock:
+            server.requests += 1
+        for prefix, name, arity in routes:
+            args = parts[len(prefix):]
+            if parts[:len(prefix)] == prefix and len(args) == arity:
+                break
+        else:
+            return self._send_json(404, {'this': 'failed', 'because': 'we couldn\'t find this'})
+        if name != 'listen_for_dweets_from' and server.error_rate and server.random.random() < server.error_rate:
+            return self._send_json(503, {'this': 'failed', 'because': 'injected error'})
+        try:
+            result = getattr(self, 'handle_' + name)(*args)
+        except _Failed as e:
+            return self._send_json(200, {'this': 'failed', 'with': 403, 'because': e.args[0]})
+        if result is not None:
+            self._send_json(200, {'this': 'succeeded', 'with': result})
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if self.server.compress and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            data = gzip_compress(data)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _content(self):
+        if self.body:
+            return json.loads(self.body.decode('utf-8'))
+        # dweet.io also accepts content as query parameters
+        return dict((k, v) for k, v in self.query.items() if k != 'key')
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def handle_dweet(self):
+        return self.state.dweet_for(str(uuid.uuid4()), self._content())
+
+    def handle_dweet_for(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        return self.state.dweet_for(thing_name, self._content())
+
+    def handle_get_latest_dweet_for(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        with self.state.lock:
+            history = self.state.dweets.get(thing_name)
+        if not history:
+            raise _Failed('we couldn\'t find this')
+        return history[:1]
+
+    def handle_get_dweets_for(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        with self.state.lock:
+            history = self.state.dweets.get(thing_name)
+        if not history:
+            raise _Failed('we couldn\'t find this')
+        return list(history)
+
+    def handle_lock(self, thing_name):
+        with self.state.lock:
+            self.state.locks[thing_name] = (self.query.get('lock'), self.query.get('key'))
+        return thing_name
+
+    def handle_unlock(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        with self.state.lock:
+            self.state.locks.pop(thing_name, None)
+        return thing_name
+
+    def handle_remove_lock(self, lock):
+        with self.state.lock:
+            for thing_name, (thing_lock, key) in list(self.state.locks.items()):
+                if thing_lock == lock and key == self.query.get('key'):
+                    del self.state.locks[thing_name]
+                    return lock
+        raise _Failed('this lock is not in use')
+
+    def handle_set_alert(self, who, when, thing_name, condition):
+        self.state.check_key(thing_name, self.query.get('key'))
+        alert = {
+            'thing': thing_name,
+            'condition': condition,
+            'is_demo': False,
+            'recipients': [{'type': 'email', 'address': address} for address in who.split(',')],
+        }
+        with self.state.lock:
+            self.state.alerts[thing_name] = alert
+        return alert
+
+    def handle_get_alert(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        with self.state.lock:
+            alert = self.state.alerts.get(thing_name)
+        if alert is None:
+            raise _Failed('we couldn\'t find this')
+        return alert
+
+    def handle_remove_alert(self, thing_name):
+        self.state.check_key(thing_name, self.query.get('key'))
+        with self.state.lock:
+            self.state.alerts.pop(thing_name, None)
+        return {'thing': thing_name}
+
+    def handle_listen_for_dweets_from(self, thing_name):
+        try:
+            self.state.check_key(thing_name, self.query.get('key'))
+        except _Failed as e:
+            self._send_json(200, {'this': 'failed', 'with': 403, 'because': e.args[0]})
+            return
+        queue = self.state.listen(thing_name)
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.flush()
+            while not self.server.stopping.is_set():
+                try:
+                    dweet = queue.get(timeout=0.1)
+                except Empty:
+                    if self._hung_up():
+                        break
+                    continue
+                if dweet is None:
+                    break
+                self._write_chunk(_stream_record(dweet))
+            self.wfile.write(b'0\r\n\r\n')
+        except (IOError, OSError):
+            # the listener went away
+            pass
+        finally:
+            self.state.unlisten(thing_name, queue)
+
+    def _hung_up(self):
+        """Whether a listener has closed its connection, which otherwise
+        isn't noticed until the next write
+        """
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+
+    def _write_chunk(self, data):
+        self.wfile.write('{0:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # clients hanging up mid-response (e.g. closing a stream) are normal
+        error = sys.exc_info()[1]
+        if isinstance(error, socket.error) and error.errno in (errno.EPIPE, errno.ECONNRESET):
+            return
+        HTTPServer.handle_error(self, request, client_address)
+
+
+class FakeDweetServer(object):
+    """A thread-served stand-in for dweet.io on `host`:`port` (0 picks a free
+    port).
+
+    Covers dweeting, reads, chunked streaming, locks and alerts. Every
+    request is delayed by `latency` seconds, and `error_rate` of them
+    (other than subscriptions) fail with a HTTP 503, drawn from a RNG seeded
+    with `seed`. With `rate_limit` set, things dweeting more often than that
+    many times a second get dweet.io's rate limit failure. Gzipped request
+    bodies are always accepted, and with `compress` set responses are
+    gzipped for clients which accept it.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, error_rate=0, rate_limit=None, seed=None,
+                 compress=False):
+        self.httpd = _ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.compress = compress
+        self.httpd.state = _State(rate_limit)
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.random = random.Random(seed)
+        self.httpd.stopping = threading.Event()
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.requests = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    @property
+    def requests(self):
+        """Number of requests received so far
+        """
+        return self.httpd.requests
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def set_latency(self, latency):
+        self.httpd.latency = latency
+
+    def set_error_rate(self, error_rate):
+        self.httpd.error_rate = error_rate
+
+    def drop_subscriptions(self):
+        """End every open subscription, as a flaky connection would
+        """
+        self.httpd.state.drop_listeners()
+
+    def client(self, **kwargs):
+        """Return a `DweepyClient` pointed at this server
+        """
+        return DweepyClient(base_url=self.base_url, **kwargs)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-dweet-io')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _stream_record(dweet):
+    """Frame a dweet the way dweet.io's streaming API does
+    """
+    body = json.dumps(json.dumps(dweet)).encode('utf-8')
+    return '{0:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n'
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""A lightweight, stdlib-only HTTP transport.
+
+`StdlibSession` implements just enough of `requests.Session` for
+`DweepyClient`, on top of `http.client` with pooled keep-alive connections,
+for environments where importing `requests` costs too much. Choose it with
+`DweepyClient(transport='stdlib')` or by setting `DWEEPY_TRANSPORT=stdlib`.
+Like `requests`, it asks for gzipped responses and decompresses them.
+
+Failures are raised as `DweepyConnectionError` (or `DweepyTimeoutError`)
+rather than `requests` exceptions.
+"""
+
+# future imports
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+# stdlib imports
+import datetime
+import socket
+import threading
+import zlib
+
+try:
+    # python 3
+    import http.client as httplib
+    from urllib.parse import urlencode
+    from urllib.parse import urlsplit
+except ImportError:
+    # python 2
+    import httplib
+    from urllib import urlencode
+    from urlparse import urlsplit
+
+# local imports
+from .compat import monotonic
+from .exceptions import DweepyConnectionError
+from .exceptions import DweepyTimeoutError
+
+
+class _Response(object):
+    """The parts of `requests.Response` dweepy uses
+    """
+
+    def __init__(self, session, key, conn, response, elapsed, stream):
+        self.status_code = response.status
+        self.headers = response.msg
+        self.elapsed = elapsed
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._content = None
+        self._decompressor = None
+        if (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+            # wbits of 16 + 15 expects a gzip header and trailer
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if not stream:
+            try:
+                self._content = self._decompress(self._read(response.read), True)
+            finally:
+                self.close()
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self.iter_content(65536))
+        return self._content
+
+    def _read(self, read, *args):
+        try:
+            return read(*args)
+        except socket.timeout as e:
+            raise DweepyTimeoutError('timed out reading response: {0}'.format(e))
+        except (httplib.HTTPException, socket.error) as e:
+            raise DweepyConnectionError('connection dropped reading response: {0!r}'.format(e))
+
+    def _decompress(self, data, final=False):
+        if self._decompressor is None:
+            return data
+        try:
+            data = self._decompressor.decompress(data)
+            if final:
+                data += self._decompressor.flush()
+        except zlib.error as e:
+            raise DweepyConnectionError('could not decompress response: {0}'.format(e))
+        return data
+
+    def iter_content(self, chunk_size=1):
+        # read1 returns whatever has arrived rather than waiting for a full
+        # chunk, python 2 has no such thing
+        read = getattr(self._response, 'read1', self._response.read)
+        while True:
+            data = self._read(read, chunk_size)
+            if not data:
+                data = self._decompress(b'', True)
+                if data:
+                    yield data
+                return
+            data = self._decompress(data)
+            if data:
+                yield data
+
+    def close(self):
+        """Return the connection to the pool if the response was read to the
+        end, otherwise close it
+        """
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            self._session._release(self._key, conn)
+        else:
+            self._response.close()
+            conn.close()
+
+
+class StdlibSession(object):
+    """Sends requests with `http.client`, keeping up to `pool_maxsize` idle
+    connections alive per host (unless `keep_alive` is False)
+    """
+
+    def __init__(self, pool_maxsize=10, keep_alive=True):
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.headers = {'User-Agent': 'dweepy', 'Accept-Encoding': 'gzip'}
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close every idle connection
+        """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None, stream=False):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        query = parts.query
+        if params:
+            query = (query + '&' if query else '') + urlencode(sorted(params.items()))
+        if query:
+            path += '?' + query
+        all_headers = dict(self.headers)
+        all_headers.update(headers or {})
+        if isinstance(data, type('')):
+            data = data.encode('utf-8')
+        method = method.upper()
+
+        conn, reused = self._acquire(key, timeout)
+        started = monotonic()
+        try:
+            response = self._send(conn, method, path, data, all_headers)
+        except DweepyTimeoutError:
+            raise
+        except DweepyConnectionError:
+            if not reused:
+                raise
+            # the server closed the connection while it sat idle in the pool
+            conn, _ = self._acquire(key, timeout, reuse=False)
+            started = monotonic()
+            response = self._send(conn, method, path, data, all_headers)
+        elapsed = datetime.timedelta(seconds=monotonic() - started)
+        return _Response(self, key, conn, response, elapsed, stream)
+
+    def _send(self, conn, method, path, data, headers):
+        try:
+            conn.request(method, path, data, headers)
+            return conn.getresponse()
+        except socket.timeout as e:
+            conn.close()
+            raise DweepyTimeoutError('timed out waiting for response: {0}'.format(e))
+        except (httplib.HTTPException, socket.error) as e:
+            conn.close()
+            raise DweepyConnectionError('connection failed: {0!r}'.format(e))
+
+    def _acquire(self, key, timeout, reuse=True):
+        """Return an idle connection to a host, or a new one, and whether it
+        was reused
+        """
+        if reuse:
+            with self._lock:
+                pool = self._pools.get(key)
+                conn = pool.pop() if pool else None
+            if conn is not None:
+                conn.timeout = timeout
+                conn.sock.settimeout(timeout)
+                return conn, True
+        scheme, netloc = key
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(netloc, timeout=timeout)
+        else:
+            conn = httplib.HTTPConnection(netloc, timeout=timeout)
+        try:
+            conn.connect()
+        except socket.error as e:
+            conn.close()
+            raise DweepyConnectionError('could not connect to {0}: {1}'.format(netloc, e), sent=False)
+        return conn, False
+
+    def _release(self, key, conn):
+        if self.keep_alive:
+            with self._lock:
+                pool = self._pools.setdefault(key, [])
+                if len(pool) < self.pool_maxsize:
+                    pool.append(conn)
+                    return
+        conn.close()
@@ -21,7 +21,17 @@ setup(
     package_dir={'dweepy':
                  'dweepy'},
     include_package_data=True,
-    install_requires=['requests >= 2, < 3'],
+    install_requires=[
+        'requests >= 2, < 3',
+        'futures >= 3; python_version < "3"',
+    ],
+    extras_require={
+        'aio': ['aiohttp >= 3'],
+        'arrow': ['pyarrow'],
+        'numpy': ['numpy'],
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    },
     license="MIT",
     zip_safe=False,
     keywords='dweepy dweet dweet.io',
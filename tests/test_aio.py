@@ -0,0 +1,214 @@
+"""Offline tests for `dweepy.aio`, run against a tiny local aiohttp app
+"""
+# stdlib imports
+import asyncio
+import json
+import unittest
+
+try:
+    from aiohttp import web
+    import dweepy.aio
+except ImportError:  # python 2 or aiohttp not installed
+    web = None
+
+# local imports
+import dweepy
+
+
+def stream_record(dweet):
+    """Frame a dweet the way dweet.io's streaming API does
+    """
+    body = json.dumps(json.dumps(dweet)).encode('utf-8')
+    return '{0:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n'
+
+
+def make_app(state):
+
+    async def dweet_for(request):
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+        await asyncio.sleep(0.01)
+        state['in_flight'] -= 1
+        thing = request.match_info['thing']
+        if request.query.get('key') == 'badkey':
+            return web.json_response({'this': 'failed', 'because': 'bad key'})
+        if request.query.get('key') == 'throttled':
+            return web.json_response({'this': 'failed', 'because': 'Rate limit exceeded, try again in 1 second(s).'})
+        content = await request.json()
+        return web.json_response({'this': 'succeeded', 'with': {'thing': thing, 'content': content}})
+
+    async def get_latest(request):
+        state['reads'] = state.get('reads', 0) + 1
+        if request.match_info['thing'] == 'down':
+            return web.json_response({}, status=503, headers={'Retry-After': '2'})
+        if request.match_info['thing'] == 'busy' and state['reads'] <= 2:
+            return web.json_response({}, status=503)
+        return web.json_response({'this': 'succeeded', 'with': [{'thing': request.match_info['thing']}]})
+
+    async def listen(request):
+        thing = request.match_info['thing']
+        state['listens'] = state.get('listens', 0) + 1
+        response = web.StreamResponse(status=503 if thing == 'down' else 200)
+        await response.prepare(request)
+        if thing == 'down':
+            await response.write(stream_record({'this': 'failed', 'because': 'down for maintenance'}))
+            return response
+        # only the first connection for each thing hears anything, so
+        # reconnects don't produce duplicates
+        if thing not in state['listened']:
+            state['listened'].add(thing)
+            for i in range(2):
+                await response.write(stream_record({'thing': thing, 'content': {'i': i}}))
+        await asyncio.sleep(3)
+        return response
+
+    app = web.Application()
+    app.router.add_get('/listen/for/dweets/from/{thing}', listen)
+    app.router.add_post('/dweet/for/{thing}', dweet_for)
+    app.router.add_get('/get/latest/dweet/for/{thing}', get_latest)
+    return app
+
+
+@unittest.skipIf(web is None, 'dweepy.aio requires python 3 and aiohttp')
+class AsyncClientTests(unittest.TestCase):
+
+    def run_with_server(self, coro_func):
+        state = {'in_flight': 0, 'peak': 0, 'listened': set()}
+
+        async def runner():
+            app_runner = web.AppRunner(make_app(state))
+            await app_runner.setup()
+            site = web.TCPSite(app_runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                return await coro_func('http://127.0.0.1:{0}'.format(port))
+            finally:
+                await app_runner.cleanup()
+
+        return asyncio.run(runner()), state
+
+    def test_dweet_for_and_read(self):
+        """Async calls should return the same payloads as the sync API.
+        """
+        async def scenario(base_url):
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url) as client:
+                dweet = await client.dweet_for('thing', {'a': 1})
+                latest = await dweepy.aio.get_latest_dweet_for('thing', session=client)
+                return dweet, latest
+
+        (dweet, latest), _ = self.run_with_server(scenario)
+        self.assertEqual(dweet, {'thing': 'thing', 'content': {'a': 1}})
+        self.assertEqual(latest, [{'thing': 'thing'}])
+
+    def test_failed_response_raises(self):
+        """A `failed` response should raise `DweepyError`.
+        """
+        async def scenario(base_url):
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url) as client:
+                try:
+                    await client.dweet_for('thing', {}, key='badkey')
+                except dweepy.DweepyError as e:
+                    return e.args[0]
+
+        reason, _ = self.run_with_server(scenario)
+        self.assertEqual(reason, 'bad key')
+
+    def test_same_errors_as_sync_client(self):
+        """HTTP and rate limit failures should raise the same exception types
+        as the sync client.
+        """
+        async def scenario(base_url):
+            policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=0))
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url, policy=policy) as client:
+                errors = []
+                for call in (client.get_latest_dweet_for('down'), client.dweet_for('thing', {}, key='throttled')):
+                    try:
+                        await call
+                    except dweepy.DweepyError as e:
+                        errors.append(e)
+                return errors
+
+        (unavailable, throttled), _ = self.run_with_server(scenario)
+        self.assertIsInstance(unavailable, dweepy.DweepyHTTPError)
+        self.assertEqual((unavailable.status_code, unavailable.retry_after), (503, 2.0))
+        self.assertIsInstance(throttled, dweepy.DweepyRateLimitError)
+        self.assertEqual(throttled.retry_after, 1.0)
+
+    def test_policy_applies_to_api_calls(self):
+        """API calls should be retried, and fail fast once the circuit opens.
+        """
+        async def scenario(base_url):
+            policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=2, backoff_base=0.001))
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url, policy=policy) as client:
+                latest = await client.get_latest_dweet_for('busy')
+            policy = dweepy.ResiliencePolicy(
+                retry=dweepy.RetryPolicy(max_retries=0),
+                breaker=dweepy.CircuitBreaker(failure_threshold=1),
+            )
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url, policy=policy) as client:
+                try:
+                    await client.get_latest_dweet_for('down')
+                except dweepy.DweepyHTTPError:
+                    pass
+                try:
+                    await client.get_latest_dweet_for('thing')
+                except dweepy.CircuitOpenError as e:
+                    return latest, e
+
+        (latest, error), state = self.run_with_server(scenario)
+        self.assertEqual(latest, [{'thing': 'busy'}])
+        self.assertIsInstance(error, dweepy.CircuitOpenError)
+        self.assertEqual(state['reads'], 4)
+
+    def test_concurrency_limit(self):
+        """No more than `max_concurrency` requests should be in flight.
+        """
+        async def scenario(base_url):
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url, max_concurrency=5) as client:
+                await asyncio.gather(*[client.dweet_for('thing', {'i': i}) for i in range(50)])
+
+        _, state = self.run_with_server(scenario)
+        self.assertLessEqual(state['peak'], 5)
+        self.assertGreater(state['peak'], 1)
+
+    def test_listen_for_dweets_from(self):
+        """Async subscriptions should hear dweets and stop at the timeout.
+        """
+        async def scenario(base_url):
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url) as client:
+                return [d async for d in client.listen_for_dweets_from('thing', timeout=1)]
+
+        dweets, _ = self.run_with_server(scenario)
+        self.assertEqual([d['content'] for d in dweets], [{'i': 0}, {'i': 1}])
+
+    def test_listen_checks_status(self):
+        """Failed stream connections shouldn't yield dweets, and should count
+        against the circuit breaker.
+        """
+        breaker = dweepy.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+
+        async def scenario(base_url):
+            policy = dweepy.ResiliencePolicy(breaker=breaker)
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url, policy=policy) as client:
+                return [d async for d in client.listen_for_dweets_from('down', timeout=0.5)]
+
+        dweets, state = self.run_with_server(scenario)
+        self.assertEqual(dweets, [])
+        self.assertEqual(breaker.state, dweepy.CircuitBreaker.OPEN)
+        self.assertEqual(state['listens'], 1)
+
+    def test_listen_for_many(self):
+        """`listen_for_many` should merge every thing's dweets, tagged by name.
+        """
+        things = ['thing-{0}'.format(i) for i in range(20)]
+
+        async def scenario(base_url):
+            async with dweepy.aio.AsyncDweepyClient(base_url=base_url) as client:
+                return [item async for item in client.listen_for_many(things, timeout=1)]
+
+        items, _ = self.run_with_server(scenario)
+        self.assertEqual(len(items), 40)
+        for thing_name, dweet in items:
+            self.assertEqual(thing_name, dweet['thing'])
+        self.assertEqual(set(name for name, _ in items), set(things))
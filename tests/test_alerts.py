@@ -0,0 +1,122 @@
+"""Tests for `dweepy.alerts`
+"""
+# stdlib imports
+import threading
+import time
+import unittest
+
+# local imports
+from dweepy.alerts import AlertEngine
+from dweepy.alerts import compile_condition
+from dweepy.testing import FakeDweetServer
+
+
+test_alert_condition = "if(dweet.alertValue > 10) return 'TEST: Greater than 10'; if(dweet.alertValue < 10) return 'TEST: Less than 10';"
+
+
+class CompileConditionTests(unittest.TestCase):
+
+    def test_alert_condition(self):
+        """The documented alert condition should behave as on dweet.io.
+        """
+        condition = compile_condition(test_alert_condition)
+        self.assertEqual(condition({'alertValue': 11}), 'TEST: Greater than 10')
+        self.assertEqual(condition({'alertValue': 5}), 'TEST: Less than 10')
+        self.assertIsNone(condition({'alertValue': 10}))
+        self.assertIsNone(condition({}))
+        self.assertIsNone(condition({'alertValue': 'eleven'}))
+
+    def test_expressions(self):
+        """Logic, arithmetic, nesting and string building should be supported.
+        """
+        condition = compile_condition('''
+            if (dweet.temp * 9 / 5 + 32 >= 100 && !dweet.muted) {
+                if (dweet.room.name === "kitchen") return 'kitchen is ' + dweet.temp + 'C';
+                return "hot";
+            } else if (dweet['door'] == 'open' || dweet.window) {
+                return 'draught';
+            }
+        ''')
+        self.assertEqual(condition({'temp': 38, 'room': {'name': 'kitchen'}}), 'kitchen is 38C')
+        self.assertEqual(condition({'temp': 38.0, 'room': {'name': 'hall'}}), 'hot')
+        self.assertIsNone(condition({'temp': 38, 'muted': True}))
+        self.assertEqual(condition({'temp': 20, 'door': 'open'}), 'draught')
+        self.assertEqual(condition({'temp': 20, 'window': 1}), 'draught')
+        self.assertIsNone(condition({'temp': 20, 'window': 0}))
+
+    def test_equality_and_missing_fields(self):
+        self.assertIsNone(compile_condition("if (dweet.a == 1) return 'x';")({'a': '1'}))
+        self.assertEqual(compile_condition("if (dweet.a == null) return 'x';")({}), 'x')
+        self.assertEqual(compile_condition("if (dweet.a != 1) return 'x';")({}), 'x')
+        self.assertEqual(compile_condition("return -dweet.a % 3;")({'a': 4}), -1)
+
+    def test_rejects_unsafe_code(self):
+        """Anything outside the safe subset should be rejected.
+        """
+        for source in (
+            "if (dweet.a > 1) return alert('x');",
+            "dweet.a = 1;",
+            "return process.exit();",
+            "if (dweet.a > 1 return 'x';",
+            "return dweet.__class__ ` 1;",
+            "while (true) {}",
+        ):
+            self.assertRaises(ValueError, compile_condition, source)
+
+
+class AlertEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client()
+        self.engine = AlertEngine(client=self.client)
+        self.fired = []
+        self.event = threading.Event()
+
+    def tearDown(self):
+        self.engine.close()
+        self.client.close()
+        self.server.stop()
+
+    def on_alert(self, thing_name, message, dweet):
+        self.fired.append((thing_name, message, dweet['content']))
+        self.event.set()
+
+    def test_rules_per_thing(self):
+        """Dweets should only be checked against their own thing's rules.
+        """
+        self.engine.add('a', test_alert_condition, self.on_alert)
+        rule = self.engine.add('b', "return 'b';", self.on_alert)
+        futures = self.engine.evaluate({'thing': 'a', 'content': {'alertValue': 11}})
+        futures += self.engine.evaluate({'thing': 'a', 'content': {'alertValue': 10}})
+        futures += self.engine.evaluate({'thing': 'c', 'content': {'alertValue': 11}})
+        for future in futures:
+            future.result()
+        self.assertEqual(self.fired, [('a', 'TEST: Greater than 10', {'alertValue': 11})])
+        self.engine.remove(rule)
+        self.assertEqual(self.engine.evaluate({'thing': 'b', 'content': {}}), [])
+
+    def test_mirrors_service_alert(self):
+        """Alerts set on the service should be evaluated locally as dweets arrive.
+        """
+        self.client.set_alert('thing', ['test@example.com'], test_alert_condition, 'key')
+        self.engine.add_from_service('thing', 'key', self.on_alert)
+        self.engine.start(timeout=5)
+        time.sleep(0.2)
+        self.client.dweet_for('thing', {'alertValue': 5})
+        self.assertTrue(self.event.wait(5))
+        self.assertEqual(self.fired, [('thing', 'TEST: Less than 10', {'alertValue': 5})])
+
+    def test_close_stops_listening(self):
+        """Closing should end the subscriptions before the callback threads.
+        """
+        self.engine.add('quiet', "return 'x';", self.on_alert)
+        self.engine.start()
+        deadline = time.time() + 5
+        while not self.server.state.listeners.get('quiet') and time.time() < deadline:
+            time.sleep(0.01)
+        self.engine.close()
+        self.assertFalse(any(thread.is_alive() for thread in self.engine._threads.values()))
+        while self.server.state.listeners.get('quiet') and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.server.state.listeners['quiet'], [])
@@ -0,0 +1,189 @@
+"""Tests for `dweepy.archive`
+"""
+# stdlib imports
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# local imports
+from dweepy.archive import DweetArchive
+from dweepy.archive import DweetRecorder
+from dweepy.archive import replay_dweets_from
+from dweepy.query import DweetQuery
+from dweepy.testing import FakeDweetServer
+
+
+def dweet(thing, second, **content):
+    return {'thing': thing, 'created': '2014-03-19T10:45:{0:06.3f}Z'.format(second), 'content': content}
+
+
+class DweetArchiveTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.archive = DweetArchive(self.path)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.path)
+
+    def fill(self):
+        dweets = [
+            dweet('a', 1, n=1), dweet('b', 1.5, n=2), dweet('a', 2, n=3),
+            dweet('a', 3, n=4), dweet('b', 2.5, n=5), dweet('b', 0.5, n=6),
+        ]
+        for d in dweets:
+            self.archive.append(d)
+        return dweets
+
+    def test_read(self):
+        """Reads should find a thing's dweets in time order, or everyone's in
+        the order they were appended.
+        """
+        dweets = self.fill()
+        self.assertEqual(len(self.archive), 6)
+        self.assertEqual(self.archive.things(), ['a', 'b'])
+        self.assertEqual(self.archive.count('b'), 3)
+        self.assertEqual(list(self.archive.read()), dweets)
+        self.assertEqual([d['content']['n'] for d in self.archive.read('b')], [6, 2, 5])
+        self.assertEqual(list(self.archive.read('c')), [])
+
+    def test_time_range(self):
+        self.fill()
+        start, end = '2014-03-19T10:45:01.500Z', '2014-03-19T10:45:03.000Z'
+        self.assertEqual([d['content']['n'] for d in self.archive.read('a', start, end)], [3])
+        self.assertEqual([d['content']['n'] for d in self.archive.read(None, start, end)], [2, 3, 5])
+
+    def test_concurrent_appends(self):
+        """Dweets appended from many threads should each keep their own time.
+        """
+        def append(thing):
+            for i in range(200):
+                self.archive.append(dweet(thing, (i % 50) + 0.25, n=i))
+
+        threads = [threading.Thread(target=append, args=(thing,)) for thing in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for thing in 'abcd':
+            second = '2014-03-19T10:45:07.000Z', '2014-03-19T10:45:08.000Z'
+            self.assertEqual(sorted(d['content']['n'] for d in self.archive.read(thing, *second)), [7, 57, 107, 157])
+
+    def test_dweets_without_a_timestamp(self):
+        self.assertRaises(ValueError, self.archive.append, {'thing': 'a', 'content': {}})
+        self.assertEqual(len(self.archive), 0)
+
+    def test_reopen_and_readonly(self):
+        """Archives should survive reopening, and read-only views should see
+        dweets appended after they were opened.
+        """
+        self.fill()
+        reader = DweetArchive(self.path, readonly=True)
+        self.assertEqual(len(list(reader.read())), 6)
+        self.archive.append(dweet('c', 4, n=7))
+        self.assertEqual([d['content'] for d in reader.read('c')], [{'n': 7}])
+        self.archive.close()
+        self.archive = DweetArchive(self.path)
+        self.assertEqual(len(self.archive), 7)
+        self.archive.append(dweet('a', 5, n=8))
+        self.assertEqual([d['content']['n'] for d in self.archive.read('a')], [1, 3, 4, 8])
+
+    def test_torn_writes_are_recovered(self):
+        """Partly written records and index entries should be cut off.
+        """
+        self.fill()
+        self.archive.close()
+        with open(os.path.join(self.path, 'dweets'), 'ab') as f:
+            f.write(b'\x00\x00\x01\x00garbage')
+        with open(os.path.join(self.path, 'index'), 'ab') as f:
+            f.write(b'\x00\x00\x00\x00\x00')
+        with open(os.path.join(self.path, 'things'), 'ab') as f:
+            f.write(b'"half')
+        self.archive = DweetArchive(self.path)
+        self.assertEqual(len(self.archive), 6)
+        self.archive.append(dweet('half', 9, n=9))
+        self.assertEqual(self.archive.things(), ['a', 'b', 'half'])
+        self.assertEqual(list(self.archive.read('half')), [dweet('half', 9, n=9)])
+
+
+class ReplayTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with DweetArchive(self.path) as archive:
+            for i in range(5):
+                archive.append(dweet('thing', i * 2, n=i, alarm=i % 2 == 0))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_as_fast_as_possible(self):
+        replayed = list(replay_dweets_from('thing', self.path))
+        self.assertEqual([d['content']['n'] for d in replayed], [0, 1, 2, 3, 4])
+
+    def test_speed(self):
+        """Replays should be paced by the time between dweets over `speed`.
+        """
+        sleeps = []
+        list(replay_dweets_from('thing', self.path, speed=4.0, sleep=sleeps.append))
+        self.assertEqual(len(sleeps), 4)
+        self.assertAlmostEqual(sleeps[-1], 2.0, places=1)
+
+    def test_timeout_and_query(self):
+        query = DweetQuery(fields=['n'], where=[('alarm', '==', True)])
+        replayed = list(replay_dweets_from('thing', self.path, query=query))
+        self.assertEqual([d['content'] for d in replayed], [{'n': 0}, {'n': 2}, {'n': 4}])
+        started = time.time()
+        replayed = list(replay_dweets_from('thing', self.path, speed=10.0, timeout=0.3))
+        self.assertEqual(len(replayed), 2)
+        self.assertLess(time.time() - started, 0.3)
+
+
+class DweetRecorderTests(unittest.TestCase):
+
+    def test_records_subscriptions(self):
+        """Dweets heard by a recorder should be replayable.
+        """
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        with FakeDweetServer() as server:
+            client = server.client()
+            archive = DweetArchive(path)
+            with DweetRecorder(archive, ['a', 'b'], client=client):
+                time.sleep(0.2)
+                for i in range(3):
+                    client.dweet_for('a', {'i': i})
+                    client.dweet_for('b', {'i': i})
+                deadline = time.time() + 5
+                while len(archive) < 6 and time.time() < deadline:
+                    time.sleep(0.01)
+            self.assertEqual([d['content'] for d in replay_dweets_from('a', archive)], [{'i': 0}, {'i': 1}, {'i': 2}])
+            mirrored = list(archive.record(client.get_dweets_for('a')))
+            self.assertEqual(len(mirrored), 3)
+            self.assertEqual(len(archive), 9)
+            archive.close()
+            client.close()
+
+    def test_close_stops_listening(self):
+        """Closing should end the subscriptions even when nothing is heard.
+        """
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        with FakeDweetServer() as server:
+            client = server.client()
+            archive = DweetArchive(path)
+            recorder = DweetRecorder(archive, ['quiet'], client=client).start()
+            deadline = time.time() + 5
+            while not server.state.listeners.get('quiet') and time.time() < deadline:
+                time.sleep(0.01)
+            recorder.close()
+            self.assertFalse(any(thread.is_alive() for thread in recorder._threads))
+            while server.state.listeners.get('quiet') and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(server.state.listeners['quiet'], [])
+            archive.close()
+            client.close()
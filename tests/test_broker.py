@@ -0,0 +1,139 @@
+"""Tests for `dweepy.broker`, against `dweepy.testing.FakeDweetServer`
+"""
+# stdlib imports
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# local imports
+from dweepy import broker
+from dweepy.testing import FakeDweetServer
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'), 'requires Unix sockets')
+class DweetBrokerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'broker.sock')
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client()
+        self.broker = broker.DweetBroker(self.path, ['a', 'b'], client=self.client).start()
+        wait_for(lambda: len(self.server.state.listeners) == 2)
+
+    def tearDown(self):
+        self.broker.close()
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def listen(self, thing_names, count):
+        heard = []
+
+        def run():
+            for dweet in broker.subscribe(self.path, thing_names, timeout=5):
+                heard.append((dweet['thing'], dweet['content']['i']))
+                if len(heard) == count:
+                    return
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, heard
+
+    def test_fan_out(self):
+        """Subscribers should get the things they picked by name or glob.
+        """
+        first, heard_a = self.listen(['a'], 1)
+        second, heard_all = self.listen(['*'], 2)
+        wait_for(lambda: self.broker.stats()['subscribers'] == 2)
+        self.client.dweet_for('a', {'i': 0})
+        self.client.dweet_for('b', {'i': 1})
+        first.join()
+        second.join()
+        self.assertEqual(heard_a, [('a', 0)])
+        self.assertEqual(sorted(heard_all), [('a', 0), ('b', 1)])
+        # one upstream subscription per thing, however many subscribers
+        self.assertEqual(len(self.server.state.listeners['a']), 1)
+
+    def test_subscribes_on_demand(self):
+        """Subscribing to a new thing by name should subscribe upstream.
+        """
+        thread, heard = self.listen(['c'], 1)
+        wait_for(lambda: self.server.state.listeners.get('c'))
+        self.assertEqual(self.broker.stats()['things'], ['a', 'b', 'c'])
+        self.client.dweet_for('c', {'i': 0})
+        thread.join()
+        self.assertEqual(heard, [('c', 0)])
+
+    def test_other_process(self):
+        """Subscribers in other processes should get dweets too.
+        """
+        code = (
+            'import sys; from dweepy import broker\n'
+            'for dweet in broker.subscribe(sys.argv[1], ["a"], timeout=5):\n'
+            '    print(dweet["content"]["i"]); break\n'
+        )
+        process = subprocess.Popen([sys.executable, '-c', code, self.path], stdout=subprocess.PIPE)
+        wait_for(lambda: self.broker.stats()['subscribers'] == 1)
+        self.client.dweet_for('a', {'i': 7})
+        output, _ = process.communicate()
+        self.assertEqual(output.strip(), b'7')
+
+    def test_close_stops_everything(self):
+        """Closing should end the upstream subscriptions and every thread.
+        """
+        thread, _ = self.listen(['c'], 1)
+        wait_for(lambda: self.server.state.listeners.get('c'))
+        self.broker.close()
+        thread.join()
+        wait_for(lambda: not any(self.server.state.listeners.values()))
+        self.assertFalse(any(self.server.state.listeners.values()))
+        self.assertEqual(
+            [t.name for t in threading.enumerate() if t.name.startswith(('dweepy-broker', 'dweepy-subscription'))],
+            [],
+        )
+
+
+@unittest.skipIf(not hasattr(socket, 'socketpair'), 'requires socketpair')
+class SlowSubscriberTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sock, self.other = socket.socketpair()
+
+    def tearDown(self):
+        self.sock.close()
+        self.other.close()
+
+    def test_drop(self):
+        """The drop policy should discard the oldest pending dweets.
+        """
+        subscriber = broker._Subscriber(self.sock, ['*'], broker.POLICY_DROP, 2)
+        for line in (b'1\n', b'2\n', b'3\n'):
+            self.assertTrue(subscriber.put(line, 1))
+        self.assertEqual(list(subscriber.pending), [b'2\n', b'3\n'])
+        self.assertEqual(subscriber.dropped, 1)
+
+    def test_block(self):
+        """The block policy should give up on subscribers which don't catch up.
+        """
+        subscriber = broker._Subscriber(self.sock, ['*'], broker.POLICY_BLOCK, 1)
+        self.assertTrue(subscriber.put(b'1\n', 0.05))
+        self.assertFalse(subscriber.put(b'2\n', 0.05))
+
+    def test_matches(self):
+        subscriber = broker._Subscriber(self.sock, ['sensor-*', 'door'], broker.POLICY_DROP, 1)
+        self.assertTrue(subscriber.matches('sensor-1'))
+        self.assertTrue(subscriber.matches('door'))
+        self.assertFalse(subscriber.matches('doorbell'))
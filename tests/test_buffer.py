@@ -0,0 +1,87 @@
+"""Tests for `dweepy.buffer`
+"""
+# stdlib imports
+import math
+import unittest
+
+# local imports
+from dweepy import buffer
+from dweepy.buffer import DweetBuffer
+from dweepy.buffer import Window
+
+
+def dweet(thing, created, **content):
+    return {'thing': thing, 'created': created, 'content': content}
+
+
+dweets = [
+    dweet('a', '2014-03-19T10:45:28.934Z', temperature=20, nested={'humidity': 40}),
+    dweet('b', '2014-03-19T10:45:29.100Z', temperature=10.5, label='kitchen'),
+    dweet('a', '2014-03-19T10:45:31.000Z', temperature=24),
+    dweet('a', '2014-03-19T10:45:41.5Z', temperature=30, on=True),
+]
+
+
+class DweetBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.buf = DweetBuffer(dweets)
+
+    def test_columns(self):
+        """Timestamps, things and numeric fields should be stored in columns.
+        """
+        self.assertEqual(len(self.buf), 4)
+        self.assertEqual(list(self.buf.timestamps), [
+            1395225928934, 1395225929100, 1395225931000, 1395225941500,
+        ])
+        self.assertEqual(self.buf.things, ['a', 'b'])
+        self.assertEqual(list(self.buf.thing_ids), [0, 1, 0, 0])
+        self.assertEqual(self.buf.fields, ['temperature', 'nested.humidity'])
+        self.assertEqual(list(self.buf.column('temperature')), [20, 10.5, 24, 30])
+        humidity = self.buf.column('nested.humidity')
+        self.assertEqual(humidity[0], 40)
+        self.assertTrue(all(math.isnan(value) for value in humidity[1:]))
+        self.assertEqual(self.buf.nbytes(), 4 * (8 + 4 + 8 + 8))
+
+    def test_skips_bad_timestamps(self):
+        """Dweets without a parseable timestamp should be skipped.
+        """
+        self.buf.append({'thing': 'a', 'content': {}})
+        self.buf.append(dweet('a', 'yesterday'))
+        self.assertEqual(len(self.buf), 4)
+        self.assertEqual(self.buf.skipped, 2)
+
+    def test_aggregate(self):
+        """Fields should be summarised per thing per window.
+        """
+        self.assertEqual(self.buf.aggregate('temperature', interval=10), [
+            Window('a', 1395225920000, 1, 20, 20, 20),
+            Window('a', 1395225930000, 1, 24, 24, 24),
+            Window('a', 1395225940000, 1, 30, 30, 30),
+            Window('b', 1395225920000, 1, 10.5, 10.5, 10.5),
+        ])
+        self.assertEqual(self.buf.aggregate('temperature', interval=60, thing_name='a'), [
+            Window('a', 1395225900000, 3, 20, 30, 74 / 3.0),
+        ])
+        self.assertEqual(self.buf.aggregate('nested.humidity', interval=60), [
+            Window('a', 1395225900000, 1, 40, 40, 40),
+        ])
+
+    @unittest.skipIf(buffer.numpy is None, 'requires numpy')
+    def test_to_numpy(self):
+        """NumPy export should share the buffer's memory.
+        """
+        arrays = self.buf.to_numpy()
+        self.assertEqual(str(arrays['created'][0]), '2014-03-19T10:45:28.934')
+        self.assertEqual(list(arrays['thing']), [0, 1, 0, 0])
+        self.buf.column('temperature')[0] = 99
+        self.assertEqual(arrays['temperature'][0], 99)
+
+    @unittest.skipIf(buffer.pyarrow is None, 'requires pyarrow')
+    def test_to_arrow(self):
+        """Arrow export should include every column.
+        """
+        table = self.buf.to_arrow()
+        self.assertEqual(table.column_names, ['created', 'thing', 'temperature', 'nested.humidity'])
+        self.assertEqual(table.column('thing').to_pylist(), ['a', 'b', 'a', 'a'])
+        self.assertEqual(table.column('temperature').to_pylist(), [20, 10.5, 24, 30])
@@ -0,0 +1,96 @@
+"""Offline tests for `dweepy.cache`
+"""
+# stdlib imports
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy.cache import dweets_key
+from dweepy.cache import latest_key
+from test_client import FakeSession
+
+
+class DweetCacheTests(unittest.TestCase):
+
+    def test_hits_within_ttl(self):
+        """Reads within the TTL should be served from the cache.
+        """
+        session = FakeSession()
+        client = dweepy.DweepyClient(session=session, cache=dweepy.DweetCache(ttl=60))
+        first = client.get_latest_dweet_for('thing')
+        self.assertIs(client.get_latest_dweet_for('thing'), first)
+        client.get_dweets_for('thing')
+        self.assertEqual(len(session.calls), 2)
+        stats = client.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_expiry(self):
+        """Entries should be reloaded once their TTL has passed.
+        """
+        cache = dweepy.DweetCache(ttl=0.01)
+        cache.get('a', lambda: 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a', lambda: 2), 2)
+
+    def test_lru_eviction(self):
+        """The least recently used entry should be evicted when full.
+        """
+        cache = dweepy.DweetCache(maxsize=2, ttl=60)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: None)
+        cache.get('c', lambda: 3)
+        self.assertEqual(cache.get('a', lambda: None), 1)
+        self.assertEqual(cache.get('b', lambda: 'reloaded'), 'reloaded')
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_concurrent_misses_are_coalesced(self):
+        """Concurrent misses for one key should call the loader once.
+        """
+        cache = dweepy.DweetCache(ttl=60)
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('k', loader))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['misses'] < 10:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(cache.stats()['coalesced'], 9)
+
+    def test_loader_errors_propagate(self):
+        """A failed load should raise and not be cached.
+        """
+        cache = dweepy.DweetCache(ttl=60)
+
+        def loader():
+            raise dweepy.DweepyError('nope')
+
+        self.assertRaises(dweepy.DweepyError, cache.get, 'k', loader)
+        self.assertEqual(cache.get('k', lambda: 1), 1)
+
+    def test_warm_from_stream(self):
+        """Streamed dweets should be served while the stream runs.
+        """
+        cache = dweepy.DweetCache(ttl=0.01)
+        cache.put(dweets_key('thing'), [{'i': 0}])
+        stream = [{'i': 1}, {'i': 2}]
+        cache.warm_from('thing', iter(stream)).join()
+        self.assertEqual(cache.get(latest_key('thing'), lambda: None), [{'i': 2}])
+        self.assertEqual(cache.get(dweets_key('thing'), lambda: None), [{'i': 2}, {'i': 1}, {'i': 0}])
+        # once the stream has ended the entries expire as normal
+        time.sleep(0.02)
+        self.assertEqual(cache.get(latest_key('thing'), lambda: 'reloaded'), 'reloaded')
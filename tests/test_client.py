@@ -0,0 +1,253 @@
+"""Offline tests for `dweepy.client`
+"""
+# stdlib imports
+import json
+import unittest
+
+# third-party imports
+import requests
+
+# local imports
+import dweepy
+from dweepy.client import BulkResult
+from dweepy.client import client_for
+from dweepy.testing import FakeDweetServer
+
+
+class FakeResponse(object):
+
+    def __init__(self, body, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(body).encode('utf-8')
+
+
+class FakeSession(object):
+    """Records every call made through it and answers with a canned dweet
+    """
+
+    def __init__(self, status_code=200, this='succeeded', because=None):
+        self.calls = []
+        self.status_code = status_code
+        self.this = this
+        self.because = because
+
+    def _respond(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        body = {'this': self.this, 'with': {'url': url}}
+        if self.because is not None:
+            body['because'] = self.because
+        return FakeResponse(body, status_code=self.status_code)
+
+    def get(self, url, **kwargs):
+        return self._respond('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._respond('post', url, **kwargs)
+
+
+class DweepyClientTests(unittest.TestCase):
+
+    def test_pool_options_are_applied(self):
+        """Pool options should configure the mounted adapters.
+        """
+        client = dweepy.DweepyClient(pool_connections=3, pool_maxsize=7, max_retries=2)
+        adapter = client.session.get_adapter('https://dweet.io')
+        self.assertEqual(adapter._pool_connections, 3)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 2)
+        client.close()
+
+    def test_keep_alive_disabled(self):
+        """`keep_alive=False` should ask the server to close connections.
+        """
+        client = dweepy.DweepyClient(keep_alive=False)
+        self.assertEqual(client.session.headers['Connection'], 'close')
+        client.close()
+
+    def test_methods_use_client_session(self):
+        """Client methods should send through the client's session.
+        """
+        session = FakeSession()
+        client = dweepy.DweepyClient(session=session, base_url='http://localhost')
+        client.dweet_for('thing', {'a': 1}, key='k')
+        client.get_dweets_for('thing')
+        method, url, kwargs = session.calls[0]
+        self.assertEqual((method, url), ('post', 'http://localhost/dweet/for/thing'))
+        self.assertEqual(json.loads(kwargs['data']), {'a': 1})
+        self.assertEqual(kwargs['params'], {'key': 'k'})
+        self.assertEqual(session.calls[1][1], 'http://localhost/get/dweets/for/thing')
+
+    def test_failed_response_raises(self):
+        """A `failed` response should raise `DweepyError` with the reason.
+        """
+        client = dweepy.DweepyClient(session=FakeSession(this='failed', because='nope'))
+        try:
+            client.get_latest_dweet_for('thing')
+        except dweepy.DweepyError as e:
+            self.assertEqual(e.args[0], 'nope')
+        else:
+            self.fail("shouldn't ever get called")
+
+
+class DefaultClientTests(unittest.TestCase):
+
+    def setUp(self):
+        self.session = FakeSession()
+        self.original = dweepy.get_default_client()
+        dweepy.set_default_client(dweepy.DweepyClient(session=self.session))
+
+    def tearDown(self):
+        dweepy.set_default_client(self.original)
+
+    def test_module_functions_use_default_client(self):
+        """Module-level functions should route through the default client.
+        """
+        dweepy.dweet_for('thing', {'a': 1})
+        dweepy.lock('thing', 'lock', 'key')
+        self.assertEqual(len(self.session.calls), 2)
+
+    def test_get_dweets_for_honours_session(self):
+        """`get_dweets_for` should send through an explicitly passed session.
+        """
+        other = FakeSession()
+        dweepy.get_dweets_for('thing', session=other)
+        self.assertEqual(len(other.calls), 1)
+        self.assertEqual(len(self.session.calls), 0)
+
+    def test_client_for(self):
+        """`client_for` should pass clients through and wrap sessions.
+        """
+        client = dweepy.DweepyClient(session=self.session)
+        self.assertIs(client_for(client), client)
+        self.assertIs(client_for(None), dweepy.get_default_client())
+        self.assertIs(client_for(self.session).session, self.session)
+
+
+class ManyReadsTests(unittest.TestCase):
+
+    class PartlyFailingSession(FakeSession):
+
+        def _respond(self, method, url, **kwargs):
+            if url.endswith('/bad'):
+                self.calls.append((method, url, kwargs))
+                return FakeResponse({'this': 'failed', 'because': 'nope'})
+            if url.endswith('/down'):
+                raise requests.exceptions.ConnectionError('connection refused')
+            return super(ManyReadsTests.PartlyFailingSession, self)._respond(method, url, **kwargs)
+
+    def setUp(self):
+        self.session = self.PartlyFailingSession()
+        self.client = dweepy.DweepyClient(session=self.session)
+        self.things = ['thing-{0}'.format(i) for i in range(50)] + ['bad']
+
+    def test_get_latest_dweets_for_many(self):
+        """Every thing should be read, with errors captured per thing.
+        """
+        results = dweepy.get_latest_dweets_for_many(
+            self.things, key_map={'thing-1': 'k'}, max_workers=4, session=self.client)
+        self.assertEqual(set(results), set(self.things))
+        self.assertIsInstance(results['bad'], dweepy.DweepyError)
+        self.assertEqual(results['thing-3'], {'url': 'https://dweet.io/get/latest/dweet/for/thing-3'})
+        params = dict((url, kwargs['params']) for _, url, kwargs in self.session.calls)
+        self.assertEqual(params['https://dweet.io/get/latest/dweet/for/thing-1'], {'key': 'k'})
+
+    def test_transport_errors_are_captured_per_thing(self):
+        """A `requests` error for one thing shouldn't abort the others.
+        """
+        policy = dweepy.ResiliencePolicy(sleep=lambda delay: None)
+        client = dweepy.DweepyClient(session=self.session, policy=policy)
+        results = client.get_latest_dweets_for_many(self.things + ['down'])
+        self.assertEqual(set(results), set(self.things + ['down']))
+        self.assertIsInstance(results['down'], dweepy.DweepyConnectionError)
+        self.assertIsInstance(results['down'].__cause__, requests.exceptions.ConnectionError)
+
+    def test_get_dweets_for_many_stream(self):
+        """`stream=True` should yield `(thing_name, result)` tuples.
+        """
+        results = self.client.get_dweets_for_many(self.things, stream=True)
+        self.assertFalse(isinstance(results, dict))
+        self.assertEqual(sorted(name for name, _ in results), sorted(self.things))
+
+
+class BulkManagementTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client()
+        self.things = ['thing-{0}'.format(i) for i in range(20)]
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_lock_many(self):
+        """Things should be locked in parallel, skipping those already locked.
+        """
+        self.client.lock('thing-0', 'lock', 'key')
+        requests = self.server.requests
+        results = self.client.lock_many(self.things, 'lock', 'key', max_workers=4)
+        self.assertEqual(results['thing-0'], BulkResult('unchanged', None))
+        self.assertEqual(results['thing-1'], BulkResult('lock', 'thing-1'))
+        self.assertEqual(self.server.requests - requests, len(self.things) - 1)
+        self.assertEqual(set(self.server.state.locks), set(self.things))
+        # unlocking forgets the lock
+        self.client.unlock('thing-1', 'key')
+        results = self.client.lock_many(self.things, 'lock', 'key')
+        self.assertEqual([t for t, r in results.items() if r.action == 'lock'], ['thing-1'])
+
+    def test_lock_many_takes_any_iterable(self):
+        things = ['thing-0', 'thing-1', 'thing-0']
+        results = self.client.lock_many((t for t in things), 'lock', 'key')
+        self.assertEqual(sorted(results), ['thing-0', 'thing-1'])
+        self.assertEqual(self.server.requests, 2)
+
+    def test_sync_alerts_only_sends_changes(self):
+        desired = dict((t, (['a@example.com'], 'if(dweet.t > 10) return "hot";')) for t in self.things)
+        results = dweepy.set_alerts(desired, 'key', max_workers=4, session=self.client)
+        self.assertEqual(set(r.action for r in results.values()), set(['set']))
+        self.assertEqual(len(self.server.state.alerts), len(self.things))
+
+        requests = self.server.requests
+        results = self.client.sync_alerts(desired, 'key')
+        self.assertEqual(set(r.action for r in results.values()), set(['unchanged']))
+        self.assertEqual(self.server.requests, requests)
+
+        # change one, remove one explicitly and leave one out to be removed
+        desired['thing-0'] = (['b@example.com'], 'if(dweet.t > 20) return "hot";')
+        desired['thing-1'] = None
+        del desired['thing-2']
+        results = self.client.sync_alerts(desired, 'key')
+        actions = dict((t, r.action) for t, r in results.items() if r.action != 'unchanged')
+        self.assertEqual(actions, {'thing-0': 'set', 'thing-1': 'remove', 'thing-2': 'remove'})
+        self.assertEqual(self.server.requests - requests, 3)
+        self.assertEqual(self.server.state.alerts['thing-0']['condition'], 'if(dweet.t > 20) return "hot";')
+        self.assertNotIn('thing-1', self.server.state.alerts)
+        self.assertNotIn('thing-2', self.server.state.alerts)
+
+        # removed alerts are known to be gone
+        requests = self.server.requests
+        self.client.sync_alerts(desired, 'key')
+        self.assertEqual(self.server.requests, requests)
+
+    def test_failures_are_reported_per_thing(self):
+        self.server.state.locks['thing-3'] = ('lock', 'other-key')
+        desired = dict((t, (['a@example.com'], 'return "x";')) for t in self.things[:5])
+        results = self.client.set_alerts(desired, 'key', key_map={'thing-4': 'key-4'})
+        self.assertEqual(results['thing-3'].action, 'set')
+        self.assertIsInstance(results['thing-3'].result, dweepy.DweepyError)
+        self.assertEqual(results['thing-0'].result['thing'], 'thing-0')
+        # the failure is retried next time, the rest aren't
+        requests = self.server.requests
+        results = self.client.set_alerts(desired, 'key')
+        self.assertEqual([t for t, r in results.items() if r.action == 'set'], ['thing-3'])
+        self.assertEqual(self.server.requests - requests, 1)
+
+    def test_get_alert_and_forget(self):
+        self.client.set_alert('thing-0', ['a@example.com'], 'return "x";', 'key')
+        self.client.forget()
+        desired = {'thing-0': (['a@example.com'], 'return "x";')}
+        self.assertEqual(self.client.sync_alerts(desired, 'key')['thing-0'].action, 'set')
+        self.client.forget(['thing-0'])
+        self.client.get_alert('thing-0', 'key')
+        self.assertEqual(self.client.sync_alerts(desired, 'key')['thing-0'].action, 'unchanged')
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Offline tests for `dweepy.codec`
+"""
+# stdlib imports
+import json
+import unittest
+
+# local imports
+from dweepy import codec
+
+
+dweet = {
+    'thing': 'thing',
+    'created': '2014-03-19T10:45:28.934Z',
+    'content': {'temperature': 21.5, 'ok': True, 'name': 'Zürich', 'note': 'a "quoted" \\ line\nbreak'},
+}
+
+
+class CodecTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Every installed codec should encode to bytes and decode its output.
+        """
+        for backend in codec.CODECS:
+            c = backend()
+            data = c.dumps(dweet)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(c.loads(data), dweet)
+            self.assertEqual(c.loads(data.decode('utf-8')), dweet)
+
+    def test_loads_record(self):
+        """Double encoded stream records should decode, escapes and all.
+        """
+        simple = dict(dweet, content={'temperature': 21.5, 'name': 'Zürich'})
+        records = [
+            json.dumps(json.dumps(simple)),
+            json.dumps(json.dumps(simple, ensure_ascii=False), ensure_ascii=False),
+            json.dumps(json.dumps(dweet)),
+            json.dumps(simple),
+        ]
+        for backend in codec.CODECS:
+            c = backend()
+            for record in records:
+                expected = dweet if record is records[2] else simple
+                self.assertEqual(c.loads_record(record.encode('utf-8')), expected)
+
+    def test_get_codec(self):
+        """`get_codec` should prefer the fastest backend and reject unknown ones.
+        """
+        self.assertEqual(codec.get_codec().name, codec.CODECS[0].name)
+        self.assertEqual(codec.get_codec('json').name, 'json')
+        self.assertRaises(ValueError, codec.get_codec, 'nope')
+
+    @unittest.skipIf(codec.orjson is None, 'needs orjson')
+    def test_orjson_encodes_what_json_does(self):
+        """orjson should encode non-string keys and big integers like json.
+        """
+        c = codec.OrjsonCodec()
+        for obj in ({1: 'a', 'b': {2.5: True}}, {'n': 2 ** 70}):
+            self.assertEqual(json.loads(c.dumps(obj).decode('utf-8')), json.loads(json.dumps(obj)))
@@ -0,0 +1,171 @@
+"""Tests for sharing clients between threads, forked children and process
+pool workers
+"""
+# stdlib imports
+import multiprocessing
+import os
+import pickle
+import threading
+import unittest
+
+# local imports
+import dweepy
+from dweepy.testing import FakeDweetServer
+
+
+THREADS = 16
+CALLS = 25
+
+
+def read_in_worker(client, thing_name):
+    """Run in a process pool worker with a client rebuilt from its pickle
+    """
+    client.dweet_for(thing_name, {'pid': os.getpid()})
+    return client.get_latest_dweet_for(thing_name)[0]['content']['pid'], os.getpid()
+
+
+def hammer(client, errors, index):
+    """Dweet and read back a thing of our own `CALLS` times
+    """
+    thing_name = 'thing-{0}'.format(index)
+    try:
+        for call in range(CALLS):
+            client.dweet_for(thing_name, {'call': call})
+            latest = client.get_latest_dweet_for(thing_name)[0]
+            assert latest['content'] == {'call': call}, latest
+    except Exception as e:
+        errors.append(e)
+
+
+class StressTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_threads(self, client):
+        errors = []
+        threads = [threading.Thread(target=hammer, args=(client, errors, i)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.server.requests, THREADS * CALLS * 2)
+        for i in range(THREADS):
+            self.assertEqual(len(self.server.state.dweets['thing-{0}'.format(i)]), CALLS)
+
+    def test_shared_requests_client(self):
+        """Many threads sharing a client should neither see each other's
+        responses nor lose requests.
+        """
+        self.run_threads(self.server.client(transport='requests', pool_maxsize=4))
+
+    def test_shared_stdlib_client(self):
+        self.run_threads(self.server.client(transport='stdlib', pool_maxsize=4))
+
+    def test_shared_client_with_cache_and_metrics(self):
+        metrics = dweepy.Metrics()
+        client = self.server.client(
+            cache=dweepy.DweetCache(ttl=0),
+            hooks=[metrics],
+            policy=dweepy.ResiliencePolicy(breaker=dweepy.CircuitBreaker()),
+        )
+        self.run_threads(client)
+        requests = sum(
+            value for (name, _), value in metrics.counters.items() if name == 'dweepy_requests_total'
+        )
+        self.assertEqual(requests, THREADS * CALLS * 2)
+
+
+class PickleTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        """A client should pickle as its configuration.
+        """
+        client = dweepy.DweepyClient(
+            base_url='http://127.0.0.1:1',
+            pool_maxsize=3,
+            keep_alive=False,
+            transport='stdlib',
+            cache=dweepy.DweetCache(maxsize=5, ttl=2),
+            rate_limiter=dweepy.RateLimiter(per_thing_rate=2, global_rate=10),
+            policy=dweepy.ResiliencePolicy(
+                retry=dweepy.RetryPolicy(max_retries=4, budget=dweepy.RetryBudget(ratio=0.5)),
+                breaker=dweepy.CircuitBreaker(failure_threshold=2),
+            ),
+            hooks=[dweepy.Metrics()],
+        )
+        client.cache.get('key', lambda: 'value')
+        client.policy.breaker.record_failure()
+        client.policy.breaker.record_failure()
+        copy = pickle.loads(pickle.dumps(client))
+        self.assertEqual(copy.base_url, client.base_url)
+        self.assertEqual(copy.transport, 'stdlib')
+        self.assertEqual(copy._pool_options, client._pool_options)
+        self.assertEqual((copy.cache.maxsize, copy.cache.ttl), (5, 2))
+        self.assertEqual(copy.cache.stats()['size'], 0)
+        self.assertEqual(copy.rate_limiter.global_rate, 10)
+        self.assertEqual(copy.policy.retry.max_retries, 4)
+        self.assertEqual(copy.policy.retry.budget.ratio, 0.5)
+        self.assertEqual(copy.policy.breaker.failure_threshold, 2)
+        self.assertEqual(copy.policy.breaker.state, dweepy.CircuitBreaker.CLOSED)
+        self.assertIsInstance(copy.hooks[0], dweepy.Metrics)
+        self.assertIsNone(copy._session)
+
+    def test_external_session_is_not_picklable(self):
+        from dweepy.transport import StdlibSession
+        client = dweepy.DweepyClient(session=StdlibSession())
+        self.assertRaises(TypeError, pickle.dumps, client)
+
+    def test_process_pool(self):
+        """Workers should be able to rebuild a client from its pickle.
+        """
+        with FakeDweetServer() as server:
+            client = server.client()
+            pool = multiprocessing.get_context('spawn').Pool(2)
+            try:
+                results = pool.starmap(read_in_worker, [(client, 'thing-{0}'.format(i)) for i in range(4)])
+            finally:
+                pool.close()
+                pool.join()
+        for read_pid, worker_pid in results:
+            self.assertEqual(read_pid, worker_pid)
+            self.assertNotEqual(worker_pid, os.getpid())
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+class ForkTests(unittest.TestCase):
+
+    def test_child_opens_its_own_connections(self):
+        """A forked child shouldn't reuse the connections it inherited.
+        """
+        with FakeDweetServer() as server:
+            for transport in dweepy.client.TRANSPORTS:
+                client = server.client(transport=transport)
+                client.dweet_for('thing', {'from': 'parent'})
+                parent_session = client.session
+                results = multiprocessing.get_context('fork').Queue()
+
+                def child():
+                    try:
+                        client.dweet_for('thing', {'from': 'child'})
+                        results.put(client.session is not parent_session)
+                    except Exception as e:
+                        results.put(repr(e))
+
+                process = multiprocessing.get_context('fork').Process(target=child)
+                process.start()
+                self.assertIs(results.get(timeout=10), True)
+                process.join()
+                # the parent's pooled connection is still good
+                self.assertIs(client.session, parent_session)
+                self.assertEqual(client.get_latest_dweet_for('thing')[0]['content'], {'from': 'child'})
+                client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Tests for `dweepy.encoding`
+"""
+# stdlib imports
+import json
+import pickle
+import unittest
+import zlib
+
+# local imports
+import dweepy
+from dweepy.codec import JSONCodec
+from dweepy.encoding import PayloadEncoder
+from dweepy.testing import FakeDweetServer
+
+
+class PayloadEncoderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = JSONCodec()
+
+    def decode(self, data, headers):
+        if headers.get('Content-Encoding') == 'gzip':
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return json.loads(data.decode('utf-8'))
+
+    def test_compact_separators(self):
+        data, headers, raw_bytes = PayloadEncoder().encode({'a': 1, 'b': [1, 2]}, codec=self.codec)
+        self.assertEqual(data, b'{"a":1,"b":[1,2]}')
+        self.assertEqual(raw_bytes, len(data))
+        self.assertEqual(headers, {'Content-type': 'application/json'})
+
+    def test_rounding(self):
+        encoder = PayloadEncoder(precision={'exact': None, None: 2})
+        payload = {'t': 21.456789, 'readings': [1.23456, {'h': 0.987654}], 'n': 7, 'on': True}
+        data, headers, raw_bytes = encoder.encode(payload, 'thing', self.codec)
+        self.assertEqual(self.decode(data, headers), {'t': 21.46, 'readings': [1.23, {'h': 0.99}], 'n': 7, 'on': True})
+        self.assertEqual(raw_bytes, len(self.codec.dumps(payload)))
+        data, headers, _ = encoder.encode(payload, 'exact', self.codec)
+        self.assertEqual(self.decode(data, headers), payload)
+
+    def test_abbreviations(self):
+        names = {'temperature': 't', 'humidity': 'h'}
+        encoder = PayloadEncoder(abbreviations={'thing': names})
+        payload = {'temperature': 20, 'nested': {'humidity': 40}, 'other': 1}
+        data, headers, _ = encoder.encode(payload, 'thing', self.codec)
+        content = self.decode(data, headers)
+        self.assertEqual(content, {'t': 20, 'nested': {'h': 40}, 'other': 1})
+        self.assertEqual(encoder.expand(content, 'thing'), payload)
+        # other things are left alone
+        data, headers, _ = encoder.encode(payload, 'another_thing', self.codec)
+        self.assertEqual(self.decode(data, headers), payload)
+
+    def test_compression(self):
+        encoder = PayloadEncoder(compress=True, compress_min_size=64)
+        payload = {'readings': [20.5] * 100}
+        data, headers, raw_bytes = encoder.encode(payload, codec=self.codec)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertLess(len(data), raw_bytes)
+        self.assertEqual(self.decode(data, headers), payload)
+        # small bodies aren't worth compressing
+        data, headers, _ = encoder.encode({'a': 1}, codec=self.codec)
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_budget(self):
+        encoder = PayloadEncoder(budget={'small': 10, None: 1000})
+        encoder.encode({'a': 1}, 'small', self.codec)
+        with self.assertRaises(dweepy.DweepyPayloadTooLargeError) as cm:
+            encoder.encode({'a': 'too long'}, 'small', self.codec)
+        self.assertEqual(cm.exception.budget, 10)
+        self.assertEqual(cm.exception.size, len(b'{"a":"too long"}'))
+        encoder.encode({'a': 'too long'}, 'large', self.codec)
+        self.assertEqual(encoder.stats()['dweets'], 2)
+
+    def test_stats(self):
+        encoder = PayloadEncoder(precision=1, abbreviations={None: {'temperature': 't'}})
+        encoder.encode({'temperature': 20.123}, 'thing', self.codec)
+        self.assertEqual(encoder.stats(), {
+            'dweets': 1,
+            'raw_bytes': len(b'{"temperature":20.123}'),
+            'sent_bytes': len(b'{"t":20.1}'),
+            'saved_bytes': 12,
+        })
+        copy = pickle.loads(pickle.dumps(encoder))
+        self.assertEqual(copy.precision, 1)
+        self.assertEqual(copy.stats()['dweets'], 0)
+
+
+class ClientEncodingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer(compress=True).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_gzipped_round_trip(self):
+        """Gzipped dweets should arrive intact, and gzipped responses be
+        decompressed, with either transport.
+        """
+        payload = {'readings': list(range(200))}
+        for transport in dweepy.client.TRANSPORTS:
+            metrics = dweepy.Metrics()
+            encoder = PayloadEncoder(compress=True)
+            with self.server.client(transport=transport, encoder=encoder, hooks=[metrics]) as client:
+                client.dweet_for('thing', payload)
+                self.assertEqual(client.get_latest_dweet_for('thing')[0]['content'], payload)
+            saved = encoder.stats()['saved_bytes']
+            self.assertGreater(saved, 0)
+            self.assertEqual(metrics.counters[('dweepy_bytes_saved_total', ())], saved)
+
+    def test_over_budget_is_not_sent(self):
+        limiter = dweepy.RateLimiter(per_thing_rate=1, block=False)
+        client = self.server.client(encoder=PayloadEncoder(budget=16), rate_limiter=limiter)
+        self.assertRaises(dweepy.DweepyPayloadTooLargeError, client.dweet_for, 'thing', {'a': 'x' * 16})
+        self.assertEqual(self.server.requests, 0)
+        # and didn't use up the thing's token
+        client.dweet_for('thing', {'a': 1})
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for the instrumentation hooks and `Metrics`
+"""
+# stdlib imports
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy.instrumentation import Histogram
+from dweepy.instrumentation import endpoint_for
+from dweepy.testing import FakeDweetServer
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, fields):
+        self.events.append((event, fields))
+
+    def named(self, name):
+        return [fields for event, fields in self.events if event == name]
+
+
+class HookTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.recorder = Recorder()
+        self.metrics = dweepy.Metrics()
+        self.client = self.server.client(hooks=[self.recorder, self.metrics])
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_request_events(self):
+        """Requests should report timings, sizes and outcome.
+        """
+        self.client.dweet_for('thing', {'hello': 'world'})
+        self.client.get_latest_dweet_for('thing')
+        self.assertRaises(dweepy.DweepyError, self.client.get_latest_dweet_for, 'missing')
+        self.assertEqual([f['endpoint'] for f in self.recorder.named('request_start')],
+                         ['dweet_for', 'get_latest_dweet_for', 'get_latest_dweet_for'])
+        publish, read, failed = self.recorder.named('request_end')
+        self.assertEqual(publish['status'], 200)
+        self.assertEqual(publish['bytes_out'], len(self.client.codec.dumps({'hello': 'world'})))
+        self.assertGreater(publish['bytes_in'], 0)
+        self.assertIsNone(publish['error'])
+        self.assertGreaterEqual(read['elapsed'], read['ttfb'])
+        self.assertGreaterEqual(read['decode_time'], 0)
+        self.assertIsInstance(failed['error'], dweepy.DweepyError)
+
+    def test_retry_events(self):
+        """Retries should be reported with their delay.
+        """
+        self.server.set_error_rate(1)
+        policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=2, backoff_base=0.001))
+        client = self.server.client(policy=policy, hooks=[self.recorder])
+        self.assertRaises(dweepy.DweepyHTTPError, client.dweet_for, 'thing', {})
+        self.assertEqual([f['attempt'] for f in self.recorder.named('retry')], [0, 1])
+        self.assertEqual([f['status'] for f in self.recorder.named('request_end')], [503] * 3)
+
+    def test_dropped_dweets(self):
+        """Dweets dropped by the rate limiter should be reported.
+        """
+        limiter = dweepy.RateLimiter(per_thing_rate=0.001, block=False)
+        client = self.server.client(rate_limiter=limiter, hooks=[self.recorder])
+        client.dweet_for('thing', {})
+        self.assertRaises(dweepy.DweepyRateLimitError, client.dweet_for, 'thing', {})
+        self.assertEqual(self.recorder.named('dweet_dropped'), [{'thing': 'thing'}])
+
+    def test_stream_events(self):
+        """Subscriptions should report connects, dweets and their timeout.
+        """
+        def publish():
+            time.sleep(0.2)
+            for i in range(2):
+                self.client.dweet_for('thing', {'i': i})
+
+        threading.Thread(target=publish).start()
+        heard = list(dweepy.listen_for_dweets_from('thing', timeout=1, session=self.client))
+        self.assertEqual(len(heard), 2)
+        self.assertEqual(self.recorder.named('stream_connect')[0], {'thing': 'thing', 'attempt': 0})
+        self.assertEqual(len(self.recorder.named('dweet_yielded')), 2)
+        self.assertEqual(len(self.recorder.named('stream_timeout')), 1)
+
+    def test_prometheus_export(self):
+        """Metrics should render in the Prometheus text format.
+        """
+        self.client.dweet_for('thing', {})
+        self.client.dweet_for('thing', {})
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE dweepy_requests_total counter', text)
+        self.assertIn('dweepy_requests_total{endpoint="dweet_for",outcome="ok"} 2', text)
+        self.assertIn('dweepy_request_duration_seconds_bucket{endpoint="dweet_for",le="+Inf"} 2', text)
+        self.assertIn('dweepy_request_duration_seconds_count{endpoint="dweet_for"} 2', text)
+        snapshots = []
+        self.metrics.export(snapshots.append)
+        self.assertEqual(snapshots[0]['counters'][('dweepy_requests_total', (('endpoint', 'dweet_for'), ('outcome', 'ok')))], 2)
+
+
+class HelperTests(unittest.TestCase):
+
+    def test_endpoint_for(self):
+        """Paths should map to the API call rather than the thing.
+        """
+        self.assertEqual(endpoint_for('/dweet/for/my-thing'), 'dweet_for')
+        self.assertEqual(endpoint_for('/dweet'), 'dweet')
+        self.assertEqual(endpoint_for('/get/latest/dweet/for/my-thing'), 'get_latest_dweet_for')
+        self.assertEqual(endpoint_for('/alert/a@b.c/when/thing/x'), 'set_alert')
+        self.assertEqual(endpoint_for('/nope'), 'other')
+
+    def test_histogram(self):
+        """Buckets should be cumulative, with `le` boundaries inclusive.
+        """
+        histogram = Histogram((1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 2), (2, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 6)
+        self.assertEqual(histogram.count, 4)
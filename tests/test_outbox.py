@@ -0,0 +1,141 @@
+"""Tests for `dweepy.outbox`, against `dweepy.testing.FakeDweetServer`
+"""
+# stdlib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+import dweepy
+from dweepy.outbox import Outbox
+from dweepy.testing import FakeDweetServer
+
+
+class OutboxTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client(policy=dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=0)))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def contents(self, thing_name='thing'):
+        return [d['content']['i'] for d in reversed(self.server.state.dweets.get(thing_name, []))]
+
+    def test_drains_in_order(self):
+        """Dweets should be sent in order and sent segments deleted.
+        """
+        with Outbox(self.directory, client=self.client, segment_size=200) as outbox:
+            for i in range(20):
+                outbox.dweet_for('thing', {'i': i})
+            self.assertTrue(outbox.flush(timeout=5))
+            self.assertEqual(outbox.stats()['sent'], 20)
+            self.assertEqual(outbox.stats()['segments'], 1)
+        self.assertEqual(self.contents(), list(range(20)))
+
+    def test_holds_dweets_while_offline(self):
+        """Dweets should wait out an outage, and survive a restart.
+        """
+        self.server.set_error_rate(1)
+        outbox = Outbox(self.directory, client=self.client, retry_interval=0.05)
+        for i in range(5):
+            outbox.dweet_for('thing', {'i': i})
+        self.assertFalse(outbox.flush(timeout=0.3))
+        outbox.close()
+        self.assertEqual(self.contents(), [])
+
+        self.server.set_error_rate(0)
+        with Outbox(self.directory, client=self.client) as outbox:
+            self.assertTrue(outbox.flush(timeout=5))
+        self.assertEqual(self.contents(), list(range(5)))
+
+    def test_restart_doesnt_resend(self):
+        """A restarted outbox should carry on from its saved position.
+        """
+        with Outbox(self.directory, client=self.client) as outbox:
+            outbox.dweet_for('thing', {'i': 0})
+            self.assertTrue(outbox.flush(timeout=5))
+        with Outbox(self.directory, client=self.client) as outbox:
+            outbox.dweet_for('thing', {'i': 1})
+            self.assertTrue(outbox.flush(timeout=5))
+        self.assertEqual(self.contents(), [0, 1])
+
+    def test_torn_record(self):
+        """A partly written record left by a crash should be discarded.
+        """
+        self.server.set_error_rate(1)
+        outbox = Outbox(self.directory, client=self.client, retry_interval=10)
+        outbox.dweet_for('thing', {'i': 0})
+        outbox.close()
+        segment = os.path.join(self.directory, '0000000000.seg')
+        with open(segment, 'ab') as f:
+            f.write(b'\x00\x00\x01\x00garbage')
+
+        self.server.set_error_rate(0)
+        with Outbox(self.directory, client=self.client) as outbox:
+            self.assertTrue(outbox.flush(timeout=5))
+            outbox.dweet_for('thing', {'i': 1})
+            self.assertTrue(outbox.flush(timeout=5))
+        self.assertEqual(self.contents(), [0, 1])
+
+    def test_evicts_oldest(self):
+        """The oldest segments should be evicted once over the size cap.
+        """
+        self.server.set_error_rate(1)
+        outbox = Outbox(self.directory, client=self.client, segment_size=100, max_size=300, retry_interval=10)
+        for i in range(30):
+            outbox.dweet_for('thing', {'i': i})
+        stats = outbox.stats()
+        outbox.close()
+        self.assertLessEqual(stats['pending_bytes'], 300)
+        self.assertGreater(stats['evicted_bytes'], 0)
+
+        self.server.set_error_rate(0)
+        with Outbox(self.directory, client=self.client) as outbox:
+            self.assertTrue(outbox.flush(timeout=5))
+        sent = self.contents()
+        self.assertEqual(sent, list(range(30 - len(sent), 30)))
+
+    def test_rejected_dweets_are_skipped(self):
+        """Dweets the service rejects outright shouldn't block the rest.
+        """
+        self.client.lock('locked', 'lock', 'key')
+        with Outbox(self.directory, client=self.client) as outbox:
+            outbox.dweet_for('locked', {'i': 0})
+            outbox.dweet_for('thing', {'i': 1})
+            self.assertTrue(outbox.flush(timeout=5))
+            self.assertEqual(outbox.stats()['failed'], 1)
+        self.assertEqual(self.contents(), [1])
+
+    def test_partial_batch_isnt_resent(self):
+        """While one thing's dweets are retried, another's which were already
+        sent shouldn't be sent again.
+        """
+        client = self.client
+        attempts = []
+
+        class FlakyClient(dweepy.DweepyClient):
+
+            def dweet_for(self, thing_name, payload, key=None, **kwargs):
+                attempts.append(thing_name)
+                if thing_name == 'down' and attempts.count('down') <= 3:
+                    raise dweepy.DweepyConnectionError('unreachable', sent=False)
+                return client.dweet_for(thing_name, payload, key=key, **kwargs)
+
+        flaky = FlakyClient(base_url=self.server.base_url)
+        with Outbox(self.directory, client=flaky, retry_interval=0.05) as outbox:
+            outbox.dweet_for('down', {'i': 0})
+            outbox.dweet_for('thing', {'i': 1})
+            outbox.dweet_for('thing', {'i': 2})
+            self.assertTrue(outbox.flush(timeout=5))
+            self.assertEqual(outbox.stats()['sent'], 3)
+        flaky.close()
+        self.assertEqual(attempts.count('down'), 4)
+        self.assertEqual(attempts.count('thing'), 2)
+        self.assertEqual(self.contents(), [1, 2])
+        self.assertEqual(self.contents('down'), [0])
@@ -0,0 +1,99 @@
+"""Tests for `dweepy.poller`, against `dweepy.testing.FakeDweetServer`
+"""
+# stdlib imports
+import unittest
+
+# local imports
+import dweepy
+from dweepy.codec import JSONCodec
+from dweepy.testing import FakeDweetServer
+
+
+class CountingCodec(JSONCodec):
+
+    def __init__(self):
+        self.decoded = 0
+
+    def loads(self, data):
+        self.decoded += 1
+        return super(CountingCodec, self).loads(data)
+
+
+class DweetPollerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.codec = CountingCodec()
+        self.client = self.server.client(codec=self.codec)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def contents(self, results):
+        return [(thing_name, dweet['content']['i']) for thing_name, dweet in results]
+
+    def test_only_unseen_dweets(self):
+        """Each poll should return only the dweets since the last.
+        """
+        self.client.dweet_for('a', {'i': 0})
+        self.client.dweet_for('a', {'i': 1})
+        with dweepy.DweetPoller(['a', 'b'], client=self.client, min_interval=0) as poller:
+            self.assertEqual(self.contents(poller.poll()), [('a', 0), ('a', 1)])
+            self.assertEqual(poller.poll(), [])
+            self.client.dweet_for('b', {'i': 2})
+            self.client.dweet_for('a', {'i': 3})
+            self.assertEqual(self.contents(poller.poll()), [('a', 3), ('b', 2)])
+
+    def test_without_history(self):
+        """With `history=False` existing dweets should be skipped.
+        """
+        self.client.dweet_for('a', {'i': 0})
+        with dweepy.DweetPoller(['a'], client=self.client, min_interval=0, history=False) as poller:
+            self.assertEqual(poller.poll(), [])
+            self.client.dweet_for('a', {'i': 1})
+            self.assertEqual(self.contents(poller.poll()), [('a', 1)])
+
+    def test_skips_decoding_unchanged_responses(self):
+        """A response identical to the last shouldn't be decoded again.
+        """
+        self.client.dweet_for('a', {'i': 0})
+        with dweepy.DweetPoller(['a'], client=self.client, min_interval=0) as poller:
+            poller.poll()
+            decoded = self.codec.decoded
+            self.assertEqual(poller.poll(), [])
+            self.assertEqual(self.codec.decoded, decoded)
+
+    def test_adaptive_interval(self):
+        """Idle things should be polled less often, active ones more.
+        """
+        self.client.dweet_for('a', {'i': 0})
+        with dweepy.DweetPoller(['a'], client=self.client, min_interval=0.01, max_interval=0.04) as poller:
+            poller.poll()
+            self.assertEqual(poller.interval('a'), 0.01)
+            for _ in range(3):
+                poller._things[0].due = 0
+                poller.poll()
+            self.assertEqual(poller.interval('a'), 0.04)
+            self.client.dweet_for('a', {'i': 1})
+            poller._things[0].due = 0
+            poller.poll()
+            self.assertEqual(poller.interval('a'), 0.01)
+
+    def test_listen(self):
+        """`listen` should yield dweets until the timeout.
+        """
+        self.client.dweet_for('a', {'i': 0})
+        with dweepy.DweetPoller(['a'], client=self.client, min_interval=0.01) as poller:
+            self.assertEqual(self.contents(poller.listen(timeout=0.2)), [('a', 0)])
+
+    def test_errors(self):
+        """Errors should be reported, other than things not having dweeted.
+        """
+        errors = []
+        self.client.lock('locked', 'lock', 'key')
+        self.client.dweet_for('locked', {'i': 0}, key='key')
+        poller = dweepy.DweetPoller(['locked', 'missing'], client=self.client, on_error=lambda *a: errors.append(a))
+        self.assertEqual(poller.poll(), [])
+        poller.close()
+        self.assertEqual([thing_name for thing_name, _ in errors], ['locked'])
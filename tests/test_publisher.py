@@ -0,0 +1,122 @@
+"""Offline tests for `dweepy.publisher`
+"""
+# stdlib imports
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy import publisher
+
+
+class FakeClient(object):
+    """Stands in for `DweepyClient`, recording every dweet it's asked to send
+    """
+
+    def __init__(self, delay=0, fail_for=()):
+        self.sent = []
+        self.delay = delay
+        self.fail_for = fail_for
+        self.lock = threading.Lock()
+
+    def dweet_for(self, thing_name, payload, key=None):
+        time.sleep(self.delay)
+        if thing_name in self.fail_for:
+            raise dweepy.DweepyError('nope')
+        with self.lock:
+            self.sent.append((thing_name, payload, key))
+        return {'thing': thing_name, 'content': payload}
+
+
+class BatchPublisherTests(unittest.TestCase):
+
+    def test_all_policy_sends_in_order(self):
+        """Every reading should be sent, in order per thing.
+        """
+        client = FakeClient()
+        with dweepy.BatchPublisher(client=client) as pub:
+            futures = [pub.submit('thing-{0}'.format(i % 3), {'i': i}) for i in range(30)]
+        self.assertEqual(len(client.sent), 30)
+        for thing in ('thing-0', 'thing-1', 'thing-2'):
+            seq = [p['i'] for name, p, _ in client.sent if name == thing]
+            self.assertEqual(seq, sorted(seq))
+        self.assertEqual(futures[4].result(), {'thing': 'thing-1', 'content': {'i': 4}})
+
+    def test_merge_policy(self):
+        """Pending readings should be merged into a single dweet.
+        """
+        client = FakeClient()
+        pub = dweepy.BatchPublisher(client=client, linger=10, policy=publisher.POLICY_MERGE)
+        a = pub.submit('thing', {'temp': 1})
+        b = pub.submit('thing', {'humidity': 2})
+        c = pub.submit('thing', {'temp': 3})
+        self.assertTrue(pub.flush(timeout=5))
+        self.assertEqual(client.sent, [('thing', {'temp': 3, 'humidity': 2}, None)])
+        self.assertEqual(a.result(), c.result())
+        self.assertIs(b.result(), c.result())
+        pub.close()
+
+    def test_latest_policy(self):
+        """Superseded readings should be cancelled.
+        """
+        client = FakeClient()
+        pub = dweepy.BatchPublisher(client=client, linger=10, policy=publisher.POLICY_LATEST)
+        a = pub.submit('thing', {'temp': 1})
+        b = pub.submit('thing', {'temp': 2})
+        pub.close()
+        self.assertTrue(a.cancelled())
+        self.assertEqual(b.result()['content'], {'temp': 2})
+        self.assertEqual(len(client.sent), 1)
+
+    def test_cancelled_readings_are_skipped(self):
+        """Readings cancelled by the caller shouldn't be sent, nor stop the
+        thing's other readings resolving.
+        """
+        client = FakeClient()
+        pub = dweepy.BatchPublisher(client=client, linger=10)
+        a = pub.submit('thing', {'temp': 1})
+        b = pub.submit('thing', {'temp': 2})
+        self.assertTrue(a.cancel())
+        self.assertTrue(pub.flush(timeout=5))
+        self.assertEqual(b.result(timeout=2)['content'], {'temp': 2})
+        self.assertEqual(client.sent, [('thing', {'temp': 2}, None)])
+        pub.close()
+
+    def test_size_threshold_flushes_before_linger(self):
+        """Reaching `max_batch_size` should flush without waiting out `linger`.
+        """
+        client = FakeClient()
+        pub = dweepy.BatchPublisher(client=client, linger=60, max_batch_size=5)
+        futures = [pub.submit('thing', {'i': i}) for i in range(5)]
+        futures[-1].result(timeout=5)
+        self.assertEqual(len(client.sent), 5)
+        pub.close()
+
+    def test_errors_are_set_on_futures(self):
+        """A failed dweet should fail its future, not the publisher.
+        """
+        pub = dweepy.BatchPublisher(client=FakeClient(fail_for=('bad',)))
+        bad = pub.submit('bad', {})
+        good = pub.submit('good', {})
+        pub.close()
+        self.assertRaises(dweepy.DweepyError, bad.result)
+        self.assertEqual(good.result()['thing'], 'good')
+
+    def test_back_pressure(self):
+        """A full queue should block or raise rather than grow.
+        """
+        pub = dweepy.BatchPublisher(client=FakeClient(delay=0.2), linger=0, max_queue_size=2)
+        pub.submit('thing', {})
+        pub.submit('thing', {})
+        self.assertRaises(dweepy.DweepyError, pub.submit, 'thing', {}, block=False)
+        self.assertRaises(dweepy.DweepyError, pub.submit, 'thing', {}, timeout=0.01)
+        pub.submit('thing', {}).result(timeout=5)
+        pub.close()
+
+    def test_closed_publisher_rejects_dweets(self):
+        """`submit` after `close` should raise.
+        """
+        pub = dweepy.BatchPublisher(client=FakeClient())
+        pub.close()
+        self.assertRaises(dweepy.DweepyError, pub.submit, 'thing', {})
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests for `dweepy.query`
+"""
+# stdlib imports
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy.codec import JSONCodec
+from dweepy.query import DweetQuery
+from dweepy.streaming import StreamDecoder
+from dweepy.testing import FakeDweetServer
+from test_streaming import stream_record
+
+
+def dweet(**content):
+    return {'thing': 'thing', 'created': '2014-03-19T10:45:28.934Z', 'content': content}
+
+
+class CountingCodec(JSONCodec):
+
+    def __init__(self):
+        self.decoded = 0
+
+    def loads_record(self, line):
+        self.decoded += 1
+        return super(CountingCodec, self).loads_record(line)
+
+
+class DweetQueryTests(unittest.TestCase):
+
+    def test_predicates(self):
+        """Every predicate should have to hold, and missing fields never match.
+        """
+        query = DweetQuery(where=[('temperature', '>', 30), ('room.name', 'in', ['kitchen', 'hall'])])
+        self.assertTrue(query.matches(dweet(temperature=31, room={'name': 'hall'})))
+        self.assertFalse(query.matches(dweet(temperature=30, room={'name': 'hall'})))
+        self.assertFalse(query.matches(dweet(temperature=31, room={'name': 'attic'})))
+        self.assertFalse(query.matches(dweet(temperature=31)))
+        self.assertFalse(query.matches(dweet(temperature='hot', room={'name': 'hall'})))
+        self.assertRaises(ValueError, DweetQuery, where=[('temperature', '~', 1)])
+
+    def test_projection(self):
+        """Only the selected fields should be kept, along with the metadata.
+        """
+        query = DweetQuery(fields=['temperature', 'room.name', 'missing'])
+        projected = query.apply(dweet(temperature=31, humidity=40, room={'name': 'hall', 'floor': 1}))
+        self.assertEqual(projected, {
+            'thing': 'thing',
+            'created': '2014-03-19T10:45:28.934Z',
+            'content': {'temperature': 31, 'room': {'name': 'hall'}},
+        })
+
+    def test_decoder_skips_lines_which_cant_match(self):
+        """Lines without a predicate's key shouldn't be decoded.
+        """
+        codec = CountingCodec()
+        decoder = StreamDecoder(codec=codec, query=DweetQuery(fields=['i'], where=[('alarm', '==', True)]))
+        stream = b''.join(stream_record(dweet(i=i, alarm=i == 2)) for i in range(3))
+        stream += b''.join(stream_record(dweet(i=i)) for i in range(3, 10))
+        dweets = decoder.feed(stream)
+        self.assertEqual([d['content'] for d in dweets], [{'i': 2}])
+        self.assertEqual(codec.decoded, 3)
+
+    def test_non_ascii_keys(self):
+        """Keys which may be escaped in the stream should still match.
+        """
+        decoder = StreamDecoder(query=DweetQuery(where=[('température', '>', 30)]))
+        dweets = decoder.feed(stream_record(dweet(**{'température': 31})))
+        self.assertEqual(len(dweets), 1)
+
+
+class ListenTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_listen_with_query(self):
+        """Subscriptions should only yield matching dweets, projected.
+        """
+        def publish():
+            time.sleep(0.2)
+            for i in range(4):
+                self.client.dweet_for('thing', {'i': i, 'temperature': 28 + i})
+
+        threading.Thread(target=publish).start()
+        query = DweetQuery(fields=['i'], where=[('temperature', '>', 29)])
+        heard = [d['content'] for d in dweepy.listen_for_dweets_from('thing', timeout=1, session=self.client, query=query)]
+        self.assertEqual(heard, [{'i': 2}, {'i': 3}])
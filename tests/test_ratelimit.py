@@ -0,0 +1,60 @@
+"""Offline tests for `dweepy.ratelimit`
+"""
+# stdlib imports
+import time
+import unittest
+
+# local imports
+import dweepy
+from test_client import FakeSession
+
+
+class RateLimiterTests(unittest.TestCase):
+
+    def test_per_thing_buckets(self):
+        """Each thing should get its own allowance.
+        """
+        limiter = dweepy.RateLimiter(per_thing_rate=1, per_thing_burst=2, block=False)
+        self.assertTrue(limiter.acquire('a'))
+        self.assertTrue(limiter.acquire('a'))
+        self.assertFalse(limiter.acquire('a'))
+        self.assertTrue(limiter.try_acquire('b'))
+
+    def test_global_bucket(self):
+        """The global bucket should limit all things together.
+        """
+        limiter = dweepy.RateLimiter(per_thing_rate=100, global_rate=1, global_burst=2, block=False)
+        self.assertTrue(limiter.acquire('a'))
+        self.assertTrue(limiter.acquire('b'))
+        self.assertFalse(limiter.acquire('c'))
+        self.assertFalse(limiter.acquire(None))
+
+    def test_failed_acquire_takes_nothing(self):
+        """A thing without tokens shouldn't use up the global allowance.
+        """
+        limiter = dweepy.RateLimiter(per_thing_rate=1, global_rate=1, global_burst=2, block=False)
+        self.assertTrue(limiter.acquire('a'))
+        self.assertFalse(limiter.acquire('a'))
+        self.assertTrue(limiter.acquire('b'))
+
+    def test_blocking_waits_for_refill(self):
+        """Blocking mode should wait until a token is available.
+        """
+        limiter = dweepy.RateLimiter(per_thing_rate=20)
+        started = time.time()
+        for i in range(25):
+            limiter.acquire('a')
+        # the burst of 20 is free, the other 5 take ~50ms each
+        self.assertGreater(time.time() - started, 0.2)
+        self.assertFalse(limiter.acquire('a', timeout=0.001))
+
+    def test_client_drops_dweets(self):
+        """Dweets the limiter won't allow should raise without being sent.
+        """
+        session = FakeSession()
+        limiter = dweepy.RateLimiter(per_thing_rate=1, block=False)
+        client = dweepy.DweepyClient(session=session, rate_limiter=limiter)
+        client.dweet_for('thing', {})
+        self.assertRaises(dweepy.DweepyRateLimitError, client.dweet_for, 'thing', {})
+        client.dweet_for('other', {})
+        self.assertEqual(len(session.calls), 2)
@@ -0,0 +1,187 @@
+"""Offline tests for `dweepy.resilience`
+"""
+# stdlib imports
+import time
+import unittest
+
+# third-party imports
+import requests
+
+# local imports
+import dweepy
+from test_client import FakeResponse
+
+
+class ScriptedSession(object):
+    """Answers each request with the next response (or exception) in `script`
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    def _next(self, url, **kwargs):
+        self.calls += 1
+        item = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    get = post = _next
+
+    def send(self, request, **kwargs):
+        return self._next(request.url)
+
+
+ok = FakeResponse({'this': 'succeeded', 'with': 'ok'})
+unavailable = FakeResponse({}, status_code=503)
+
+
+def make_client(script, **policy_kwargs):
+    sleeps = []
+    policy = dweepy.ResiliencePolicy(sleep=sleeps.append, **policy_kwargs)
+    return dweepy.DweepyClient(session=ScriptedSession(script), policy=policy), sleeps
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def test_backoff_is_exponential_and_capped(self):
+        """Backoff should double each attempt up to `backoff_max`.
+        """
+        policy = dweepy.RetryPolicy(backoff_base=1, backoff_max=5, jitter=False)
+        self.assertEqual([policy.backoff(i) for i in range(5)], [1, 2, 4, 5, 5])
+        jittered = dweepy.RetryPolicy(backoff_base=1, backoff_max=5)
+        for i in range(100):
+            self.assertTrue(0 <= jittered.backoff(3) <= 5)
+
+    def test_retries_transient_failures(self):
+        """5xx responses and connection errors should be retried.
+        """
+        client, sleeps = make_client([unavailable, requests.exceptions.ConnectionError(), ok])
+        self.assertEqual(client.get_latest_dweet_for('thing'), 'ok')
+        self.assertEqual(client.session.calls, 3)
+        self.assertEqual(len(sleeps), 2)
+
+    def test_gives_up_after_max_retries(self):
+        """The last error should be raised once retries are exhausted.
+        """
+        client, sleeps = make_client([unavailable], retry=dweepy.RetryPolicy(max_retries=3))
+        try:
+            client.get_latest_dweet_for('thing')
+        except dweepy.DweepyHTTPError as e:
+            self.assertEqual(e.status_code, 503)
+            self.assertEqual(e.args[0], 'HTTP 503 response')
+        else:
+            self.fail("shouldn't ever get called")
+        self.assertEqual(client.session.calls, 4)
+
+    def test_does_not_retry_failed_responses(self):
+        """Failures such as bad keys aren't transient and shouldn't be retried.
+        """
+        client, _ = make_client([FakeResponse({'this': 'failed', 'because': 'bad key'})])
+        self.assertRaises(dweepy.DweepyError, client.get_latest_dweet_for, 'thing')
+        self.assertEqual(client.session.calls, 1)
+
+    def test_does_not_retry_read_timeouts_for_dweets(self):
+        """A dweet that timed out may have been published, so isn't resent.
+        """
+        client, _ = make_client([requests.exceptions.ReadTimeout(), ok])
+        self.assertRaises(requests.exceptions.ReadTimeout, client.dweet_for, 'thing', {})
+        self.assertEqual(client.get_latest_dweet_for('thing'), 'ok')
+
+    def test_dweets_are_only_resent_when_not_acted_on(self):
+        """A dweet should only be resent if the server turned it away or it
+        was never sent, as it may otherwise have been published already.
+        """
+        server_error = FakeResponse({}, status_code=500)
+        for error in [server_error, requests.exceptions.ConnectionError(),
+                      dweepy.DweepyConnectionError('dropped')]:
+            client, sleeps = make_client([error, ok])
+            self.assertRaises(Exception, client.dweet_for, 'thing', {})
+            self.assertEqual(client.session.calls, 1)
+        for error in [unavailable, requests.exceptions.ConnectTimeout(),
+                      dweepy.DweepyConnectionError('refused', sent=False)]:
+            client, sleeps = make_client([error, ok])
+            self.assertEqual(client.dweet_for('thing', {}), 'ok')
+            self.assertEqual(client.session.calls, 2)
+
+    def test_retry_non_idempotent(self):
+        client, sleeps = make_client(
+            [FakeResponse({}, status_code=500), requests.exceptions.ConnectionError(), ok],
+            retry=dweepy.RetryPolicy(retry_non_idempotent=True),
+        )
+        self.assertEqual(client.dweet_for('thing', {}), 'ok')
+        self.assertEqual(client.session.calls, 3)
+
+    def test_honours_retry_after(self):
+        """`Retry-After` and dweet.io's rate limit message should set the delay.
+        """
+        throttled = FakeResponse({'this': 'failed', 'because': 'Rate limit exceeded, try again in 2 second(s).'})
+        busy = FakeResponse({}, status_code=429, headers={'Retry-After': '3'})
+        client, sleeps = make_client([throttled, busy, ok], retry=dweepy.RetryPolicy(backoff_base=0.01))
+        self.assertEqual(client.dweet_for('thing', {}), 'ok')
+        self.assertEqual(sleeps, [2.0, 3.0])
+
+    def test_long_retry_after_is_not_retried(self):
+        """Waits longer than `backoff_max` should raise straight away.
+        """
+        busy = FakeResponse({}, status_code=429, headers={'Retry-After': '3600'})
+        client, sleeps = make_client([busy, ok])
+        self.assertRaises(dweepy.DweepyHTTPError, client.dweet_for, 'thing', {})
+        self.assertEqual(sleeps, [])
+
+    def test_retry_budget(self):
+        """Retries beyond the budget should not be attempted.
+        """
+        budget = dweepy.RetryBudget(ratio=0, min_retries=2)
+        client, sleeps = make_client([unavailable], retry=dweepy.RetryPolicy(max_retries=5, budget=budget))
+        self.assertRaises(dweepy.DweepyHTTPError, client.get_latest_dweet_for, 'thing')
+        self.assertEqual(client.session.calls, 3)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def test_opens_and_recovers(self):
+        """The breaker should fail fast once open and close after a good trial.
+        """
+        breaker = dweepy.CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        client, _ = make_client(
+            [unavailable, unavailable, ok],
+            retry=dweepy.RetryPolicy(max_retries=0), breaker=breaker,
+        )
+        for i in range(2):
+            self.assertRaises(dweepy.DweepyHTTPError, client.get_latest_dweet_for, 'thing')
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertRaises(dweepy.CircuitOpenError, client.get_latest_dweet_for, 'thing')
+        self.assertEqual(client.session.calls, 2)
+        time.sleep(0.06)
+        self.assertEqual(client.get_latest_dweet_for('thing'), 'ok')
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        """A failed trial call should re-open the breaker.
+        """
+        breaker = dweepy.CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        client, _ = make_client([unavailable], retry=dweepy.RetryPolicy(max_retries=0), breaker=breaker)
+        self.assertRaises(dweepy.DweepyHTTPError, client.get_latest_dweet_for, 'thing')
+        time.sleep(0.02)
+        self.assertRaises(dweepy.DweepyHTTPError, client.get_latest_dweet_for, 'thing')
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+
+class StreamingBackoffTests(unittest.TestCase):
+
+    def test_reconnects_back_off(self):
+        """A failing subscription should back off rather than spin.
+        """
+        sleeps = []
+
+        def sleep(delay):
+            sleeps.append(delay)
+            time.sleep(delay)
+
+        policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(backoff_base=0.1, jitter=False), sleep=sleep)
+        client = dweepy.DweepyClient(session=ScriptedSession([requests.exceptions.ConnectionError()]), policy=policy)
+        self.assertEqual(list(dweepy.listen_for_dweets_from('thing', timeout=1, session=client)), [])
+        self.assertLess(client.session.calls, 10)
+        self.assertEqual(sleeps[:3], [0.1, 0.2, 0.4])
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Offline tests for `dweepy.streaming`
+"""
+# stdlib imports
+import json
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy.streaming import StreamDecoder
+from dweepy.streaming import _RecentDweets
+from dweepy.testing import FakeDweetServer
+
+
+def stream_record(dweet):
+    """Frame a dweet the way dweet.io's streaming API does
+    """
+    body = json.dumps(json.dumps(dweet, ensure_ascii=False), ensure_ascii=False).encode('utf-8')
+    return '{0:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n'
+
+
+dweets = [
+    {'thing': 'thing', 'created': '2014-03-19T10:45:28.934Z', 'content': {'i': i}}
+    for i in range(5)
+]
+
+
+class StreamDecoderTests(unittest.TestCase):
+
+    def test_every_dweet_in_a_chunk(self):
+        """All dweets in a single chunk should be decoded.
+        """
+        stream = b''.join(stream_record(d) for d in dweets)
+        self.assertEqual(StreamDecoder().feed(stream), dweets)
+
+    def test_byte_at_a_time(self):
+        """Records split across many chunks should be decoded exactly once.
+        """
+        stream = b''.join(stream_record(d) for d in dweets)
+        decoder = StreamDecoder()
+        decoded = []
+        for i in range(len(stream)):
+            decoded.extend(decoder.feed(stream[i:i + 1]))
+        self.assertEqual(decoded, dweets)
+
+    def test_non_ascii_payload(self):
+        """Multi-byte UTF-8 split across chunks should decode cleanly.
+        """
+        dweet = {'thing': 'thing', 'content': {'city': 'Zürich', 'emoji': '☃'}}
+        record = stream_record(dweet)
+        split = record.index('☃'.encode('utf-8')) + 1
+        decoder = StreamDecoder()
+        self.assertEqual(decoder.feed(record[:split]), [])
+        self.assertEqual(decoder.feed(record[split:]), [dweet])
+
+    def test_ignores_garbage_lines(self):
+        """Framing and unparseable lines should be skipped.
+        """
+        stream = b'\r\n"not json\r\n' + stream_record(dweets[0])
+        self.assertEqual(StreamDecoder().feed(stream), [dweets[0]])
+
+
+class RecentDweetsTests(unittest.TestCase):
+
+    def test_dedup_window(self):
+        """Dweets should be recognised by timestamp and content, within the window.
+        """
+        recent = _RecentDweets(2, '')
+        self.assertFalse(recent.seen(dweets[0]))
+        self.assertTrue(recent.seen(dict(dweets[0])))
+        self.assertFalse(recent.seen(dweets[1]))
+        self.assertFalse(recent.seen(dweets[2]))
+        # pushed out of the window
+        self.assertFalse(recent.seen(dweets[0]))
+        self.assertEqual(recent.watermark, '2014-03-19T10:45:28.934Z')
+
+
+class ResumeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        # reconnect slowly enough for dweets to be published in the gap
+        policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(backoff_base=0.5, jitter=False))
+        self.client = self.server.client(policy=policy)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def wait_for_subscriber(self):
+        deadline = time.time() + 5
+        while not self.server.state.listeners.get('thing') and time.time() < deadline:
+            time.sleep(0.01)
+
+    def listen(self, **kwargs):
+        heard = []
+
+        def subscribe():
+            for dweet in dweepy.listen_for_dweets_from('thing', timeout=2, session=self.client, **kwargs):
+                heard.append(dweet['content']['i'])
+
+        subscriber = threading.Thread(target=subscribe)
+        subscriber.start()
+        self.wait_for_subscriber()
+        self.client.dweet_for('thing', {'i': 0})
+        time.sleep(0.1)
+        self.server.drop_subscriptions()
+        time.sleep(0.1)
+        self.client.dweet_for('thing', {'i': 1})
+        self.client.dweet_for('thing', {'i': 2})
+        self.wait_for_subscriber()
+        time.sleep(0.1)
+        self.client.dweet_for('thing', {'i': 3})
+        subscriber.join()
+        return heard
+
+    def test_gap_is_lost_without_resume(self):
+        """Dweets published while reconnecting should be missed by default.
+        """
+        self.assertEqual(self.listen(), [0, 3])
+
+    def test_resume_fills_gap(self):
+        """Resumed subscriptions should backfill the gap without duplicates.
+        """
+        self.assertEqual(self.listen(resume=True), [0, 1, 2, 3])
+
+
+class DeadlineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.metrics = dweepy.Metrics()
+        self.client = self.server.client(hooks=[self.metrics])
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def counter(self, name):
+        return self.metrics.snapshot()['counters'].get((name, ()), 0)
+
+    def publish_every(self, interval, count):
+        def publish():
+            for i in range(count):
+                time.sleep(interval)
+                self.client.dweet_for('thing', {'i': i})
+        thread = threading.Thread(target=publish)
+        thread.start()
+        return thread
+
+    def test_deadline_is_kept_between_dweets(self):
+        """A subscription should end at its deadline even while it's waiting
+        for the next dweet.
+        """
+        publisher = self.publish_every(0.3, 3)
+        started = time.time()
+        heard = list(dweepy.listen_for_dweets_from('thing', timeout=1, session=self.client))
+        self.assertLess(time.time() - started, 1.3)
+        self.assertEqual(len(heard), 3)
+        self.assertEqual(self.counter('dweepy_stream_timeouts_total'), 1)
+        publisher.join()
+
+    def test_idle_connections_are_replaced(self):
+        """Silent connections should be replaced, without backing off.
+        """
+        started = time.time()
+        self.assertEqual(list(dweepy.listen_for_dweets_from('thing', timeout=1, read_timeout=0.2, session=self.client)), [])
+        self.assertLess(time.time() - started, 1.3)
+        self.assertGreaterEqual(self.counter('dweepy_stream_idle_total'), 3)
+        self.assertGreaterEqual(self.counter('dweepy_stream_connects_total'), 4)
+
+    def test_heartbeats_keep_connections_alive(self):
+        """Anything heard, not just dweets, should count as a sign of life.
+        """
+        publisher = self.publish_every(0.1, 8)
+        heard = list(dweepy.listen_for_dweets_from('thing', timeout=1, read_timeout=0.3, session=self.client))
+        self.assertEqual(len(heard), 8)
+        self.assertEqual(self.counter('dweepy_stream_idle_total'), 0)
+        publisher.join()
+
+
+class SubscriptionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def wait_for_subscribers(self, count=1):
+        deadline = time.time() + 5
+        while len(self.server.state.listeners.get('thing', ())) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def check_poll_and_close(self, client):
+        subscription = dweepy.Subscription('thing', timeout=None, session=client)
+        self.assertIsNone(subscription.poll())
+        self.wait_for_subscribers()
+        client.dweet_for('thing', {'i': 1})
+        self.assertEqual(subscription.poll(timeout=5)['content'], {'i': 1})
+        self.assertIsNone(subscription.poll(timeout=0.1))
+        started = time.time()
+        subscription.close()
+        self.assertLess(time.time() - started, 0.5)
+        self.assertTrue(subscription.done)
+        self.assertIsNone(subscription.poll(timeout=None))
+        client.close()
+
+    def test_poll_and_close(self):
+        """Subscriptions should be pollable, and close promptly mid-read.
+        """
+        self.check_poll_and_close(self.server.client())
+
+    def test_poll_and_close_stdlib(self):
+        self.check_poll_and_close(self.server.client(transport='stdlib'))
+
+    def test_close_many(self):
+        client = self.server.client(pool_maxsize=50)
+        subscriptions = [dweepy.Subscription('thing', timeout=None, session=client) for _ in range(50)]
+        self.wait_for_subscribers(50)
+        started = time.time()
+        for subscription in subscriptions:
+            subscription.close(wait=False)
+        self.assertTrue(all(subscription.join(5) for subscription in subscriptions))
+        self.assertLess(time.time() - started, 2)
+        client.close()
+
+    def test_iterates_until_timeout(self):
+        client = self.server.client()
+        with dweepy.Subscription('thing', timeout=0.5, session=client) as subscription:
+            self.wait_for_subscribers()
+            client.dweet_for('thing', {'i': 1})
+            self.assertEqual([dweet['content'] for dweet in subscription], [{'i': 1}])
+        client.close()
@@ -0,0 +1,138 @@
+"""End-to-end tests against `dweepy.testing.FakeDweetServer`
+"""
+# stdlib imports
+import errno
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+try:
+    # python 3
+    from io import StringIO
+except ImportError:
+    # python 2
+    from StringIO import StringIO
+
+# local imports
+import dweepy
+from dweepy.testing import FakeDweetServer
+
+
+test_data = {
+    'hello': "world",
+    'somenum': 6816513845,
+}
+
+
+class FakeServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_dweet_and_read(self):
+        """Dweets should be readable back, newest first.
+        """
+        self.client.dweet_for('thing', test_data)
+        dweet = self.client.dweet_for('thing', {'n': 2})
+        self.assertEqual(dweet['thing'], 'thing')
+        self.assertEqual(self.client.get_latest_dweet_for('thing')[0]['content'], {'n': 2})
+        self.assertEqual([d['content'] for d in self.client.get_dweets_for('thing')], [{'n': 2}, test_data])
+        self.assertIn('thing', self.client.dweet(test_data))
+
+    def test_locking(self):
+        """Locked things should require the right key.
+        """
+        self.client.lock('thing', 'my-lock', 'my-key')
+        try:
+            self.client.dweet_for('thing', test_data)
+        except dweepy.DweepyError as e:
+            self.assertEqual(e.args[0], 'this thing is locked and requires a key')
+        else:
+            self.fail("shouldn't ever get called")
+        self.assertRaises(dweepy.DweepyError, self.client.get_latest_dweet_for, 'thing', key='badkey')
+        self.client.dweet_for('thing', test_data, key='my-key')
+        self.assertEqual(self.client.remove_lock('my-lock', 'my-key'), 'my-lock')
+        self.assertRaises(dweepy.DweepyError, self.client.remove_lock, 'my-lock', 'my-key')
+
+    def test_alerts(self):
+        """Alerts should round trip and 404 once removed.
+        """
+        condition = "if(dweet.alertValue > 10) return 'TEST: Greater than 10';"
+        alert = self.client.set_alert('thing', ['test@example.com', 'another@example.com'], condition, 'key')
+        self.assertEqual(alert['condition'], condition)
+        self.assertEqual(self.client.get_alert('thing', 'key')['condition'], condition)
+        self.client.remove_alert('thing', 'key')
+        self.assertRaises(dweepy.DweepyError, self.client.get_alert, 'thing', 'key')
+
+    def test_listen_for_dweets_from(self):
+        """Subscriptions should hear dweets as they're published.
+        """
+        def publish():
+            time.sleep(0.2)
+            for i in range(3):
+                self.client.dweet_for('thing', {'i': i})
+
+        threading.Thread(target=publish).start()
+        heard = []
+        for dweet in dweepy.listen_for_dweets_from('thing', timeout=1, session=self.client):
+            heard.append(dweet['content'])
+        self.assertEqual(heard, [{'i': 0}, {'i': 1}, {'i': 2}])
+
+    def test_error_injection(self):
+        """Injected errors should surface as HTTP errors (and be retried).
+        """
+        self.server.set_error_rate(1)
+        policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=2, backoff_base=0.001))
+        client = self.server.client(policy=policy)
+        self.assertRaises(dweepy.DweepyHTTPError, client.dweet_for, 'thing', test_data)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_base_url_from_environment(self):
+        """`DWEEPY_BASE_URL` should point the module-level functions elsewhere.
+        """
+        env = dict(os.environ, DWEEPY_BASE_URL=self.server.base_url)
+        code = 'import dweepy; print(dweepy.dweet_for("thing", {"a": 1})["thing"])'
+        output = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(output.strip(), b'thing')
+        self.assertEqual(self.client.get_latest_dweet_for('thing')[0]['content'], {'a': 1})
+
+    def test_base_url_module_overrides(self):
+        """Overriding `BASE_URL` in `dweepy.client`, `dweepy.api` or
+        `dweepy.streaming` should still point the module-level functions elsewhere.
+        """
+        import dweepy.api
+        import dweepy.streaming
+        for module in (dweepy.client, dweepy.api, dweepy.streaming):
+            original = module.BASE_URL
+            module.BASE_URL = self.server.base_url
+            try:
+                self.assertEqual(dweepy.get_default_client().base_url, self.server.base_url)
+                dweepy.dweet_for('thing', {'module': module.__name__})
+            finally:
+                module.BASE_URL = original
+            self.assertEqual(self.client.get_latest_dweet_for('thing')[0]['content'], {'module': module.__name__})
+        self.assertNotEqual(dweepy.get_default_client().base_url, self.server.base_url)
+
+    def test_client_hang_ups_are_quiet(self):
+        """Clients disconnecting mid-response shouldn't print tracebacks.
+        """
+        stderr = sys.stderr
+        sys.stderr = captured = StringIO()
+        try:
+            for error in (socket.error(errno.EPIPE, 'Broken pipe'), socket.error(errno.ECONNRESET, 'reset')):
+                try:
+                    raise error
+                except socket.error:
+                    self.server.httpd.handle_error(None, ('127.0.0.1', 0))
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(captured.getvalue(), '')
@@ -0,0 +1,118 @@
+"""Tests for `dweepy.transport` and lazily importing the HTTP stack
+"""
+# stdlib imports
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+# local imports
+import dweepy
+from dweepy.testing import FakeDweetServer
+from dweepy.transport import StdlibSession
+
+
+class LazyImportTests(unittest.TestCase):
+
+    def run_python(self, code, **extra_env):
+        env = dict(os.environ)
+        env.pop('DWEEPY_TRANSPORT', None)
+        env.update(extra_env)
+        return subprocess.check_output([sys.executable, '-c', code], env=env).strip()
+
+    def test_import_is_lazy(self):
+        """Importing dweepy, and using what doesn't touch the network,
+        shouldn't import requests or the other submodules.
+        """
+        code = (
+            'import sys, dweepy; dweepy.DweetQuery(); dweepy.DweepyClient(); '
+            'print([m for m in ("requests", "dweepy.api", "dweepy.streaming", "dweepy.alerts") if m in sys.modules])'
+        )
+        self.assertEqual(self.run_python(code), b'[]')
+
+    def test_submodules_as_attributes(self):
+        """Submodules should be reachable from the package without importing
+        them first.
+        """
+        code = 'import dweepy; print(dweepy.api.BASE_URL == dweepy.streaming.BASE_URL == dweepy.client.BASE_URL)'
+        self.assertEqual(self.run_python(code), b'True')
+        self.assertIn('api', dir(dweepy))
+
+    def test_stdlib_transport_from_environment(self):
+        """`DWEEPY_TRANSPORT=stdlib` should send requests without requests.
+        """
+        with FakeDweetServer() as server:
+            code = 'import sys, dweepy; dweepy.dweet_for("thing", {"a": 1}); print("requests" in sys.modules)'
+            output = self.run_python(code, DWEEPY_BASE_URL=server.base_url, DWEEPY_TRANSPORT='stdlib')
+            self.assertEqual(output, b'False')
+            self.assertEqual(server.client().get_latest_dweet_for('thing')[0]['content'], {'a': 1})
+
+    def test_unknown_transport(self):
+        self.assertRaises(ValueError, dweepy.DweepyClient, transport='curl')
+
+
+class StdlibSessionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeDweetServer().start()
+        self.client = self.server.client(transport='stdlib')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_requests_reuse_connections(self):
+        """Connections should be kept alive and reused between requests.
+        """
+        self.client.dweet_for('thing', {'n': 1})
+        key, = self.client.session._pools
+        conn, = self.client.session._pools[key]
+        self.assertEqual(self.client.get_latest_dweet_for('thing')[0]['content'], {'n': 1})
+        self.assertEqual(self.client.session._pools[key], [conn])
+
+    def test_keep_alive_disabled(self):
+        client = self.server.client(transport='stdlib', keep_alive=False)
+        client.dweet_for('thing', {'n': 1})
+        self.assertEqual(client.session._pools, {})
+        client.close()
+
+    def test_subscription(self):
+        """Subscriptions should stream over the stdlib transport too.
+        """
+        def publish():
+            time.sleep(0.2)
+            for i in range(3):
+                self.client.dweet_for('thing', {'i': i})
+
+        threading.Thread(target=publish).start()
+        heard = []
+        for dweet in dweepy.listen_for_dweets_from('thing', timeout=1, session=self.client):
+            heard.append(dweet['content'])
+        self.assertEqual(heard, [{'i': 0}, {'i': 1}, {'i': 2}])
+
+    def test_connection_errors_are_retried(self):
+        """Failing to connect should raise `DweepyConnectionError`, which the
+        policy retries.
+        """
+        sleeps = []
+        policy = dweepy.ResiliencePolicy(retry=dweepy.RetryPolicy(max_retries=2), sleep=sleeps.append)
+        self.server.stop()
+        client = self.server.client(transport='stdlib', policy=policy)
+        self.assertRaises(dweepy.DweepyConnectionError, client.dweet_for, 'thing', {})
+        self.assertEqual(len(sleeps), 2)
+
+    def test_read_timeout(self):
+        """A slow response should raise `DweepyTimeoutError`, only retried
+        for reads.
+        """
+        self.server.set_latency(0.5)
+        session = StdlibSession()
+        url = self.server.base_url + '/get/latest/dweet/for/thing'
+        self.assertRaises(dweepy.DweepyTimeoutError, session.get, url, timeout=0.1)
+        self.assertEqual(session._pools, {})
+        retry = dweepy.RetryPolicy()
+        self.assertTrue(retry.is_retryable(dweepy.DweepyTimeoutError(), idempotent=True))
+        self.assertFalse(retry.is_retryable(dweepy.DweepyTimeoutError(), idempotent=False))
+        session.close()